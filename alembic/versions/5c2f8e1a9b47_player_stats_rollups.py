@@ -0,0 +1,117 @@
+"""player stats rollups
+
+Revision ID: 5c2f8e1a9b47
+Revises: 89a3502370a0
+Create Date: 2026-10-17 11:30:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5c2f8e1a9b47"
+down_revision = "89a3502370a0"
+branch_labels = None
+depends_on = None
+
+
+def _rollup_columns():
+    return [
+        sa.Column("matches", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("level", sa.Integer(), nullable=True),
+        sa.Column("kills_streak", sa.Integer(), nullable=True),
+        sa.Column("longest_life_secs", sa.Integer(), nullable=True),
+        sa.Column("kills", sa.Integer(), nullable=False),
+        sa.Column("deaths", sa.Integer(), nullable=False),
+        sa.Column("teamkills", sa.Integer(), nullable=False),
+        sa.Column("deaths_by_tk", sa.Integer(), nullable=False),
+        sa.Column("time_seconds", sa.Integer(), nullable=False),
+        sa.Column("combat", sa.Integer(), nullable=False),
+        sa.Column("offense", sa.Integer(), nullable=False),
+        sa.Column("defense", sa.Integer(), nullable=False),
+        sa.Column("support", sa.Integer(), nullable=False),
+        sa.Column("kills_per_minute_sum", sa.Float(), nullable=False),
+        sa.Column("kills_per_minute_count", sa.Integer(), nullable=False),
+    ]
+
+
+_AGGREGATES = """
+    COUNT(*),
+    MAX(ps.name),
+    MAX(ps.level),
+    MAX(ps.kills_streak),
+    MAX(ps.longest_life_secs),
+    COALESCE(SUM(ps.kills), 0),
+    COALESCE(SUM(ps.deaths), 0),
+    COALESCE(SUM(ps.teamkills), 0),
+    COALESCE(SUM(ps.deaths_by_tk), 0),
+    COALESCE(SUM(ps.time_seconds), 0),
+    COALESCE(SUM(ps.combat), 0),
+    COALESCE(SUM(ps.offense), 0),
+    COALESCE(SUM(ps.defense), 0),
+    COALESCE(SUM(ps.support), 0),
+    COALESCE(SUM(ps.kills_per_minute), 0),
+    COUNT(ps.kills_per_minute)
+"""
+
+
+def upgrade():
+    op.create_table(
+        "player_stats_rollup",
+        sa.Column("playersteamid_id", sa.Integer(), nullable=False),
+        *_rollup_columns(),
+        sa.ForeignKeyConstraint(["playersteamid_id"], ["steam_id_64.id"]),
+        sa.PrimaryKeyConstraint("playersteamid_id"),
+    )
+    op.create_table(
+        "player_stats_rollup_bucket",
+        sa.Column("playersteamid_id", sa.Integer(), nullable=False),
+        sa.Column("map_name", sa.String(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        *_rollup_columns(),
+        sa.ForeignKeyConstraint(["playersteamid_id"], ["steam_id_64.id"]),
+        sa.PrimaryKeyConstraint("playersteamid_id", "map_name", "day"),
+    )
+    op.create_index(
+        "ix_player_stats_rollup_bucket_day",
+        "player_stats_rollup_bucket",
+        ["day"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_player_stats_rollup_bucket_map_name_day",
+        "player_stats_rollup_bucket",
+        ["map_name", "day"],
+        unique=False,
+    )
+
+    # Roll up the stats recorded so far, new matches are added as they are recorded
+    columns = ", ".join(c.name for c in _rollup_columns())
+    op.execute(
+        f"""INSERT INTO player_stats_rollup(playersteamid_id, {columns})
+               SELECT ps.playersteamid_id, {_AGGREGATES}
+               FROM player_stats ps
+               JOIN map_history m ON m.id = ps.map_id
+               GROUP BY ps.playersteamid_id"""
+    )
+    op.execute(
+        f"""INSERT INTO player_stats_rollup_bucket(playersteamid_id, map_name, day, {columns})
+               SELECT ps.playersteamid_id, m.map_name, CAST(m.start AS DATE), {_AGGREGATES}
+               FROM player_stats ps
+               JOIN map_history m ON m.id = ps.map_id
+               GROUP BY ps.playersteamid_id, m.map_name, CAST(m.start AS DATE)"""
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_player_stats_rollup_bucket_map_name_day",
+        table_name="player_stats_rollup_bucket",
+    )
+    op.drop_index(
+        "ix_player_stats_rollup_bucket_day", table_name="player_stats_rollup_bucket"
+    )
+    op.drop_table("player_stats_rollup_bucket")
+    op.drop_table("player_stats_rollup")
@@ -0,0 +1,54 @@
+"""player match weapon, victim and killer facts
+
+Revision ID: 7d41b6c0e2a3
+Revises: 5c2f8e1a9b47
+Create Date: 2026-10-17 14:10:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "7d41b6c0e2a3"
+down_revision = "5c2f8e1a9b47"
+branch_labels = None
+depends_on = None
+
+# Table -> (key column, count column)
+_FACTS = {
+    "player_match_weapon": ("weapon", "kills"),
+    "player_match_victim": ("victim_name", "kills"),
+    "player_match_killer": ("killer_name", "deaths"),
+}
+
+
+def upgrade():
+    # Created empty, the backfill_match_facts command of the maintenance
+    # container fills them in batches for the matches recorded so far
+    for table, (key, count) in _FACTS.items():
+        op.create_table(
+            table,
+            sa.Column("playersteamid_id", sa.Integer(), nullable=False),
+            sa.Column("map_id", sa.Integer(), nullable=False),
+            sa.Column(key, sa.String(), nullable=False),
+            sa.Column(count, sa.Integer(), nullable=False),
+            sa.ForeignKeyConstraint(["map_id"], ["map_history.id"]),
+            sa.ForeignKeyConstraint(["playersteamid_id"], ["steam_id_64.id"]),
+            sa.PrimaryKeyConstraint("playersteamid_id", "map_id", key),
+        )
+        op.create_index(f"ix_{table}_map_id", table, ["map_id"], unique=False)
+    op.create_index(
+        "ix_player_match_weapon_weapon",
+        "player_match_weapon",
+        ["weapon"],
+        unique=False,
+        postgresql_include=["kills"],
+    )
+
+
+def downgrade():
+    op.drop_index("ix_player_match_weapon_weapon", table_name="player_match_weapon")
+    for table in _FACTS:
+        op.drop_index(f"ix_{table}_map_id", table_name=table)
+        op.drop_table(table)
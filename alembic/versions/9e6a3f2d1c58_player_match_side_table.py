@@ -0,0 +1,65 @@
+"""player match side table
+
+Revision ID: 9e6a3f2d1c58
+Revises: 7d41b6c0e2a3
+Create Date: 2026-10-17 16:40:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "9e6a3f2d1c58"
+down_revision = "7d41b6c0e2a3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Installs that applied stats_app's former migration have a materialized
+    # view of the same name, refreshed from the whole history every hour
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS player_match_side")
+    op.create_table(
+        "player_match_side",
+        sa.Column("player_id", sa.Integer(), nullable=False),
+        sa.Column("match_id", sa.Integer(), nullable=False),
+        sa.Column("side", sa.String(), nullable=False),
+        sa.Column("kills", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["match_id"], ["map_history.id"]),
+        sa.ForeignKeyConstraint(["player_id"], ["steam_id_64.id"]),
+        sa.PrimaryKeyConstraint("player_id", "match_id"),
+    )
+    op.create_index(
+        "ix_player_match_side_match_id", "player_match_side", ["match_id"], unique=False
+    )
+    op.create_index(
+        "ix_player_match_side_side", "player_match_side", ["side"], unique=False
+    )
+
+    # The matches recorded so far, new ones are added as they are recorded
+    op.execute(
+        r"""INSERT INTO player_match_side (player_id, match_id, side, kills)
+               SELECT DISTINCT ON (player_id, match_id) player_id, match_id, side, kills
+               FROM (
+                   SELECT ll.player1_steamid AS player_id,
+                          m.id AS match_id,
+                          substring(ll.raw FROM 'KILL: [^(]+\(([^/]+)/') AS side,
+                          COUNT(*) AS kills
+                   FROM log_lines ll
+                   JOIN map_history m
+                     ON ll.event_time BETWEEN m.start AND m."end"
+                    AND ll.server = CAST(m.server_number AS VARCHAR)
+                   WHERE ll.type = 'KILL'
+                     AND ll.player1_steamid IS NOT NULL
+                   GROUP BY 1, 2, 3
+               ) side_kills
+               WHERE side IS NOT NULL
+               ORDER BY player_id, match_id, kills DESC"""
+    )
+
+
+def downgrade():
+    op.drop_index("ix_player_match_side_side", table_name="player_match_side")
+    op.drop_index("ix_player_match_side_match_id", table_name="player_match_side")
+    op.drop_table("player_match_side")
@@ -0,0 +1,34 @@
+"""map history facts refreshed at
+
+Revision ID: b4e1c7a9d302
+Revises: 9e6a3f2d1c58
+Create Date: 2026-10-17 19:20:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "b4e1c7a9d302"
+down_revision = "9e6a3f2d1c58"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "map_history",
+        sa.Column("facts_refreshed_at", sa.TIMESTAMP(), nullable=True),
+    )
+    # The matches backfilled so far, those without any fact row are built
+    # once more by backfill_match_facts and marked then
+    op.execute(
+        """UPDATE map_history m SET facts_refreshed_at = now()
+           WHERE EXISTS (SELECT 1 FROM player_match_weapon w WHERE w.map_id = m.id)
+              OR EXISTS (SELECT 1 FROM player_match_killer k WHERE k.map_id = m.id)"""
+    )
+
+
+def downgrade():
+    op.drop_column("map_history", "facts_refreshed_at")
@@ -0,0 +1,98 @@
+"""Size and speed of the redis codecs, per object
+
+    python -m benchmarks.codecs
+
+Encodes and decodes 100k parsed log lines (as kept in the log history) and
+full server team views with every codec.
+"""
+
+import itertools
+import time
+
+from benchmarks.log_parser import SAMPLE_LOG_LINES
+from rcon.codecs import ORJSON, PICKLE, CompressedCodec, MsgpackCodec, msgpack
+from rcon.rcon import Rcon
+
+CODECS = [PICKLE, ORJSON, CompressedCodec(PICKLE), CompressedCodec(ORJSON)]
+if msgpack is not None:
+    CODECS += [MsgpackCodec(), CompressedCodec(MsgpackCodec())]
+
+
+def _team_view():
+    """Roughly the shape and size of get_team_view on a full server"""
+
+    def player(i):
+        return {
+            "name": f"Player {i}",
+            "player_id": str(76561198000000000 + i),
+            "profile": None,
+            "is_vip": i % 7 == 0,
+            "unit_id": i % 8,
+            "unit_name": "able",
+            "loadout": "standard",
+            "team": "allies" if i % 2 else "axis",
+            "role": "rifleman",
+            "kills": i % 20,
+            "deaths": i % 11,
+            "team_kills": 0,
+            "vehicle_kills": 0,
+            "vehicles_destroyed": 0,
+            "combat": 100 + i,
+            "offense": 40,
+            "defense": 180,
+            "support": 30,
+            "level": 100 + i,
+            "platform": "steam",
+            "eos_id": f"{i:032x}",
+            "world_position": {"x": i * 1013.7, "y": i * 751.3, "z": 0.0},
+            "clan_tag": "",
+            "map_playtime_seconds": 1200 + i,
+        }
+
+    squads = ["able", "baker", "charlie", "dog", "easy", "fox", "george", "how"]
+    return {
+        team: {
+            "squads": {
+                squad: {
+                    "players": [player(offset + n * 6 + i) for i in range(6)],
+                    "type": "infantry",
+                    "kills": 10,
+                }
+                for n, squad in enumerate(squads)
+            },
+            "count": 48,
+        }
+        for offset, team in ((0, "allies"), (50, "axis"))
+    }
+
+
+def main():
+    raw_logs = [
+        f"[1:00 min ({1704335300 + i // 20})] {line}"
+        for i, line in zip(range(100_000), itertools.cycle(SAMPLE_LOG_LINES))
+    ]
+    log_history = Rcon.parse_logs(raw_logs)["logs"]
+    team_views = [_team_view()] * 100
+
+    for label, objs in (("log_history", log_history), ("team view", team_views)):
+        for codec in CODECS:
+            started = time.perf_counter()
+            encoded = [codec.dumps(obj) for obj in objs]
+            encode_elapsed = time.perf_counter() - started
+
+            started = time.perf_counter()
+            decoded = [codec.loads(data) for data in encoded]
+            decode_elapsed = time.perf_counter() - started
+
+            print(
+                f"{label:12} {codec.name:14} "
+                f"{sum(map(len, encoded)) / len(objs):9,.0f} bytes "
+                f"encode {encode_elapsed / len(objs) * 1e6:8.1f} µs "
+                f"decode {decode_elapsed / len(objs) * 1e6:8.1f} µs"
+            )
+            if codec.name.startswith("pickle"):
+                assert decoded[-1] == objs[-1]
+
+
+if __name__ == "__main__":
+    main()
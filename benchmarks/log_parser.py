@@ -0,0 +1,89 @@
+"""Game server log parsing throughput, in lines per second
+
+    python -m benchmarks.log_parser [recorded.log] [--lines 100000]
+
+Parses a corpus of raw log lines (as returned by ShowLog, one event per line)
+repeated up to --lines, or a synthetic one shaped like a match log without a
+file. Only the public Rcon helpers are timed, so running it on two revisions
+compares them.
+"""
+
+import argparse
+import itertools
+import time
+from typing import Callable
+
+from rcon.rcon import Rcon
+
+# Kills dominate a real match log, they are weighed accordingly below
+SAMPLE_LOG_LINES = [
+    "KILL: Karadoc(Axis/76561198080212634) -> Bullitt-FR(Allies/76561198000776367) with G43",
+    "KILL: Karadoc(Axis/a21af8b5-59df-5vbr-88gf-ab4239r4g6f4) -> Bullitt-FR(Allies/76561198000776367) with MP40",
+    "KILL: 湊あくあ(Axis/76561198202984515) -> fguitou(Allies/76561198034763447) with None",
+    "TEAM KILL: Oz(Allies/76561198163789126) -> Sic_Anger(Allies/76561199201574614) with PPSH 41 W/DRUM",
+    "CONNECTED Waxxeer (12345678901234567)",
+    "DISCONNECTED Dieter Schlüter: b (12345678901234567)",
+    "CHAT[Team][bananacocoo(Allies/76561198003251789)]: pas jouable la map",
+    "CHAT[Unit][WinstonsDomain(Axis/3azzx77e-4ad4-57z3-8gr8-gb9e753e85aq)]: test",
+    "TEAMSWITCH T17 Scott (None > Allies)",
+    "KICK: [T17 Scott] has been kicked. [KICKED FOR TEAM KILLING!]",
+    "BAN: [(WTH) Abusify] has been banned. [BANNED FOR 2 HOURS BY THE ADMINISTRATOR!",
+    "VOTESYS: Player [NoodleArms] voted [PV_Favour] for VoteID[2]",
+    "Player [Fachi (76561198312191879)] Entered Admin Camera",
+    "MATCH START UTAH BEACH OFFENSIVE",
+    "MATCH ENDED `UTAH BEACH OFFENSIVE` ALLIED (1 - 4) AXIS",
+    "MESSAGE: player [Sarah(76561198080212634)], content [Welcome to the server]",
+]
+
+
+def synthetic_corpus() -> list[str]:
+    weighted = SAMPLE_LOG_LINES[:4] * 6 + SAMPLE_LOG_LINES
+    return [
+        f"[{i % 60}.0 sec ({1704335300 + i})] {line}" for i, line in enumerate(weighted)
+    ]
+
+
+def best_of(runs: int, func: Callable[[], object]) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", help="recorded raw game server logs")
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            sample = [line.rstrip("\n") for line in f if line.strip()]
+    else:
+        sample = synthetic_corpus()
+    raw_logs = list(itertools.islice(itertools.cycle(sample), args.lines))
+    contents = [line for _, _, line in Rcon.split_raw_log_lines(raw_logs)]
+
+    def parse_lines():
+        for line in contents:
+            try:
+                Rcon.parse_log_line(line)
+            except ValueError:
+                pass
+
+    benchmarks = {
+        "split_raw_log_lines": lambda: list(Rcon.split_raw_log_lines(raw_logs)),
+        "parse_log_line": parse_lines,
+        "parse_logs": lambda: Rcon.parse_logs(raw_logs),
+    }
+    print(f"{len(raw_logs)} lines, best of {args.runs} runs")
+    for name, func in benchmarks.items():
+        elapsed = best_of(args.runs, func)
+        print(f"{name:>20}: {len(raw_logs) / elapsed:>12,.0f} lines/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -30,6 +30,7 @@ from rcon.player_stats import TimeWindowStats
 from rcon.rcon import Rcon
 from rcon.scoreboard import ScoreboardUserConfig
 from rcon.settings import SERVER_INFO
+from rcon.team_view import get_team_view_changes
 from rcon.types import (
     AdminUserType,
     AllMessageTemplateTypes,
@@ -37,13 +38,16 @@ from rcon.types import (
     BlacklistType,
     BlacklistWithRecordsType,
     GameServerBanType,
+    GetDetailedPlayer,
     MessageTemplateCategory,
     MessageTemplateType,
     ParsedLogsType,
     PlayerCommentType,
     PlayerFlagType,
     PlayerProfileTypeEnriched,
+    RconCommandLatencyType,
     ServerInfoType,
+    TeamViewChangesType,
     VoteMapStatusType,
 )
 from rcon.user_config.auto_broadcast import AutoBroadcastUserConfig
@@ -412,7 +416,7 @@ class RconAPI(Rcon):
         return success
 
     def clear_cache(self) -> bool:
-        """Clear every key in this servers Redis cache and return number of deleted keys
+        """Invalidate every value in this servers Redis cache
 
         Many things in CRCON are cached in Redis to avoid excessively polling
         the game server, this clears the entire cache which is sometimes necessary
@@ -489,6 +493,19 @@ class RconAPI(Rcon):
             country=country,
         )
 
+    def get_players_info_batch(
+        self, player_ids: list[str] | str
+    ) -> dict[str, GetDetailedPlayer | None]:
+        """Returns the detailed info of several online players in one call
+
+        Args:
+            player_ids: A list of player IDs, or a comma separated string of them
+                when passed as a GET parameter
+        """
+        if isinstance(player_ids, str):
+            player_ids = [p for p in player_ids.split(",") if p]
+        return super().get_players_info_batch(player_ids)
+
     def flag_player(
         self,
         player_id: str,
@@ -596,6 +613,25 @@ class RconAPI(Rcon):
     def get_online_mods(self) -> list[AdminUserType]:
         return online_mods()
 
+    def get_rcon_command_latencies(self) -> dict[str, RconCommandLatencyType]:
+        """The p50/p95/p99 latency of each RCON command since the performance statistics were last dumped, slowest first
+
+        Only recorded when performance statistics are enabled in the RCON connection settings.
+        """
+        self.perf_stats.flush()
+        return self.perf_stats.latency_percentiles()
+
+    def get_team_view_changes(
+        self, since_version: int | None = None
+    ) -> TeamViewChangesType:
+        """The diffs of the team view since a version, or the whole view if they aren't available
+
+        Only published while the team_view service is running.
+        """
+        if since_version is not None:
+            since_version = int(since_version)
+        return get_team_view_changes(since_version)
+
     def get_ingame_mods(self) -> list[AdminUserType]:
         return ingame_mods()
 
@@ -0,0 +1,507 @@
+"""asyncio implementation of the HLL RCON v2 protocol
+
+`AsyncHLLConnection` speaks the same protocol as `HLLConnection` (ServerConnect
+and Login handshake, XOR'd bodies, responses matched to requests by their
+request ID) over asyncio streams, `AsyncServerCtl` shares a small pool of them
+between any number of coroutines and `BlockingHLLConnection` lets the blocking
+`ServerCtl` (and so every `Rcon` method) send its requests through them.
+"""
+
+import asyncio
+import base64
+import logging
+import math
+import struct
+import threading
+import time
+import uuid
+from typing import Any, Iterable, Self
+
+from rcon.commands import ServerCtl, _escape_params
+from rcon.connection import (
+    HEADER_FORMAT,
+    HEADER_SIZE,
+    MAGIC_HEADER_VALUE,
+    TIMEOUT_SEC,
+    Handle,
+    HLLBrokenConnectionError,
+    HLLCommandError,
+    Request,
+    Response,
+    XorCodec,
+)
+from rcon.perf_statistics import PerformanceStatistics
+from rcon.types import PlayerInfoType, ServerInfoType, SlotsType
+
+logger = logging.getLogger(__name__)
+
+# Errors after which a request is sent again on a (possibly new) connection
+RETRYABLE_ERRORS = (OSError, EOFError, UnicodeDecodeError, HLLBrokenConnectionError)
+
+
+class AsyncHandle:
+    def __init__(
+        self,
+        conn: "AsyncHLLConnection",
+        request: Request,
+        future: "asyncio.Future[Response]",
+    ) -> None:
+        self.conn = conn
+        self.request = request
+        self.future = future
+        self._response: Response | None = None
+
+    async def receive(self) -> Response:
+        if self._response is None:
+            try:
+                self._response = await asyncio.wait_for(self.future, TIMEOUT_SEC)
+            except TimeoutError:
+                self.conn.forget(self.request.request_id)
+                raise
+        return self._response
+
+
+class AsyncHLLConnection:
+    """A single RCON connection driven by the event loop
+
+    Requests are pipelined, a reader task resolves each pending request as soon
+    as its response frame comes in regardless of the order they were sent in.
+    """
+
+    def __init__(self) -> None:
+        self.id = f"async-{uuid.uuid4()}"
+        self.auth_token: str | None = None
+        self.broken = False
+        self._closed = False
+        self._codec: XorCodec | None = None
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._read_task: asyncio.Task | None = None
+        self._pending: dict[int, asyncio.Future[Response]] = {}
+
+    @property
+    def in_flight(self) -> int:
+        """The number of requests sent that have not been answered yet"""
+        return len(self._pending)
+
+    async def connect(self, host, port, password: str):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), TIMEOUT_SEC
+        )
+        self._read_task = asyncio.create_task(
+            self._read_loop(), name=f"hll-reader-{self.id}"
+        )
+
+        server_hello = await self.exchange("ServerConnect", 2, "")
+        server_hello.raise_for_status()
+
+        if not isinstance(server_hello.content, str):
+            raise HLLBrokenConnectionError(
+                "ServerConnect response content is not a string"
+            )
+        xorkey = base64.b64decode(server_hello.content)
+        self._codec = XorCodec(xorkey) if xorkey else None
+
+        auth_token_resp = await self.exchange("Login", 2, password)
+        auth_token_resp.raise_for_status()
+
+        self.auth_token = auth_token_resp.content
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._read_task is not None:
+            self._read_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                logger.debug("Unable to close connection %s cleanly", self.id)
+
+    async def send(
+        self, command: str, version: int, body: dict[str, Any] | str = ""
+    ) -> AsyncHandle:
+        if self.broken or self._writer is None:
+            raise HLLBrokenConnectionError(f"Connection {self.id} is broken")
+
+        request = Request(
+            command=command,
+            version=version,
+            auth_token=self.auth_token,
+            content=body,
+        )
+        future: asyncio.Future[Response] = asyncio.get_running_loop().create_future()
+        self._pending[request.request_id] = future
+
+        req_header, req_body = request.to_bytes()
+        try:
+            # write() never yields, so frames of concurrent requests can't interleave
+            self._writer.write(req_header + self._xor(req_body))
+            await self._writer.drain()
+        except Exception:
+            self.forget(request.request_id)
+            raise
+
+        return AsyncHandle(self, request, future)
+
+    async def exchange(
+        self, command: str, version: int, body: dict[str, Any] | str = ""
+    ) -> Response:
+        handle = await self.send(command, version, body)
+        return await handle.receive()
+
+    def forget(self, request_id: int) -> None:
+        """Stop waiting for the response of a request, it will be dropped when it arrives"""
+        self._pending.pop(request_id, None)
+
+    async def _read_loop(self) -> None:
+        assert self._reader is not None
+        try:
+            while True:
+                header = await self._reader.readexactly(HEADER_SIZE)
+                magic, req_id, body_len = struct.unpack(HEADER_FORMAT, header)
+                if magic != MAGIC_HEADER_VALUE:
+                    raise HLLBrokenConnectionError(
+                        f"Invalid magic value: {magic:#x} (expected {MAGIC_HEADER_VALUE:#x})"
+                    )
+                body = await self._reader.readexactly(body_len)
+
+                future = self._pending.pop(req_id, None)
+                if future is None:
+                    logger.debug("Dropping response to abandoned request #%s", req_id)
+                    continue
+                if future.done():
+                    continue
+
+                # A body that fails to decode only fails its own request, the
+                # stream itself is still in sync
+                try:
+                    future.set_result(Response.from_bytes(req_id, self._xor(body)))
+                except (ValueError, KeyError) as e:
+                    future.set_exception(e)
+        except asyncio.CancelledError:
+            self._fail_pending(
+                HLLBrokenConnectionError(f"Connection {self.id} was closed")
+            )
+            raise
+        except Exception as e:
+            if not self._closed:
+                logger.warning("Reader of connection %s failed: %s", self.id, e)
+            self._fail_pending(e)
+
+    def _fail_pending(self, exc: Exception) -> None:
+        self.broken = True
+        pending = list(self._pending.values())
+        self._pending.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(exc)
+
+    def _xor(self, msg) -> bytes:
+        if self._codec is None:
+            return msg
+        return self._codec(msg)
+
+
+class AsyncServerCtl:
+    """Coroutine counterpart of `ServerCtl`
+
+    All coroutines share a small pool of pipelined connections. The commands
+    most often fanned out (per player lookups, messages, punishments) are
+    implemented natively, every other `ServerCtl` command is available under the
+    same name and runs the blocking implementation in a worker thread that
+    sends its requests over this pool.
+    """
+
+    def __init__(
+        self,
+        config: ServerInfoType,
+        perf_stats: PerformanceStatistics,
+        auto_retry=1,
+        pool_size: int = 2,
+    ) -> None:
+        self.config = config
+        self.perf_stats = perf_stats
+        self.auto_retry = auto_retry
+        self.conns: list[AsyncHLLConnection | None] = [None] * pool_size
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self._connect_lock: asyncio.Lock | None = None
+        self._blocking_ctl: ServerCtl | None = None
+
+    def __getattr__(self, name: str):
+        command = getattr(ServerCtl, name, None)
+        if name.startswith("_") or not callable(command):
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {name!r}"
+            )
+
+        async def run_blocking(*args, **kwargs):
+            ctl = self.blocking()
+            return await asyncio.to_thread(command, ctl, *args, **kwargs)
+
+        run_blocking.__name__ = name
+        return run_blocking
+
+    def start_background_loop(self) -> Self:
+        """Drive the connections from a daemon thread, for processes that only use the blocking adapter"""
+        loop = asyncio.new_event_loop()
+        threading.Thread(
+            target=loop.run_forever, name="hll-async-rcon", daemon=True
+        ).start()
+        self.loop = loop
+        return self
+
+    def blocking(self) -> ServerCtl:
+        """A `ServerCtl` that sends its requests over this pool"""
+        self._bind_loop()
+        if self._blocking_ctl is None:
+            self._blocking_ctl = ServerCtl(
+                self.config,
+                self.perf_stats,
+                auto_retry=self.auto_retry,
+                async_ctl=self,
+            )
+        return self._blocking_ctl
+
+    def blocking_connection(self) -> "BlockingHLLConnection":
+        return BlockingHLLConnection(self)
+
+    def in_flight(self) -> int:
+        """The number of requests currently pipelined over the pool"""
+        return sum(c.in_flight for c in self.conns if c is not None)
+
+    async def close(self) -> None:
+        conns = [c for c in self.conns if c is not None]
+        self.conns = [None] * len(self.conns)
+        for conn in conns:
+            await conn.close()
+
+    def _bind_loop(self) -> None:
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+
+    async def _get_connection(self) -> AsyncHLLConnection:
+        """Return an idle pooled connection, or open one if there is room, or the least busy one"""
+        self._bind_loop()
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+
+        async with self._connect_lock:
+            open_slot: int | None = None
+            least_busy: AsyncHLLConnection | None = None
+            for idx, conn in enumerate(self.conns):
+                if conn is None or conn.broken:
+                    if open_slot is None:
+                        open_slot = idx
+                    continue
+                if conn.in_flight == 0:
+                    return conn
+                if least_busy is None or conn.in_flight < least_busy.in_flight:
+                    least_busy = conn
+
+            if open_slot is None and least_busy is not None:
+                return least_busy
+
+            broken = self.conns[open_slot]
+            if broken is not None:
+                logger.warning("Reconnecting broken async connection (%s)", broken.id)
+                self.conns[open_slot] = None
+                await broken.close()
+                self.perf_stats.increment("mux_reconnect")
+
+            conn = AsyncHLLConnection()
+            await conn.connect(
+                self.config["host"], int(self.config["port"]), self.config["password"]
+            )
+            self.conns[open_slot] = conn
+            self.perf_stats.increment("connection_established")
+            return conn
+
+    async def send(
+        self, command: str, version: int, content: dict[str, Any] | str = ""
+    ) -> AsyncHandle:
+        logger.debug("Sending command: %s %s", command, content)
+        self.perf_stats.increment("send")
+        self.perf_stats.increment("send_size", len(content))
+        return await self._send(command, version, content)
+
+    async def _send(
+        self, command: str, version: int, content: dict[str, Any] | str = ""
+    ) -> AsyncHandle:
+        conn = await self._get_connection()
+        return await conn.send(command, version, content)
+
+    async def _exchange(
+        self, command: str, version: int, content: dict[str, Any] | str = ""
+    ) -> Response:
+        started = time.monotonic()
+        try:
+            response = await (await self.send(command, version, content)).receive()
+        except RETRYABLE_ERRORS:
+            if not self.auto_retry:
+                raise
+            logger.exception(
+                "Failed %s %s %s, resending after 1 second", command, version, content
+            )
+            await asyncio.sleep(1)
+            response = await (await self.send(command, version, content)).receive()
+
+        self.perf_stats.increment("receive_size", len(response.content))
+        self.perf_stats.timing(command, time.monotonic() - started)
+        return response
+
+    async def exchange(
+        self, command: str, version: int, content: dict[str, Any] | str = ""
+    ) -> Response:
+        response = await self._exchange(command, version, content)
+        response.raise_for_status()
+        return response
+
+    async def exchange_optional(
+        self,
+        command: str,
+        version: int,
+        content: dict[str, Any] | str = "",
+        ignore_internal_errors: bool = False,
+    ) -> Response | None:
+        response = await self._exchange(command, version, content)
+        try:
+            return response if response.is_successful() else None
+        except HLLCommandError:
+            if ignore_internal_errors:
+                return None
+            raise
+
+    async def exchange_success(
+        self, command: str, version: int, content: dict[str, Any] | str = ""
+    ) -> bool:
+        return await self.exchange_optional(command, version, content) is not None
+
+    async def get_player_ids(self) -> dict[str, str]:
+        players = await self.get_all_player_info()
+        return {x["name"]: x["iD"] for x in players}
+
+    async def get_all_player_info(self) -> list[PlayerInfoType]:
+        response = await self.exchange(
+            "GetServerInformation", 2, {"Name": "players", "Value": ""}
+        )
+        return response.content_dict["players"]
+
+    async def get_player_info(self, player_id: str) -> PlayerInfoType | None:
+        response = await self.exchange(
+            "GetServerInformation", 2, {"Name": "player", "Value": player_id}
+        )
+        return response.content_dict  # type: ignore
+
+    async def get_players_info_batch(
+        self, player_ids: Iterable[str]
+    ) -> dict[str, PlayerInfoType | None]:
+        player_ids = list(dict.fromkeys(player_ids))
+        responses = await asyncio.gather(
+            *(
+                self.exchange_optional(
+                    "GetServerInformation",
+                    2,
+                    {"Name": "player", "Value": player_id},
+                    ignore_internal_errors=True,
+                )
+                for player_id in player_ids
+            )
+        )
+        return {
+            player_id: response.content_dict if response is not None else None  # type: ignore
+            for player_id, response in zip(player_ids, responses)
+        }
+
+    async def get_slots(self) -> SlotsType:
+        resp = (
+            await self.exchange(
+                "GetServerInformation", 2, {"Name": "session", "Value": ""}
+            )
+        ).content_dict
+        return SlotsType(
+            current_players=resp["playerCount"],
+            max_players=resp["maxPlayerCount"],
+        )
+
+    async def get_logs(
+        self, since_min_ago: int | float, filter_: str = ""
+    ) -> list[str]:
+        response = await self.exchange(
+            "GetAdminLog",
+            2,
+            {
+                "LogBackTrackTime": math.ceil(float(since_min_ago) * 60),
+                "Filters": filter_,
+            },
+        )
+        return [entry["message"] for entry in response.content_dict["entries"]]
+
+    @_escape_params
+    async def message_player(self, player_id: str, message: str) -> bool:
+        return await self.exchange_success(
+            "MessagePlayer", 2, {"Message": message, "PlayerId": player_id}
+        )
+
+    @_escape_params
+    async def punish(self, player_id: str, reason: str) -> bool:
+        return await self.exchange_success(
+            "PunishPlayer", 2, {"PlayerId": player_id, "Reason": reason}
+        )
+
+    @_escape_params
+    async def kick(self, player_id: str, reason: str) -> bool:
+        return await self.exchange_success(
+            "KickPlayer", 2, {"PlayerId": player_id, "Reason": reason}
+        )
+
+
+class BlockingHandle(Handle):
+    def __init__(self, conn: "BlockingHLLConnection", handle: AsyncHandle) -> None:
+        super().__init__(conn, handle.request)  # type: ignore
+        self.handle = handle
+
+    def receive(self) -> Response:
+        if self._response is None:
+            self._response = self.conn._run(self.handle.receive())  # type: ignore
+        return self._response
+
+
+class BlockingHLLConnection:
+    """Blocking view of an `AsyncServerCtl`, handed out by `ServerCtl.with_connection`
+
+    Calls are run on the event loop of the `AsyncServerCtl` and block the
+    calling thread until they complete, so they must not be made from the
+    event loop's own thread.
+    """
+
+    def __init__(self, ctl: AsyncServerCtl) -> None:
+        self.ctl = ctl
+        self.id = f"blocking-{uuid.uuid4()}"
+
+    def _run(self, coro):
+        loop = self.ctl.loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if loop is None or running is loop:
+            coro.close()
+            raise RuntimeError(
+                "Blocking RCON calls need the async connection pool running on another thread"
+            )
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def send(
+        self, command: str, version: int, body: dict[str, Any] | str = ""
+    ) -> Handle:
+        return BlockingHandle(self, self._run(self.ctl._send(command, version, body)))
+
+    def exchange(
+        self, command: str, version: int, body: dict[str, Any] | str = ""
+    ) -> Response:
+        return self.send(command, version, body).receive()
+
+    def close(self) -> None:
+        # The connections belong to the pool, broken ones are replaced by it
+        pass
@@ -1,21 +1,167 @@
 import functools
+import hashlib
 import logging
+import math
 import os
-import pickle
+import threading
+import time
+import weakref
 from contextlib import contextmanager
-from typing import Callable
+from typing import TYPE_CHECKING, Any, Callable, Iterable
 
 import redis
 import redis.exceptions
 import simplejson
+from cachetools import TTLCache
 from cachetools.func import ttl_cache as cachetools_ttl_cache
 
+from rcon.codecs import PICKLE, Codec
+
+if TYPE_CHECKING:
+    from rcon.perf_statistics import PerformanceStatistics
+
 logger = logging.getLogger(__name__)
 
 _REDIS_POOL = None
 # We use the redis database with db number 0 as a shared database amongst all the containers
 _GLOBAL_REDIS_POOL = None
 
+L1_INVALIDATION_CHANNEL = "cache_l1_invalidation"
+
+# Incremented to invalidate the values of every cached function at once
+GLOBAL_GENERATION_KEY = "cache_generation:*"
+
+# Read the generation of a cached function and its value under that generation in one round trip
+_GET_WITH_GENERATION = """
+local generation = (redis.call('GET', KEYS[1]) or '0') .. '.' .. (redis.call('GET', KEYS[2]) or '0')
+return {generation, redis.call('GET', ARGV[1] .. generation .. ARGV[2])}
+"""
+_GET_WITH_GENERATION_SHA = hashlib.sha1(_GET_WITH_GENERATION.encode()).hexdigest()
+L1_STATS_FLUSH_SECONDS = 10
+
+
+class L1Invalidator:
+    """Clears the in process caches of RedisCached when any process invalidates a cached value
+
+    Messages on the channel are either a key prefix (a whole function), a key
+    prefix and the hex of a key (a single call) or * (every cached function).
+    The in process caches are bypassed while the subscription is down, as they
+    could miss invalidations.
+    """
+
+    def __init__(self) -> None:
+        self.caches: weakref.WeakSet[RedisCached] = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._retry_after = 0.0
+
+    def register(self, cache: "RedisCached") -> None:
+        self.caches.add(cache)
+
+    def active(self, red: redis.Redis) -> bool:
+        if self._thread is not None and self._thread.is_alive():
+            return True
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return True
+            if time.monotonic() < self._retry_after:
+                return False
+            # Anything cached before the subscription went down could be stale
+            self.clear_local("*")
+            try:
+                pubsub = red.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{L1_INVALIDATION_CHANNEL: self._on_message})
+                self._thread = pubsub.run_in_thread(
+                    sleep_time=1, daemon=True, exception_handler=self._on_error
+                )
+            except redis.exceptions.RedisError:
+                logger.exception("Unable to subscribe to cache invalidations")
+                self._thread = None
+                self._retry_after = time.monotonic() + 5
+                return False
+        return True
+
+    def _on_error(self, error, pubsub, thread) -> None:
+        logger.warning("Cache invalidation subscription lost: %s", error)
+        self._retry_after = time.monotonic() + 5
+        thread.stop()
+        pubsub.close()
+
+    def _on_message(self, message) -> None:
+        data = message["data"]
+        if isinstance(data, bytes):
+            data = data.decode()
+        self.clear_local(data)
+
+    def clear_local(self, message: str) -> None:
+        prefix, _, key_hex = message.partition(" ")
+        key = bytes.fromhex(key_hex) if key_hex else None
+        for cache in list(self.caches):
+            if prefix == "*" or cache.key_prefix == prefix:
+                cache.l1_clear(key)
+
+    def publish(self, red: redis.Redis, message: str) -> None:
+        self.clear_local(message)
+        try:
+            red.publish(L1_INVALIDATION_CHANNEL, message)
+        except redis.exceptions.RedisError:
+            logger.exception("Unable to publish cache invalidation")
+
+
+_L1_INVALIDATOR = L1Invalidator()
+
+
+def register_local_cache(cache) -> None:
+    """Have cache.l1_clear(key) called on the invalidations published for cache.key_prefix"""
+    _L1_INVALIDATOR.register(cache)
+
+
+def local_caches_active(red: redis.Redis) -> bool:
+    """Whether invalidations are received, subscribing to them if needed"""
+    return _L1_INVALIDATOR.active(red)
+
+
+def publish_invalidation(
+    red: redis.Redis, prefix: str, key: bytes | None = None
+) -> None:
+    """Clear key, or every key, of the local caches registered for prefix in every process"""
+    message = prefix if key is None else f"{prefix} {key.hex()}"
+    _L1_INVALIDATOR.publish(red, message)
+
+
+_L1_STATS = {"hit": 0, "miss": 0}
+_L1_PERF_STATS: "PerformanceStatistics | None" = None
+_L1_LAST_FLUSH = time.monotonic()
+
+
+def set_l1_perf_stats(perf_stats: "PerformanceStatistics") -> None:
+    """Report the in process cache hits and misses of this process to perf_stats"""
+    global _L1_PERF_STATS
+    _L1_PERF_STATS = perf_stats
+
+
+def get_l1_stats() -> dict[str, int]:
+    """The in process cache hits and misses of this process not reported yet"""
+    return dict(_L1_STATS)
+
+
+def _record_l1(hit: bool) -> None:
+    global _L1_LAST_FLUSH
+    _L1_STATS["hit" if hit else "miss"] += 1
+
+    now = time.monotonic()
+    if _L1_PERF_STATS is None or now - _L1_LAST_FLUSH < L1_STATS_FLUSH_SECONDS:
+        return
+    _L1_LAST_FLUSH = now
+    hits, misses = _L1_STATS["hit"], _L1_STATS["miss"]
+    _L1_STATS["hit"] -= hits
+    _L1_STATS["miss"] -= misses
+    try:
+        _L1_PERF_STATS.increment("cache_l1_hit", hits)
+        _L1_PERF_STATS.increment("cache_l1_miss", misses)
+    except redis.exceptions.RedisError:
+        logger.exception("Unable to report cache statistics")
+
 
 class RedisCached:
     PREFIX = "cached_"
@@ -31,6 +177,11 @@ class RedisCached:
         cache_falsy=True,
         serializer=simplejson.dumps,
         deserializer=simplejson.loads,
+        l1_ttl_seconds: int | None = None,
+        l1_max_size: int = 256,
+        stale_ttl_seconds: int | None = None,
+        lock_timeout_seconds: int = 10,
+        lock_wait_seconds: float = 2,
     ):
         # TODO: isinstance check ttl_seconds it must be an int
         # not a float or anything else
@@ -48,21 +199,78 @@ class RedisCached:
         self.ttl_seconds = ttl_seconds
         self.is_method = is_method
         self.cache_falsy = cache_falsy
+        # How long past its TTL a value can be served while another caller
+        # recomputes it, off unless set
+        self.stale_ttl_seconds = stale_ttl_seconds or 0
+        self.lock_timeout_seconds = lock_timeout_seconds
+        self.lock_wait_seconds = lock_wait_seconds
+        # Optional in process cache in front of redis, holding the serialized values
+        self.l1: TTLCache | None = None
+        if l1_ttl_seconds:
+            self.l1 = TTLCache(
+                maxsize=l1_max_size, ttl=min(l1_ttl_seconds, ttl_seconds)
+            )
+            self._l1_lock = threading.Lock()
+            _L1_INVALIDATOR.register(self)
 
     @staticmethod
     def clear_all_caches(pool) -> bool:
+        """Invalidate the values of every cached function by moving to the next global generation
+
+        The previous keys are never read again and expire on their own.
+        """
         red = redis.Redis(connection_pool=pool)
-        keys = list(red.scan_iter(match=f"{RedisCached.PREFIX}*"))
-        logger.warning("Wiping cached values %s", keys)
-        if not keys:
-            return 0
-        return red.delete(*keys)
+        logger.warning("Wiping cached values")
+        red.incr(GLOBAL_GENERATION_KEY)
+        _L1_INVALIDATOR.publish(red, "*")
+        return True
+
+    def _l1_get(self, key):
+        if self.l1 is None or not _L1_INVALIDATOR.active(self.red):
+            return None
+        with self._l1_lock:
+            val = self.l1.get(key)
+        _record_l1(val is not None)
+        return val
+
+    def _l1_set(self, key, val) -> None:
+        if self.l1 is None:
+            return
+        with self._l1_lock:
+            self.l1[key] = val
+
+    def l1_clear(self, key: bytes | None = None) -> None:
+        """Drop the given key, or every key, from the in process cache of this process only"""
+        if self.l1 is None:
+            return
+        with self._l1_lock:
+            if key is None:
+                self.l1.clear()
+            else:
+                # Keys are str when the serializer returns str
+                self.l1.pop(key, None)
+                self.l1.pop(key.decode(errors="replace"), None)
+
+    def _publish_invalidation(self, key=None) -> None:
+        if self.l1 is None:
+            return
+        message = self.key_prefix
+        if key is not None:
+            key_bytes = key if isinstance(key, bytes) else key.encode()
+            message += " " + key_bytes.hex()
+        _L1_INVALIDATOR.publish(self.red, message)
 
     @property
     def key_prefix(self):
         return f"{self.PREFIX}{self.function.__qualname__}"
 
-    def key(self, *args, **kwargs):
+    @property
+    def generation_key(self):
+        """Incremented to invalidate every cached value of the function at once"""
+        return f"cache_generation:{self.key_prefix}"
+
+    def base_key(self, *args, **kwargs):
+        """The key of a call regardless of the generation, used by the in process cache"""
         if self.is_method:
             args = args[1:]
         params = self.serializer({"args": args, "kwargs": kwargs})
@@ -70,6 +278,44 @@ class RedisCached:
             return self.key_prefix.encode() + b"__" + params
         return f"{self.key_prefix}__{params}"
 
+    def _generation(self) -> str:
+        """<global generation>.<generation of the function>"""
+        generations = self.red.mget(GLOBAL_GENERATION_KEY, self.generation_key)
+        return ".".join(
+            (g.decode() if isinstance(g, bytes) else g) or "0" for g in generations
+        )
+
+    def _versioned(self, generation: str, base_key):
+        """The redis key of base_key in the given generation: <prefix>@<generation>__<params>"""
+        if isinstance(base_key, bytes):
+            prefix = self.key_prefix.encode()
+            return prefix + b"@" + generation.encode() + base_key[len(prefix) :]
+        return f"{self.key_prefix}@{generation}{base_key[len(self.key_prefix):]}"
+
+    def key(self, *args, **kwargs):
+        return self._versioned(self._generation(), self.base_key(*args, **kwargs))
+
+    def _get_with_generation(self, base_key):
+        """Return the current generation and the value of base_key in it"""
+        prefix = (
+            self.key_prefix.encode() if isinstance(base_key, bytes) else self.key_prefix
+        )
+        params = base_key[len(prefix) :]
+        script_args = (
+            2,
+            GLOBAL_GENERATION_KEY,
+            self.generation_key,
+            f"{self.key_prefix}@",
+            params,
+        )
+        try:
+            generation, val = self.red.evalsha(_GET_WITH_GENERATION_SHA, *script_args)
+        except redis.exceptions.NoScriptError:
+            generation, val = self.red.eval(_GET_WITH_GENERATION, *script_args)
+        if isinstance(generation, bytes):
+            generation = generation.decode()
+        return generation, val
+
     @property
     def __name__(self):
         return self.function.__name__
@@ -80,29 +326,121 @@ class RedisCached:
 
     def __call__(self, *args, **kwargs):
         val = None
-        key = self.key(*args, **kwargs)
+        base_key = self.base_key(*args, **kwargs)
         func = self.function
+        if (val := self._l1_get(base_key)) is not None:
+            return self.deserializer(val)
         try:
-            val = self.red.get(key)
+            generation, val = self._get_with_generation(base_key)
+            key = self._versioned(generation, base_key)
         except redis.exceptions.RedisError as e:
             logger.exception("Unable to use cache: %s", e)
             if self.function_cache_unavailable:
                 func = self.function_cache_unavailable
                 logger.error("Using fallback function due to cache failure: %s", func)
+            return func(*args, **kwargs)
 
         if val is not None:
             # logger.debug("Cache HIT for %s", self.key(*args, **kwargs))
+            self._l1_set(base_key, val)
             return self.deserializer(val)
 
         # logger.debug("Cache MISS for %s", self.key(*args, **kwargs))
+        # Only one caller recomputes an expired value, the others serve the
+        # stale value or wait for the fresh one instead of all calling func
+        try:
+            lock = self.red.lock(
+                self._suffixed(key, "__lock"), timeout=self.lock_timeout_seconds
+            )
+            acquired = lock.acquire(blocking=False)
+        except redis.exceptions.RedisError:
+            logger.exception("Unable to lock cache")
+            return self._compute(func, key, base_key, args, kwargs)
+
+        if acquired:
+            try:
+                return self._compute(
+                    func, key, base_key, args, kwargs, signal_waiters=True
+                )
+            finally:
+                try:
+                    lock.release()
+                except redis.exceptions.RedisError:
+                    logger.warning("Cache lock of %s expired while computing", key)
+
+        if (val := self._wait_for_value(key)) is not None:
+            return self.deserializer(val)
+        return self._compute(func, key, base_key, args, kwargs)
+
+    @staticmethod
+    def _suffixed(key, suffix: str):
+        if isinstance(key, bytes):
+            return key + suffix.encode()
+        return key + suffix
+
+    def _wait_for_value(self, key):
+        """The stale value of key if there is one, the one the lock holder computed otherwise
+
+        None when the holder failed or took longer than lock_wait_seconds.
+        """
+        lock_key = self._suffixed(key, "__lock")
+        done_key = self._suffixed(key, "__done")
+        try:
+            if (
+                self.stale_ttl_seconds
+                and (val := self.red.get(self._suffixed(key, "__stale"))) is not None
+            ):
+                return val
+            deadline = time.monotonic() + self.lock_wait_seconds
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                pipe = self.red.pipeline(transaction=False)
+                pipe.get(key)
+                pipe.get(done_key)
+                pipe.exists(lock_key)
+                val, done, locked = pipe.execute()
+                if val is not None:
+                    return val
+                if done is not None:
+                    return done
+                if not locked:
+                    # Released without a value, the holder raised
+                    return None
+        except redis.exceptions.RedisError:
+            logger.exception("Unable to use cache")
+            return None
+        logger.warning("Timed out waiting for %s, computing it", key)
+        return None
+
+    def _compute(self, func, key, base_key, args, kwargs, signal_waiters=False):
         val = func(*args, **kwargs)
 
         if not val and not self.cache_falsy:
             logger.debug("Caching falsy result is disabled for %s", self.__name__)
+            if signal_waiters:
+                # Not cached, but handed to the callers waiting on this computation
+                try:
+                    self.red.setex(
+                        self._suffixed(key, "__done"),
+                        max(1, math.ceil(self.lock_wait_seconds)),
+                        self.serializer(val),
+                    )
+                except redis.exceptions.RedisError:
+                    logger.exception("Unable to set cache")
             return val
 
         try:
-            self.red.setex(key, self.ttl_seconds, self.serializer(val))
+            serialized = self.serializer(val)
+            pipe = self.red.pipeline(transaction=False)
+            pipe.setex(key, self.ttl_seconds, serialized)
+            if self.stale_ttl_seconds:
+                pipe.setex(
+                    self._suffixed(key, "__stale"),
+                    self.ttl_seconds + self.stale_ttl_seconds,
+                    serialized,
+                )
+            pipe.execute()
+            self._l1_set(base_key, serialized)
             # logger.debug("Cache SET for %s", self.key(*args, **kwargs))
         except redis.exceptions.RedisError:
             logger.exception("Unable to set cache")
@@ -116,24 +454,64 @@ class RedisCached:
             key = self.key(*args, **kwargs)
         return self.red.get(key)
 
+    def _base_key_for(self, args: tuple) -> str | bytes:
+        if self.is_method:
+            return self.base_key(None, *args)
+        return self.base_key(*args)
+
+    def get_many(self, args_list: Iterable[tuple]) -> list[Any]:
+        """Return the cached values of many calls in two round trips, None for the misses"""
+        base_keys = [self._base_key_for(args) for args in args_list]
+        if not base_keys:
+            return []
+        try:
+            generation = self._generation()
+            values = self.red.mget([self._versioned(generation, k) for k in base_keys])
+        except redis.exceptions.RedisError:
+            logger.exception("Unable to use cache")
+            return [None] * len(base_keys)
+        return [None if v is None else self.deserializer(v) for v in values]
+
+    def set_many(self, items: Iterable[tuple[tuple, Any]]) -> None:
+        """Cache the results of many calls, given as (args, value) pairs, in two round trips"""
+        serialized = [
+            (self._base_key_for(args), self.serializer(val))
+            for args, val in items
+            if val or self.cache_falsy
+        ]
+        try:
+            generation = self._generation()
+            pipe = self.red.pipeline(transaction=False)
+            for base_key, val in serialized:
+                pipe.setex(self._versioned(generation, base_key), self.ttl_seconds, val)
+            pipe.execute()
+        except redis.exceptions.RedisError:
+            logger.exception("Unable to set cache")
+            return
+        for base_key, val in serialized:
+            self._l1_set(base_key, val)
+
     def clear_for(self, *args, **kwargs):
         if self.is_method:
-            key = self.key(None, *args, **kwargs)
+            base_key = self.base_key(None, *args, **kwargs)
         else:
-            key = self.key(*args, **kwargs)
+            base_key = self.base_key(*args, **kwargs)
+        key = self._versioned(self._generation(), base_key)
         logger.debug("Invalidating cache for %s", key)
         if key:
-            self.red.delete(key)
+            self.red.delete(key, self._suffixed(key, "__stale"))
+            self._publish_invalidation(base_key)
 
     def clear_all(self):
+        """Invalidate every cached value of the function by moving to the next generation
+
+        The keys of the previous generations are never read again and expire on their own.
+        """
         try:
-            keys = list(self.red.scan_iter(match=f"{self.key_prefix}*"))
-            if keys:
-                self.red.delete(*keys)
+            self.red.incr(self.generation_key)
         except redis.exceptions.RedisError:
             logger.exception("Unable to clear cache")
-        # else:
-        #   logger.debug("Cache CLEARED for %s", keys)
+        self._publish_invalidation()
 
 
 def construct_redis_url(db_number: int = 0) -> str:
@@ -205,8 +583,24 @@ def ttl_cache(
     is_method=True,
     cache_falsy=True,
     function_cache_unavailable=None,
+    l1_ttl=None,
+    stale_ttl=None,
+    codec: Codec = PICKLE,
     **kwargs,
 ):
+    """Cache the results of the decorated function in redis for ttl seconds
+
+    When l1_ttl is set, the results are also kept in process for up to l1_ttl
+    seconds (capped by ttl), invalidations are broadcast to all the processes.
+    Only worth it for values that are read very often and rarely change.
+
+    When stale_ttl is set, an expired value is still served for up to
+    stale_ttl seconds to the callers that miss while another one recomputes
+    it. Meant for hot, short lived values that many processes read at once.
+
+    Values are pickled by default, use a rcon.codecs.CompressedCodec for large
+    values.
+    """
     pool = get_redis_pool(decode_responses=False)
     # Allow use of in memory cache and not redis when running tests
     # but still use redis when running the development web server
@@ -230,8 +624,10 @@ def ttl_cache(
             function_cache_unavailable=function_cache_unavailable,
             is_method=is_method,
             cache_falsy=cache_falsy,
-            serializer=pickle.dumps,
-            deserializer=pickle.loads,
+            serializer=codec.dumps,
+            deserializer=codec.loads,
+            l1_ttl_seconds=l1_ttl,
+            stale_ttl_seconds=stale_ttl,
         )
 
         def wrapper(*args, **kwargs):
@@ -242,6 +638,8 @@ def ttl_cache(
         wrapper.cache_clear = cached_func.clear_all
         wrapper.get_cached_value_for = cached_func.get_cached_value_for
         wrapper.clear_for = cached_func.clear_for
+        wrapper.get_many = cached_func.get_many
+        wrapper.set_many = cached_func.set_many
         wrapper.cache = cached_func
         return wrapper
 
@@ -23,10 +23,13 @@ from rcon.discord_chat import get_handler
 from rcon.logs.loop import LogLoop, load_generic_hooks
 from rcon.logs.recorder import LogRecorder
 from rcon.logs.stream import LogStream
-from rcon.models import PlayerID, enter_session, install_unaccent
+from rcon.match_facts import maps_missing_facts, refresh_match_facts
+from rcon.models import Maps, PlayerID, enter_session, install_unaccent
 from rcon.player_stats import live_stats_loop
 from rcon.rcon import get_rcon
+from rcon.stats_rollups import rebuild_rollups
 from rcon.steam_utils import enrich_db_users
+from rcon.team_view import TeamViewMaterializer
 from rcon.user_config.auto_settings import AutoSettingsConfig
 from rcon.user_config.log_stream import LogStreamUserConfig
 from rcon.user_config.scoreboard import _port_legacy_scorebot_urls
@@ -35,7 +38,7 @@ from rcon.user_config.webhooks import (
     BaseUserConfig,
     BaseWebhookUserConfig,
 )
-from rcon.utils import ApiKey
+from rcon.utils import ApiKey, batched
 from rcon.vote_map import VoteMap
 
 logger = logging.getLogger(__name__)
@@ -62,6 +65,17 @@ def run_stats_loop():
         sys.exit(1)
 
 
+@cli.command(name="team_view")
+def run_team_view():
+    try:
+        TeamViewMaterializer(get_rcon()).run()
+    except KeyboardInterrupt:
+        sys.exit(0)
+    except:
+        logger.exception("Team view stopped")
+        sys.exit(1)
+
+
 @cli.command(name="enrich_db_users")
 def run_enrich_db_users():
     try:
@@ -523,6 +537,25 @@ def _merge_duplicate_player_ids(existing_ids: set[str] | None = None):
                 ),
                 {"keep": keep, "ids": ids},
             )
+            for table in (
+                "player_match_weapon",
+                "player_match_victim",
+                "player_match_killer",
+            ):
+                session.execute(
+                    text(
+                        f"UPDATE {table} SET playersteamid_id = :keep WHERE playersteamid_id = ANY(:ids)"
+                    ),
+                    {"keep": keep, "ids": ids},
+                )
+            session.execute(
+                text(
+                    "UPDATE player_match_side SET player_id = :keep WHERE player_id = ANY(:ids)"
+                ),
+                {"keep": keep, "ids": ids},
+            )
+            # The stats of the merged IDs now count towards the kept one
+            rebuild_rollups(session, [keep, *ids])
             session.execute(
                 text(
                     "UPDATE player_vip SET playersteamid_id = :keep WHERE playersteamid_id = ANY(:ids)"
@@ -591,6 +624,37 @@ def convert_win_player_ids():
         _merge_duplicate_player_ids(existing_ids=player_ids_to_merge)
 
 
+@cli.command(name="backfill_match_facts")
+@click.option(
+    "-b", "--batch-size", default=500, help="The number of matches per transaction"
+)
+@click.option(
+    "--all",
+    "all_",
+    is_flag=True,
+    default=False,
+    help="Rebuild the facts of every match instead of only those that have none yet",
+)
+def backfill_match_facts(batch_size, all_=False):
+    with enter_session() as session:
+        if all_:
+            map_ids = list(
+                session.execute(
+                    select(Maps.id).where(Maps.player_stats.any()).order_by(Maps.id)
+                ).scalars()
+            )
+        else:
+            map_ids = maps_missing_facts(session)
+
+    logger.info(
+        "Backfilling the weapon, victim and killer facts of %s matches", len(map_ids)
+    )
+    for batch in batched(map_ids, batch_size):
+        with enter_session() as session:
+            refresh_match_facts(session, batch)
+        logger.info("Backfilled matches up to ID %s", batch[-1])
+
+
 @cli.command(name="remove_orphaned_map_ids")
 def remove_orphaned_map_ids():
     vm = VoteMap()
@@ -0,0 +1,138 @@
+"""Codecs for the values CRCON stores in redis
+
+RedisCached, FixedLenList, Stream and the live stats all take a codec (or its
+dumps/loads as serializer/deserializer), which makes it possible to trade
+between the types a format can round trip, its size and its speed:
+
+- pickle round trips any python object (layers, enums, datetimes...)
+- orjson is the fastest but only for JSON types
+- msgpack is more compact than JSON
+
+CompressedCodec compresses the output of another codec once it's over a size
+threshold, with zstandard and zlib as a fallback.
+
+msgpack and zstandard are in requirements.txt, they are still imported
+optionally so their codecs are the only thing missing without them.
+"""
+
+import abc
+import datetime
+import pickle
+import zlib
+from typing import Any
+
+import orjson
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class Codec(abc.ABC):
+    name = ""
+
+    @abc.abstractmethod
+    def dumps(self, obj: Any) -> bytes: ...
+
+    @abc.abstractmethod
+    def loads(self, data: bytes) -> Any: ...
+
+
+class PickleCodec(Codec):
+    name = "pickle"
+
+    def dumps(self, obj: Any) -> bytes:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def loads(self, data: bytes) -> Any:
+        return pickle.loads(data)
+
+
+class OrjsonCodec(Codec):
+    name = "orjson"
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+def _msgpack_default(obj: Any) -> Any:
+    # Same as orjson, so both give the same values back
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    raise TypeError(f"Type is not msgpack serializable: {type(obj).__name__}")
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+
+    def __init__(self) -> None:
+        if msgpack is None:
+            raise ImportError("The msgpack package is required to use MsgpackCodec")
+
+    def dumps(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True, default=_msgpack_default)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+class CompressedCodec(Codec):
+    """Compress the output of codec when it's at least threshold bytes
+
+    Values start with MAGIC and a byte telling how the rest is encoded. MAGIC
+    can't start a pickle, JSON (it isn't valid UTF-8) or msgpack (0xC1 is the
+    one byte msgpack never uses), so data without it was written by codec
+    alone before it was wrapped and is decoded as such.
+    """
+
+    MAGIC = 0xC1
+    RAW = 0
+    ZLIB = 1
+    ZSTD = 2
+
+    def __init__(self, codec: Codec, threshold: int = 4096, level: int = 3) -> None:
+        self.codec = codec
+        self.threshold = threshold
+        self.level = level
+        self.name = f"{codec.name}+{'zstd' if zstandard else 'zlib'}"
+        if zstandard is not None:
+            self._compressor = zstandard.ZstdCompressor(level=level)
+            self._decompressor = zstandard.ZstdDecompressor()
+
+    def dumps(self, obj: Any) -> bytes:
+        data = self.codec.dumps(obj)
+        if len(data) < self.threshold:
+            return bytes((self.MAGIC, self.RAW)) + data
+        if zstandard is not None:
+            return bytes((self.MAGIC, self.ZSTD)) + self._compressor.compress(data)
+        return bytes((self.MAGIC, self.ZLIB)) + zlib.compress(data, self.level)
+
+    def loads(self, data: bytes) -> Any:
+        if not data or data[0] != self.MAGIC:
+            return self.codec.loads(data)
+        encoding = data[1] if len(data) > 1 else None
+        if encoding == self.RAW:
+            return self.codec.loads(data[2:])
+        if encoding == self.ZLIB:
+            return self.codec.loads(zlib.decompress(data[2:]))
+        if encoding == self.ZSTD:
+            if zstandard is None:
+                raise ImportError(
+                    "The zstandard package is required to decode this value"
+                )
+            return self.codec.loads(self._decompressor.decompress(data[2:]))
+        raise ValueError(f"Unknown compressed value encoding: {encoding}")
+
+
+PICKLE = PickleCodec()
+ORJSON = OrjsonCodec()
+COMPRESSED_PICKLE = CompressedCodec(PICKLE)
@@ -1,17 +1,27 @@
 from datetime import timedelta
 import logging
+import math
 import threading
 import time
 from contextlib import contextmanager, nullcontext
 from functools import wraps
-from typing import Generator, Literal, Sequence, Any, List
-
-from rcon.connection import HLLCommandError, HLLConnection, Handle, Response
+from typing import TYPE_CHECKING, Generator, Iterable, Literal, Sequence, Any, List
+
+from rcon.connection import (
+    HLLCommandError,
+    HLLConnection,
+    Handle,
+    MultiplexedHLLConnection,
+    Response,
+)
 from rcon.maps import LAYERS, MAPS, UNKNOWN_MAP_NAME, Environment, GameMode, LayerType
 from rcon.perf_statistics import PerformanceStatistics
 from rcon.types import MapRotationResponse, MapSequenceResponse, PlayerInfoType, ServerInfoType, SlotsType, VipId, GameStateType, AdminType
 from rcon.utils import exception_in_chain
 
+if TYPE_CHECKING:
+    from rcon.async_connection import AsyncServerCtl
+
 logger = logging.getLogger(__name__)
 
 
@@ -59,13 +69,28 @@ class ServerCtl:
     """
 
     def __init__(
-        self, config: ServerInfoType, perf_stats: PerformanceStatistics, auto_retry=1
+        self,
+        config: ServerInfoType,
+        perf_stats: PerformanceStatistics,
+        auto_retry=1,
+        multiplexed: bool = False,
+        multiplexed_pool_size: int = 2,
+        async_ctl: "AsyncServerCtl | None" = None,
     ) -> None:
         self.config = config
         self.perf_stats = perf_stats
         self.auto_retry = auto_retry
         self.mu = threading.Lock()
         self.conns: dict[int, HLLConnection] = {}
+        # In multiplexed mode every thread shares a small fixed pool of connections
+        # and pipelines its requests over them instead of opening one per thread
+        self.multiplexed = multiplexed
+        self.mux_conns: list[MultiplexedHLLConnection | None] = [
+            None
+        ] * multiplexed_pool_size
+        # When given, requests are sent over the connections of an asyncio pool
+        # running on another thread instead
+        self.async_ctl = async_ctl
 
     @contextmanager
     def with_connection(self) -> Generator[HLLConnection, None, None]:
@@ -77,17 +102,12 @@ class ServerCtl:
             raise TimeoutError()
 
         try:
-            conn = self.conns.get(thread_id)
-            if conn is None:
-                conn = HLLConnection()
-                try:
-                    self._connect(conn)
-                except Exception:
-                    raise
-                self.conns[thread_id] = conn
-                self.perf_stats.increment("connection_established")
+            if self.async_ctl is not None:
+                conn = self.async_ctl.blocking_connection()
+            elif self.multiplexed:
+                conn = self._get_multiplexed_connection()
             else:
-                self.perf_stats.increment("connection_from_pool")
+                conn = self._get_thread_connection(thread_id)
         finally:
             self.mu.release()
 
@@ -106,17 +126,7 @@ class ServerCtl:
                     thread_id,
                     e,
                 )
-
-                if not self.mu.acquire(timeout=30):
-                    raise TimeoutError()
-
-                try:
-                    conn.close()
-                    self.conns.pop(thread_id, None)
-                    self.perf_stats.increment("connection_closed")
-                finally:
-                    self.mu.release()
-
+                self._discard_connection(conn, thread_id)
                 raise
 
             elif exception_in_chain(e, HLLBrokenConnectionError):
@@ -125,16 +135,7 @@ class ServerCtl:
                     conn.id,
                     thread_id,
                 )
-
-                if not self.mu.acquire(timeout=30):
-                    raise TimeoutError()
-
-                try:
-                    conn.close()
-                    self.conns.pop(thread_id, None)
-                    self.perf_stats.increment("connection_closed")
-                finally:
-                    self.mu.release()
+                self._discard_connection(conn, thread_id)
 
                 if e.__context__ is not None:
                     raise e.__context__
@@ -143,6 +144,70 @@ class ServerCtl:
             else:
                 raise
 
+    def _get_thread_connection(self, thread_id: int) -> HLLConnection:
+        conn = self.conns.get(thread_id)
+        if conn is None:
+            conn = HLLConnection()
+            self._connect(conn)
+            self.conns[thread_id] = conn
+            self.perf_stats.increment("connection_established")
+        else:
+            self.perf_stats.increment("connection_from_pool")
+        return conn
+
+    def _get_multiplexed_connection(self) -> MultiplexedHLLConnection:
+        """Return an idle pooled connection, or open one if there is room, or the least busy one"""
+        open_slot: int | None = None
+        least_busy: MultiplexedHLLConnection | None = None
+        for idx, conn in enumerate(self.mux_conns):
+            if conn is None or conn.broken:
+                if open_slot is None:
+                    open_slot = idx
+                continue
+            if conn.in_flight == 0:
+                self.perf_stats.increment("connection_from_pool")
+                return conn
+            if least_busy is None or conn.in_flight < least_busy.in_flight:
+                least_busy = conn
+
+        if open_slot is None and least_busy is not None:
+            self.perf_stats.increment("connection_from_pool")
+            return least_busy
+
+        broken = self.mux_conns[open_slot]
+        if broken is not None:
+            logger.warning("Reconnecting broken multiplexed connection (%s)", broken.id)
+            broken.close()
+            self.mux_conns[open_slot] = None
+            self.perf_stats.increment("mux_reconnect")
+
+        conn = MultiplexedHLLConnection()
+        self._connect(conn)
+        self.mux_conns[open_slot] = conn
+        self.perf_stats.increment("connection_established")
+        self.perf_stats.gauge(
+            "mux_pool_size", sum(1 for c in self.mux_conns if c is not None)
+        )
+        return conn
+
+    def _discard_connection(self, conn: HLLConnection, thread_id: int) -> None:
+        if not self.mu.acquire(timeout=30):
+            raise TimeoutError()
+
+        try:
+            conn.close()
+            if self.multiplexed:
+                self.mux_conns = [None if c is conn else c for c in self.mux_conns]
+            else:
+                self.conns.pop(thread_id, None)
+            self.perf_stats.increment("connection_closed")
+        finally:
+            self.mu.release()
+
+    def mux_in_flight(self) -> int:
+        """The number of requests currently pipelined over the multiplexed pool"""
+        return sum(c.in_flight for c in self.mux_conns if c is not None)
+
     def _connect(self, conn: HLLConnection) -> None:
         try:
             conn.connect(
@@ -174,6 +239,8 @@ class ServerCtl:
 
         self.perf_stats.increment("send")
         self.perf_stats.increment("send_size", len(content))
+        if self.multiplexed:
+            self.perf_stats.gauge("mux_in_flight", self.mux_in_flight())
         try:
             with connection as conn:
                 return conn.send(command, version, content)
@@ -197,6 +264,7 @@ class ServerCtl:
         try:
             response = handle.receive()
             self.perf_stats.increment("receive_size", len(response.content))
+            self.perf_stats.timing(handle.request.name, time.monotonic() - handle.sent_at)
             response.raise_for_status()
             return response
 
@@ -218,6 +286,7 @@ class ServerCtl:
                     handle.request.content,
                 )
                 handle._response = response
+                self.perf_stats.timing(handle.request.name, time.monotonic() - handle.sent_at)
                 response.raise_for_status()
                 return response
 
@@ -229,6 +298,7 @@ class ServerCtl:
         try:
             response = handle.receive()
             self.perf_stats.increment("receive_size", len(response.content))
+            self.perf_stats.timing(handle.request.name, time.monotonic() - handle.sent_at)
             return response if response.is_successful() else None
 
         except (HLLCommandFailedError, UnicodeDecodeError, OSError) as e:
@@ -249,6 +319,7 @@ class ServerCtl:
                     handle.request.content,
                 )
                 handle._response = response
+                self.perf_stats.timing(handle.request.name, time.monotonic() - handle.sent_at)
 
                 try:
                     return response if response.is_successful() else None
@@ -329,6 +400,19 @@ class ServerCtl:
     def get_player_info(self, player_id: str) -> PlayerInfoType | None:
         return self.exchange("GetServerInformation", 2, {"Name": "player", "Value": player_id}).content_dict
 
+    def get_players_info_batch(self, player_ids: Iterable[str]) -> dict[str, PlayerInfoType | None]:
+        """Pipeline one GetPlayer request per player and collect the answers, None for players that aren't online"""
+        player_ids = list(dict.fromkeys(player_ids))
+        handles = [
+            self.send("GetServerInformation", 2, {"Name": "player", "Value": player_id})
+            for player_id in player_ids
+        ]
+        players: dict[str, PlayerInfoType | None] = {}
+        for player_id, handle in zip(player_ids, handles):
+            response = self.receive_optional(handle, ignore_internal_errors=True)
+            players[player_id] = response.content_dict if response is not None else None  # type: ignore
+        return players
+
     def get_admin_ids(self) -> list[AdminType]:
         return [{
             "player_id": x["userId"],
@@ -392,14 +476,15 @@ class ServerCtl:
 
     def get_logs(
             self,
-            since_min_ago: int,
+            since_min_ago: int | float,
             filter_: str = "",
             conn: HLLConnection | None = None,
     ) -> list[str]:
+        # Fractions of minutes are allowed to only fetch the last few seconds
         return [
             entry["message"]
             for entry in self.exchange("GetAdminLog", 2, {
-                "LogBackTrackTime": since_min_ago * 60,
+                "LogBackTrackTime": math.ceil(float(since_min_ago) * 60),
                 "Filters": filter_
             }, conn=conn).content_dict["entries"]
         ]
@@ -1,4 +1,3 @@
-import array
 import base64
 import itertools
 import json
@@ -6,17 +5,25 @@ import logging
 import socket
 import struct
 import threading
+import time
 import uuid
-from contextlib import contextmanager
+from concurrent.futures import Future
 from enum import IntEnum
 from threading import get_ident
 from typing import Any, ClassVar, Self
 
+import orjson
 from cachetools import TTLCache
 
 TIMEOUT_SEC = 20
+# Timeout of each recv once connected; a response may take up to TIMEOUT_SEC to
+# start but a frame that stops arriving halfway through is given up on sooner
+RECV_TIMEOUT_SEC = 3
 HEADER_FORMAT = "<III"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
 MAGIC_HEADER_VALUE = 0xDE450508
+# Initial size of the per connection receive buffer, it grows to fit the largest response seen
+RECEIVE_BUFFER_SIZE = 64 * 1024
 
 logger = logging.getLogger(__name__)
 
@@ -106,6 +113,7 @@ class Handle:
         self.conn = conn
         self.request = request
         self._response: Response | None = None
+        self.sent_at = time.monotonic()
 
     def receive(self) -> "Response":
         if self._response is None:
@@ -113,6 +121,26 @@ class Handle:
         return self._response
 
 
+class MultiplexedHandle(Handle):
+    def __init__(
+        self,
+        conn: "MultiplexedHLLConnection",
+        request: "Request",
+        future: "Future[Response]",
+    ) -> None:
+        super().__init__(conn, request)
+        self.future = future
+
+    def receive(self) -> "Response":
+        if self._response is None:
+            try:
+                self._response = self.future.result(timeout=TIMEOUT_SEC)
+            except TimeoutError:
+                self.conn.forget(self.request.request_id)
+                raise
+        return self._response
+
+
 class Response:
     def __init__(
         self,
@@ -142,7 +170,7 @@ class Response:
 
     @property
     def content_dict(self) -> dict[str, Any]:
-        parsed_content = json.loads(self.content)
+        parsed_content = orjson.loads(self.content)
         if not isinstance(parsed_content, dict):
             msg = f"Expected JSON content to be a dict, got {type(parsed_content)}"
             raise TypeError(msg)
@@ -158,8 +186,14 @@ class Response:
         return f"{self.status_code} {self.name} {content}"
 
     @classmethod
-    def from_bytes(cls, request_id: int, body_encoded: bytes) -> Self:
-        body = json.loads(body_encoded)
+    def from_bytes(
+        cls, request_id: int, body_encoded: bytes | bytearray | memoryview
+    ) -> Self:
+        try:
+            body = orjson.loads(body_encoded)
+        except orjson.JSONDecodeError:
+            # Let the standard library raise its usual errors (UnicodeDecodeError, etc.)
+            body = json.loads(bytes(body_encoded))
         return cls(
             request_id=request_id,
             command=str(body["name"]),
@@ -182,28 +216,57 @@ class Response:
             raise HLLCommandError(self.status_code, self.status_message)
 
 
-@contextmanager
-def set_timeout(sock: socket.socket, timeout: float):
-    original_timeout = sock.gettimeout()
-    sock.settimeout(timeout)
-    try:
-        yield sock
-    finally:
-        sock.settimeout(original_timeout)
+class XorCodec:
+    """XORs whole message bodies with the repeated connection key at once
+
+    The key is repeated into a pad once and reused (growing it when a bigger
+    body comes along), the XOR itself is done on arbitrary precision integers
+    which runs in C instead of byte by byte in Python.
+    """
+
+    def __init__(self, key: bytes) -> None:
+        if not key:
+            raise ValueError("XOR key must not be empty")
+        self.key = key
+        self._pad = key
+
+    def _pad_for(self, size: int) -> bytes:
+        pad = self._pad
+        if len(pad) < size:
+            # Grow to the next power of two so the pad is rebuilt only a handful of times
+            target = 1 << (size - 1).bit_length()
+            pad = self.key * (target // len(self.key) + 1)
+            self._pad = pad
+        return pad
+
+    def __call__(self, msg: bytes | bytearray | memoryview) -> bytes:
+        size = len(msg)
+        if not size:
+            return b""
+        pad = memoryview(self._pad_for(size))[:size]
+        return (int.from_bytes(msg, "little") ^ int.from_bytes(pad, "little")).to_bytes(
+            size, "little"
+        )
 
 
 class HLLConnection:
     def __init__(self) -> None:
         self.xorkey = None
+        self._codec: XorCodec | None = None
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.settimeout(TIMEOUT_SEC)
         self.id = f"{get_ident()}-{uuid.uuid4()}"
         self.auth_token = None
         self.mu = threading.Lock()
         self._response_cache: TTLCache[int, Response] = TTLCache(maxsize=1024, ttl=60)
+        self._header_buf = bytearray(HEADER_SIZE)
+        self._recv_buf = bytearray(RECEIVE_BUFFER_SIZE)
 
     def connect(self, host, port, password: str):
         self.sock.connect((host, port))
+        # Set once, the socket is shared by the reader and the senders of a
+        # multiplexed connection so it is never changed while in use
+        self.sock.settimeout(RECV_TIMEOUT_SEC)
 
         server_hello = self.exchange("ServerConnect", 2, "")
         server_hello.raise_for_status()
@@ -213,6 +276,7 @@ class HLLConnection:
                 "ServerConnect response content is not a string"
             )
         self.xorkey = base64.b64decode(server_hello.content)
+        self._codec = XorCodec(self.xorkey) if self.xorkey else None
 
         auth_token_resp = self.exchange("Login", 2, password)
         auth_token_resp.raise_for_status()
@@ -247,28 +311,7 @@ class HLLConnection:
         self.mu.acquire()
         try:
             while request_id not in self._response_cache:
-                header_len = struct.calcsize(HEADER_FORMAT)
-                header_bytes = self.sock.recv(header_len)
-                try:
-                    magic, req_id, body_len = struct.unpack(HEADER_FORMAT, header_bytes)
-                except struct.error:
-                    raise HLLBrokenConnectionError(
-                        f"Failed to unpack response header: {header_bytes}"
-                    )
-
-                if magic != MAGIC_HEADER_VALUE:
-                    raise HLLBrokenConnectionError(
-                        f"Invalid magic value: {magic:#x} (expected {MAGIC_HEADER_VALUE:#x})"
-                    )
-
-                with set_timeout(self.sock, 3):
-                    raw = bytearray()
-                    while len(raw) < body_len:
-                        raw += self.sock.recv(body_len - len(raw))
-
-                msg = self._xor(raw)
-                response = Response.from_bytes(req_id, msg)
-
+                response = self._read_response()
                 self._response_cache[response.request_id] = response
         finally:
             self.mu.release()
@@ -276,15 +319,195 @@ class HLLConnection:
         response = self._response_cache.pop(request_id)
         return response
 
+    def _read_response(self) -> Response:
+        """Read and decode the next response frame from the socket"""
+        deadline = time.monotonic() + TIMEOUT_SEC
+        while True:
+            try:
+                req_id, body_len = self._read_header()
+                break
+            except TimeoutError:
+                # Nothing was received yet, keep waiting for the server to answer
+                if time.monotonic() >= deadline:
+                    raise
+        return self._read_body(req_id, body_len)
+
+    def _read_header(self) -> tuple[int, int]:
+        view = memoryview(self._header_buf)
+        # A timeout here before anything was received leaves the stream intact
+        received = self.sock.recv_into(view)
+        if not received:
+            raise HLLBrokenConnectionError("Connection closed by the game server")
+        try:
+            self._recv_exactly_into(view[received:])
+        except TimeoutError as e:
+            raise HLLBrokenConnectionError(
+                f"Timed out reading response header: {bytes(view[:received])}"
+            ) from e
+
+        magic, req_id, body_len = struct.unpack(HEADER_FORMAT, self._header_buf)
+        if magic != MAGIC_HEADER_VALUE:
+            raise HLLBrokenConnectionError(
+                f"Invalid magic value: {magic:#x} (expected {MAGIC_HEADER_VALUE:#x})"
+            )
+
+        return req_id, body_len
+
+    def _read_body(self, req_id: int, body_len: int) -> Response:
+        if len(self._recv_buf) < body_len:
+            self._recv_buf = bytearray(1 << (body_len - 1).bit_length())
+
+        view = memoryview(self._recv_buf)[:body_len]
+        try:
+            try:
+                self._recv_exactly_into(view)
+            except TimeoutError as e:
+                # The rest of this frame may still arrive, the stream is out of sync
+                raise HLLBrokenConnectionError(
+                    f"Timed out reading the body of response #{req_id}"
+                ) from e
+            return Response.from_bytes(req_id, self._xor(view))
+        finally:
+            view.release()
+
+    def _recv_exactly_into(self, view: memoryview) -> None:
+        """Fill the whole view with data from the socket"""
+        received = 0
+        size = len(view)
+        while received < size:
+            n = self.sock.recv_into(view[received:], size - received)
+            if not n:
+                raise HLLBrokenConnectionError("Connection closed by the game server")
+            received += n
+
     def exchange(self, command: str, version: int, body: dict[str, Any] | str = ""):
         handle = self.send(command, version, body)
         return handle.receive()
 
     def _xor(self, msg) -> bytes:
-        if not self.xorkey:
+        if self._codec is None:
             return msg
-        n = []
-        for i in range(len(msg)):
-            n.append(msg[i] ^ self.xorkey[i % len(self.xorkey)])
+        return self._codec(msg)
+
+
+class MultiplexedHLLConnection(HLLConnection):
+    """A connection that many threads share by pipelining their requests
+
+    Every request is tagged with its request ID; a dedicated reader thread reads
+    all response frames off the socket and resolves the pending request they
+    belong to, so any number of threads can have requests in flight on the same
+    socket without waiting for each other.
+    """
 
-        return array.array("B", n).tobytes()
+    def __init__(self) -> None:
+        super().__init__()
+        self.broken = False
+        self._closed = False
+        self._write_mu = threading.Lock()
+        self._pending_mu = threading.Lock()
+        self._pending: dict[int, Future[Response]] = {}
+        self._reader: threading.Thread | None = None
+
+    @property
+    def in_flight(self) -> int:
+        """The number of requests sent that have not been answered yet"""
+        return len(self._pending)
+
+    def connect(self, host, port, password: str):
+        # The handshake is a plain request/response exchange, the reader is only
+        # started once the connection is ready to be shared
+        super().connect(host, port, password)
+        self._reader = threading.Thread(
+            target=self._read_loop, name=f"hll-reader-{self.id}", daemon=True
+        )
+        self._reader.start()
+
+    def close(self) -> None:
+        self._closed = True
+        super().close()
+
+    def send(
+        self, command: str, version: int, body: dict[str, Any] | str = ""
+    ) -> Handle:
+        if self._reader is None:
+            return super().send(command, version, body)
+
+        request = Request(
+            command=command,
+            version=version,
+            auth_token=self.auth_token,
+            content=body,
+        )
+        future: Future[Response] = Future()
+        # Checked under the lock _fail_pending takes, so a request is either
+        # refused or registered before the pending ones are failed
+        with self._pending_mu:
+            if self.broken:
+                raise HLLBrokenConnectionError(f"Connection {self.id} is broken")
+            self._pending[request.request_id] = future
+
+        req_header, req_body = request.to_bytes()
+        try:
+            with self._write_mu:
+                self.sock.sendall(req_header + self._xor(req_body))
+        except Exception:
+            self.forget(request.request_id)
+            raise
+
+        return MultiplexedHandle(self, request, future)
+
+    def receive(self, request_id: int) -> Response:
+        if self._reader is None:
+            return super().receive(request_id)
+
+        with self._pending_mu:
+            future = self._pending.get(request_id)
+        if future is None:
+            raise HLLBrokenConnectionError(
+                f"Request #{request_id} is not pending on connection {self.id}"
+            )
+        try:
+            return future.result(timeout=TIMEOUT_SEC)
+        except TimeoutError:
+            self.forget(request_id)
+            raise
+
+    def forget(self, request_id: int) -> None:
+        """Stop waiting for the response of a request, it will be dropped when it arrives"""
+        with self._pending_mu:
+            self._pending.pop(request_id, None)
+
+    def _read_loop(self) -> None:
+        while True:
+            try:
+                try:
+                    req_id, body_len = self._read_header()
+                except TimeoutError:
+                    # Nothing was sent to us, the stream is still in sync
+                    if self._closed:
+                        return
+                    continue
+                response = self._read_body(req_id, body_len)
+            except Exception as e:
+                if not self._closed:
+                    logger.warning("Reader of connection %s failed: %s", self.id, e)
+                self._fail_pending(e)
+                return
+
+            with self._pending_mu:
+                future = self._pending.pop(response.request_id, None)
+            if future is None:
+                logger.debug(
+                    "Dropping response to abandoned request #%s", response.request_id
+                )
+                continue
+            future.set_result(response)
+
+    def _fail_pending(self, exc: Exception) -> None:
+        with self._pending_mu:
+            self.broken = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for future in pending:
+            if not future.done():
+                future.set_exception(exc)
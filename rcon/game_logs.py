@@ -1,11 +1,13 @@
 import datetime
 import logging
+from typing import Iterable
 
 import unicodedata
 from dateutil import parser
 from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 
+from rcon.logs.history import LogHistory
 from rcon.logs.loop import LogLoop
 from rcon.models import LogLine, PlayerID, enter_session
 from rcon.rcon import LOG_ACTIONS
@@ -62,6 +64,39 @@ def is_action(action_filter, action, exact_match=False):
     return False
 
 
+def _find_indexed_logs(
+    log_list: LogHistory,
+    start: int,
+    end: int,
+    player_search: list[str],
+    player_id_search: list[str],
+    action_filter: list[str],
+    exact_player_match: bool,
+    exact_action: bool,
+    inclusive_filter: bool,
+    min_timestamp: float | None,
+) -> list[StructuredLogLineWithMetaData] | None:
+    """The lines that could match the filters from the log history indexes, None if they can't tell"""
+    if min_timestamp:
+        # Reading the list stops at the first older line anyway
+        return None
+    if player_search:
+        if not exact_player_match:
+            return None
+        keys = [log_list.player_key(name) for name in player_search]
+    elif player_id_search:
+        keys = [log_list.player_id_key(player_id) for player_id in player_id_search]
+    elif action_filter and inclusive_filter:
+        keys = [
+            log_list.action_key(action)
+            for action in log_list.actions_between(start, end)
+            if is_action(action_filter, action, exact_action)
+        ]
+    else:
+        return None
+    return log_list.find(keys, start=start, end=end)
+
+
 def get_recent_logs(
     start: int = 0,
     end: int = 100000,
@@ -71,13 +106,13 @@ def get_recent_logs(
     exact_player_match: bool = False,
     exact_action: bool = False,
     inclusive_filter: bool = True,
+    player_id_search: list[str] | str = [],
 ) -> ParsedLogsType:
     # The default behavior is to only show log lines with actions in `actions_filter`
     # inclusive_filter=True retains this default behavior
     # inclusive_filter=False will do the opposite, show all lines except what is passed in
     # `actions_filter`
     log_list = LogLoop.get_log_history_list()
-    all_logs = log_list
 
     if not isinstance(start, int):
         start = 0
@@ -92,23 +127,57 @@ def get_recent_logs(
     exact_action = strtobool(exact_action)
     inclusive_filter = strtobool(inclusive_filter)
 
-    if start != 0:
-        all_logs = log_list[start : min(end, len(log_list))]
     logs: list[StructuredLogLineWithMetaData] = []
     all_players = set()
     actions = set(LOG_ACTIONS)
     if player_search and not isinstance(player_search, list):
         player_search = [player_search]
+    if player_id_search and not isinstance(player_id_search, list):
+        player_id_search = [player_id_search]
+
+    # Filtered reads only fetch the lines of the matching actions or players when
+    # the history is indexed, otherwise the history is read page by page up to
+    # end or the first line older than min_timestamp
+    all_logs: Iterable[StructuredLogLineWithMetaData] | None = _find_indexed_logs(
+        log_list,
+        start,
+        end,
+        player_search,
+        player_id_search,
+        action_filter,
+        exact_player_match,
+        exact_action,
+        inclusive_filter,
+        min_timestamp,
+    )
+    if all_logs is not None:
+        all_players.update(log_list.players_between(start, end))
+        actions.update(log_list.actions_between(start, end))
+    else:
+        all_logs = log_list.iter_paged(
+            page_size=max(1, min(1000, end - start)), start=start, stop=end
+        )
+
     # flatten that shit
     line: StructuredLogLineWithMetaData
     for idx, line in enumerate(all_logs):
-        if idx >= end - start:
-            break
         if not isinstance(line, dict):
             continue
         if min_timestamp and line["timestamp_ms"] / 1000 < min_timestamp:
             logger.debug("Stopping log read due to old timestamp at index %s", idx)
             break
+
+        if p1 := line["player_name_1"]:
+            all_players.add(p1)
+        if p2 := line["player_name_2"]:
+            all_players.add(p2)
+        actions.add(line["action"])
+
+        if player_id_search and not (
+            line["player_id_1"] in player_id_search
+            or line["player_id_2"] in player_id_search
+        ):
+            continue
         if player_search:
             for player_name_search in player_search:
                 if is_player(
@@ -150,12 +219,6 @@ def get_recent_logs(
         elif not player_search and not action_filter:
             logs.append(line)
 
-        if p1 := line["player_name_1"]:
-            all_players.add(p1)
-        if p2 := line["player_name_2"]:
-            all_players.add(p2)
-        actions.add(line["action"])
-
     return {
         "actions": sorted(list(actions)),
         "players": list(all_players),
@@ -0,0 +1,222 @@
+import hashlib
+import logging
+import math
+import time
+from typing import Iterable
+
+import orjson
+import redis
+
+from rcon.cache_utils import get_redis_client
+from rcon.codecs import ORJSON
+from rcon.rcon import Rcon, get_rcon
+from rcon.types import StructuredLogLineWithMetaData
+from rcon.utils import Stream, StreamID, StreamInvalidID, StreamNoElements
+
+logger = logging.getLogger(__name__)
+
+# How many seconds before the newest line seen to ask the game server for, and
+# to remember the lines of, so lines logged late are still picked up once
+CURSOR_SLACK_SECONDS = 30
+
+
+def line_hash(timestamp: str, line: str) -> str:
+    """Identify a log line independently of its relative time, which changes every fetch"""
+    return hashlib.blake2b(f"{timestamp}|{line}".encode(), digest_size=8).hexdigest()
+
+
+class LogCursor:
+    """The position of the last consumed game server log line
+
+    Lines only have a one second resolution and can be logged a little after
+    their timestamp, so the cursor is the newest timestamp seen along with the
+    hashes of the lines seen in the CURSOR_SLACK_SECONDS before it. A line in
+    that window is new unless its hash was seen, older lines are ignored.
+
+    Every timestamp compared is the game server's, how far behind the cursor
+    is only measures the CRCON time elapsed since the last fetch.
+    """
+
+    def __init__(self, red: redis.StrictRedis, key: str) -> None:
+        self.red = red
+        self.key = key
+        self.timestamp: int | None = None
+        # Hash of each line in the window to its timestamp
+        self.hashes: dict[str, int] = {}
+        self.fetched_at: float | None = None
+        self.load()
+
+    def load(self) -> None:
+        raw = self.red.get(self.key)
+        if raw is None:
+            self.timestamp, self.hashes, self.fetched_at = None, {}, None
+            return
+        state = orjson.loads(raw)
+        self.timestamp = state["timestamp"]
+        hashes = state["hashes"]
+        if isinstance(hashes, list):
+            # Saved before the window was kept, only the newest second
+            hashes = dict.fromkeys(hashes, self.timestamp)
+        self.hashes = hashes
+        self.fetched_at = state.get("fetched_at")
+
+    def save(self) -> None:
+        self.red.set(
+            self.key,
+            orjson.dumps(
+                {
+                    "timestamp": self.timestamp,
+                    "hashes": self.hashes,
+                    "fetched_at": self.fetched_at,
+                }
+            ),
+        )
+
+    def reset(self) -> None:
+        self.timestamp, self.hashes, self.fetched_at = None, {}, None
+        self.red.delete(self.key)
+
+    def seconds_behind(self) -> float | None:
+        """How long ago (by CRCON's clock) the lines were last fetched"""
+        if self.timestamp is None or self.fetched_at is None:
+            return None
+        return max(0.0, time.time() - self.fetched_at)
+
+    def advance(
+        self, raw_logs: Iterable[str], fetched_at: float | None = None
+    ) -> list[str]:
+        """Return the raw lines past the cursor and move the cursor after them
+
+        Only the timestamp of each line is extracted here, the lines themselves
+        are left for the consumers to parse. fetched_at is when the logs were
+        requested from the game server.
+        """
+        if fetched_at is not None:
+            self.fetched_at = fetched_at
+
+        new_lines: list[str] = []
+        for raw_relative_time, raw_timestamp, raw_log_line in Rcon.split_raw_log_lines(
+            raw_logs
+        ):
+            timestamp = int(raw_timestamp)
+            if (
+                self.timestamp is not None
+                and timestamp < self.timestamp - CURSOR_SLACK_SECONDS
+            ):
+                continue
+
+            hash_ = line_hash(raw_timestamp, raw_log_line)
+            if hash_ in self.hashes:
+                continue
+            self.hashes[hash_] = timestamp
+            if self.timestamp is None or timestamp > self.timestamp:
+                self.timestamp = timestamp
+
+            new_lines.append(f"{raw_relative_time} {raw_log_line}")
+
+        if self.timestamp is not None:
+            oldest = self.timestamp - CURSOR_SLACK_SECONDS
+            self.hashes = {h: t for h, t in self.hashes.items() if t >= oldest}
+        return new_lines
+
+
+class LogFeed:
+    """A single game server log fetch shared by every log consumer
+
+    Whichever consumer polls first asks the game server only for the logs since
+    the shared cursor and appends the lines past it as one batch to a redis
+    stream, each consumer then reads the batches it hasn't seen yet. Fetching
+    is throttled, so consumers polling at the same time share a single request.
+
+    The first fetch goes max_since_min back, the largest window any consumer
+    needs, whichever consumer triggers it. Consumers needing less skip the
+    older lines themselves.
+    """
+
+    # Each CRCON uses its own redis database, no need for keys to be unique across servers
+    def __init__(
+        self,
+        rcon: Rcon | None = None,
+        red: redis.StrictRedis | None = None,
+        key: str = "log_feed",
+        maxlen: int = 10_000,
+        max_since_min: int = 180,
+    ) -> None:
+        self.rcon = rcon or get_rcon()
+        self.red = red or get_redis_client()
+        self.key = key
+        self.max_since_min = max_since_min
+        self.stream: Stream[dict[str, list[str]]] = Stream(
+            key=key, maxlen=maxlen, codec=ORJSON
+        )
+        self.cursor = LogCursor(self.red, key=f"{key}:cursor")
+
+    def clear(self) -> None:
+        logger.info("Clearing log feed")
+        self.red.delete(self.key, f"{self.key}:throttle")
+        self.cursor.reset()
+
+    def poll(self, min_interval_ms: int = 500) -> int:
+        """Fetch the logs past the cursor unless another consumer just did, returning the number of new lines"""
+        if not self.red.set(f"{self.key}:throttle", 1, nx=True, px=min_interval_ms):
+            return 0
+
+        lock = self.red.lock(f"{self.key}:lock", timeout=60)
+        if not lock.acquire(blocking=False):
+            return 0
+
+        try:
+            self.cursor.load()
+            behind = self.cursor.seconds_behind()
+            if behind is None:
+                since_min = self.max_since_min
+            else:
+                since_min = min(
+                    self.max_since_min, (behind + CURSOR_SLACK_SECONDS) / 60
+                )
+
+            fetched_at = time.time()
+            raw_logs = self.rcon.get_logs(since_min_ago=since_min)
+            new_lines = self.cursor.advance(raw_logs, fetched_at=fetched_at)
+            if new_lines:
+                self.stream.add({"lines": new_lines})
+            self.cursor.save()
+            logger.debug(
+                "Fetched %s lines over the last %.1f min, %s new",
+                len(raw_logs),
+                since_min,
+                len(new_lines),
+            )
+            return len(new_lines)
+        finally:
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                logger.warning("Log feed lock expired while fetching logs")
+
+    def read_raw(self, last_id: StreamID = "0") -> tuple[StreamID, list[str]]:
+        """Return the ID of the newest batch and the raw lines of all the batches after last_id, oldest first"""
+        try:
+            batches = self.stream.read(last_id=last_id or "0")
+        except (StreamNoElements, StreamInvalidID):
+            return last_id, []
+
+        lines: list[str] = []
+        for id_, batch in batches:
+            last_id = id_
+            lines.extend(batch["lines"])
+        return last_id, lines
+
+    def read(
+        self, last_id: StreamID = "0"
+    ) -> tuple[StreamID, list[StructuredLogLineWithMetaData]]:
+        """Parsed version of read_raw, the logs are returned newest first like get_structured_logs"""
+        last_id, lines = self.read_raw(last_id)
+        if not lines:
+            return last_id, []
+        return last_id, Rcon.parse_logs(lines)["logs"]
+
+    @staticmethod
+    def stream_id_minutes_ago(minutes: float) -> StreamID:
+        """The stream ID of the first batch that could have been added in the last minutes"""
+        return f"{math.floor((time.time() - minutes * 60) * 1000)}-0"
@@ -0,0 +1,99 @@
+import logging
+import time
+from typing import Iterable
+
+import redis
+import redis.client
+
+from rcon.logs.cursor import line_hash
+
+logger = logging.getLogger(__name__)
+
+
+class LogDedupIndex:
+    """The log lines already recorded, bucketed by minute
+
+    Each minute of logs is a redis set of line hashes that expires on its own
+    once the minute is older than the retention, there is nothing to clean up
+    and the memory used only depends on the number of lines in the retention.
+    """
+
+    BUCKET_SECONDS = 60
+
+    def __init__(
+        self,
+        red: redis.StrictRedis,
+        key: str = "unique_logs",
+        retention_minutes: int = 280,
+    ) -> None:
+        self.red = red
+        self.key = key
+        self.retention_seconds = retention_minutes * 60
+
+    def bucket(self, timestamp_ms: int) -> int:
+        return timestamp_ms // 1000 // self.BUCKET_SECONDS
+
+    def bucket_key(self, bucket: int) -> str:
+        return f"{self.key}:{bucket}"
+
+    def bucket_expires_at(self, bucket: int) -> int:
+        return (bucket + 1) * self.BUCKET_SECONDS + self.retention_seconds
+
+    def queue_add(
+        self, pipe: redis.client.Pipeline, timestamp_ms: int, line: str
+    ) -> None:
+        """Queue a SADD on pipe, its result is 1 if the line wasn't recorded yet"""
+        pipe.sadd(
+            self.bucket_key(self.bucket(timestamp_ms)),
+            line_hash(str(timestamp_ms), line),
+        )
+
+    def queue_expire(
+        self, pipe: redis.client.Pipeline, timestamps_ms: Iterable[int]
+    ) -> None:
+        """Queue setting the expiry of the buckets of the given lines on pipe"""
+        for bucket in {self.bucket(ts) for ts in timestamps_ms}:
+            pipe.expireat(self.bucket_key(bucket), self.bucket_expires_at(bucket))
+
+    def add_many(self, lines: Iterable[tuple[int, str]]) -> list[bool]:
+        """Record the (timestamp_ms, line) pairs, returning whether each one was new"""
+        lines = list(lines)
+        if not lines:
+            return []
+        pipe = self.red.pipeline(transaction=False)
+        for timestamp_ms, line in lines:
+            self.queue_add(pipe, timestamp_ms, line)
+        self.queue_expire(pipe, (timestamp_ms for timestamp_ms, _ in lines))
+        return [bool(added) for added in pipe.execute()[: len(lines)]]
+
+    def migrate_legacy_set(self, batch_size: int = 1000) -> int:
+        """Move the lines of the former single set of "timestamp_ms|line" members to the buckets"""
+        if self.red.type(self.key) not in (b"set", "set"):
+            return 0
+
+        logger.info("Migrating %s to the minute buckets", self.key)
+        oldest_ms = (time.time() - self.retention_seconds) * 1000
+        batch: list[tuple[int, str]] = []
+        migrated = 0
+        for member in self.red.sscan_iter(self.key, count=batch_size):
+            if isinstance(member, bytes):
+                member = member.decode()
+            try:
+                ts, line = member.split("|", 1)
+                timestamp_ms = int(ts)
+            except ValueError:
+                logger.exception("Invalid key %s", member)
+                continue
+            if timestamp_ms < oldest_ms:
+                continue
+            batch.append((timestamp_ms, line))
+            if len(batch) >= batch_size:
+                migrated += len(batch)
+                self.add_many(batch)
+                batch = []
+
+        migrated += len(batch)
+        self.add_many(batch)
+        self.red.delete(self.key)
+        logger.info("Migrated %s lines from %s", migrated, self.key)
+        return migrated
@@ -0,0 +1,301 @@
+"""The log history list with secondary indexes by action, player name and player ID
+
+Lines are numbered in the order they are added, the newest line of the list
+has the number stored in the head key so the position of a line in the list is
+the head minus its number. Each index is a sorted set of the numbers of the
+lines of an action or a player, filtered reads then only fetch those lines
+instead of deserializing the whole list.
+
+The indexes are only trimmed by line number: numbers past the end of the list
+are removed as lines are added, and the indexes of the players, player IDs and
+actions whose newest line left the list are deleted.
+"""
+
+import hashlib
+import logging
+from typing import Iterable
+
+import redis.exceptions
+
+from rcon.types import StructuredLogLineWithMetaData
+from rcon.utils import FixedLenList
+
+logger = logging.getLogger(__name__)
+
+# Bumped when the layout of the index keys changes, the index is then rebuilt
+INDEX_VERSION = 2
+
+# Fetch the lines of the given index keys between two offsets of the list,
+# newest first. Lines less than ARGV[3] apart are read with a single LRANGE
+# so the list is walked once per run of lines rather than once per line.
+_FIND_LINES = """
+local head = tonumber(redis.call('GET', KEYS[2]) or '0')
+local len = redis.call('LLEN', KEYS[1])
+local max_seq = head - tonumber(ARGV[1])
+local min_seq = math.max(head - len + 1, head - tonumber(ARGV[2]) + 1)
+local max_gap = tonumber(ARGV[3])
+local wanted = {}
+local positions = {}
+for i = 3, #KEYS do
+    for _, seq in ipairs(redis.call('ZRANGEBYSCORE', KEYS[i], min_seq, max_seq)) do
+        local position = head - tonumber(seq)
+        if not wanted[position] then
+            wanted[position] = true
+            positions[#positions + 1] = position
+        end
+    end
+end
+table.sort(positions)
+local lines = {}
+local i = 1
+while i <= #positions do
+    local first = positions[i]
+    local last = first
+    while i < #positions and positions[i + 1] - last <= max_gap do
+        i = i + 1
+        last = positions[i]
+    end
+    local run = redis.call('LRANGE', KEYS[1], first, last)
+    for offset, line in ipairs(run) do
+        if wanted[first + offset - 1] then
+            lines[#lines + 1] = line
+        end
+    end
+    i = i + 1
+end
+return lines
+"""
+_FIND_LINES_SHA = hashlib.sha1(_FIND_LINES.encode()).hexdigest()
+
+
+class LogHistory(FixedLenList[StructuredLogLineWithMetaData]):
+    """The newest log lines first, only add_many keeps the indexes up to date"""
+
+    # Fetching the matching lines runs inside redis and blocks it, it's only
+    # worth it while few lines match, otherwise the list is read page by page
+    MAX_INDEXED_FRACTION = 0.05
+    MAX_INDEXED_LINES = 500
+    # Matching lines at most that far apart are read along with the lines between them
+    MAX_RUN_GAP = 16
+
+    @property
+    def index_prefix(self) -> str:
+        return f"{self.key}:index:v{INDEX_VERSION}"
+
+    @property
+    def head_key(self) -> str:
+        return f"{self.index_prefix}:head"
+
+    @property
+    def actions_key(self) -> str:
+        """Each action in the list scored by the number of its newest line"""
+        return f"{self.index_prefix}:actions"
+
+    @property
+    def players_key(self) -> str:
+        """The name of each player scored by the number of its newest line"""
+        return f"{self.index_prefix}:players"
+
+    @property
+    def player_ids_key(self) -> str:
+        """The ID of each player scored by the number of its newest line"""
+        return f"{self.index_prefix}:player_ids"
+
+    def action_key(self, action: str) -> str:
+        return f"{self.index_prefix}:action:{action}"
+
+    def player_key(self, player_name: str) -> str:
+        return f"{self.index_prefix}:player:{player_name}"
+
+    def player_id_key(self, player_id: str) -> str:
+        return f"{self.index_prefix}:player_id:{player_id}"
+
+    def _newest_lines_keys(self):
+        """(key of the newest line numbers, index key of a member) of each kind of index"""
+        return (
+            (self.actions_key, self.action_key),
+            (self.players_key, self.player_key),
+            (self.player_ids_key, self.player_id_key),
+        )
+
+    def _index_keys(self, log: StructuredLogLineWithMetaData) -> set[str]:
+        keys = {self.action_key(log["action"])}
+        for name, player_id in (
+            (log["player_name_1"], log["player_id_1"]),
+            (log["player_name_2"], log["player_id_2"]),
+        ):
+            if name:
+                keys.add(self.player_key(name))
+            if player_id:
+                keys.add(self.player_id_key(player_id))
+        return keys
+
+    def _queue_index(
+        self,
+        pipe,
+        logs: list[StructuredLogLineWithMetaData],
+        head: int,
+        gone: dict[str, list[str]] | None = None,
+    ) -> None:
+        """Index the logs, the oldest first, that come after the line numbered head
+
+        gone holds, per key of newest line numbers, the members whose newest
+        line leaves the list with these logs, their index keys are deleted.
+        """
+        indexes: dict[str, dict[int, int]] = {}
+        newest: dict[str, dict[str, int]] = {
+            key: {} for key, _ in self._newest_lines_keys()
+        }
+        for seq, log in enumerate(logs, start=head + 1):
+            for key in self._index_keys(log):
+                indexes.setdefault(key, {})[seq] = seq
+            newest[self.actions_key][log["action"]] = seq
+            for name, player_id in (
+                (log["player_name_1"], log["player_id_1"]),
+                (log["player_name_2"], log["player_id_2"]),
+            ):
+                if name:
+                    newest[self.players_key][name] = seq
+                if player_id:
+                    newest[self.player_ids_key][player_id] = seq
+
+        # Lines past the end of the list are gone
+        oldest = head + len(logs) - self.max_len
+        for key, index_key in self._newest_lines_keys():
+            stale = [index_key(member) for member in (gone or {}).get(key, [])]
+            if stale:
+                pipe.delete(*stale)
+        for key, seqs in indexes.items():
+            pipe.zadd(key, seqs)
+            pipe.zremrangebyscore(key, "-inf", oldest)
+        for key, _ in self._newest_lines_keys():
+            if newest[key]:
+                pipe.zadd(key, newest[key])
+            pipe.zremrangebyscore(key, "-inf", oldest)
+
+    def _gone_with(self, head: int, count: int) -> dict[str, list[str]]:
+        """The members whose newest line leaves the list when count lines are added after head"""
+        oldest = head + count - self.max_len
+        pipe = self.red.pipeline(transaction=False)
+        for key, _ in self._newest_lines_keys():
+            pipe.zrangebyscore(key, "-inf", oldest)
+        return {
+            key: [m.decode() if isinstance(m, bytes) else m for m in members]
+            for (key, _), members in zip(self._newest_lines_keys(), pipe.execute())
+        }
+
+    def add_many(self, objs: Iterable[StructuredLogLineWithMetaData]):
+        """Add the logs in order and index them, the last one ends up first
+
+        The log loop is the only writer, so the head is read before the
+        transaction that moves it along with the list.
+        """
+        logs = list(objs)
+        if not logs:
+            return
+        head = int(self.red.get(self.head_key) or 0)
+        # Members seen again in these logs are only trimmed, not deleted
+        gone = self._gone_with(head, len(logs))
+        pipe = self.red.pipeline(transaction=True)
+        pipe.lpush(self.key, *[self.serializer(log) for log in logs])
+        pipe.ltrim(self.key, 0, self.max_len - 1)
+        pipe.set(self.head_key, head + len(logs))
+        self._queue_index(pipe, logs, head, self._still_gone(gone, logs))
+        pipe.execute()
+
+    def _still_gone(
+        self, gone: dict[str, list[str]], logs: list[StructuredLogLineWithMetaData]
+    ) -> dict[str, list[str]]:
+        seen: dict[str, set[str]] = {key: set() for key, _ in self._newest_lines_keys()}
+        for log in logs:
+            seen[self.actions_key].add(log["action"])
+            seen[self.players_key].update({log["player_name_1"], log["player_name_2"]})
+            seen[self.player_ids_key].update({log["player_id_1"], log["player_id_2"]})
+        return {
+            key: [member for member in members if member not in seen[key]]
+            for key, members in gone.items()
+        }
+
+    def is_indexed(self) -> bool:
+        return bool(self.red.exists(self.head_key))
+
+    def rebuild_index(self, page_size: int = 1000) -> None:
+        """Index the lines already in the list, only to be called by the writer before adding lines"""
+        keys = list(self.red.scan_iter(match=f"{self.key}:index:*", count=1000))
+        if keys:
+            self.red.delete(*keys)
+
+        length = len(self)
+        logger.info("Indexing %s log lines", length)
+        # The oldest line is numbered 1
+        for stop in range(length, 0, -page_size):
+            start = max(0, stop - page_size)
+            page = [
+                self.deserializer(o)
+                for o in reversed(self.red.lrange(self.key, start, stop - 1))
+            ]
+            pipe = self.red.pipeline(transaction=False)
+            self._queue_index(pipe, page, length - stop)
+            pipe.execute()
+        self.red.set(self.head_key, length)
+
+    def _members_between(self, key: str, index_key, start: int, end: int) -> list[str]:
+        head = int(self.red.get(self.head_key) or 0)
+        min_seq, max_seq = head - end + 1, head - start
+        members = [
+            m.decode() if isinstance(m, bytes) else m
+            for m in self.red.zrangebyscore(key, min_seq, "+inf")
+        ]
+        if start == 0:
+            return members
+
+        # The newest line of a member can be before start while older ones are not
+        pipe = self.red.pipeline(transaction=False)
+        for member in members:
+            pipe.zcount(index_key(member), min_seq, max_seq)
+        return [member for member, count in zip(members, pipe.execute()) if count]
+
+    def actions_between(self, start: int, end: int) -> list[str]:
+        """The actions with lines between the two offsets of the list"""
+        return self._members_between(self.actions_key, self.action_key, start, end)
+
+    def players_between(self, start: int, end: int) -> list[str]:
+        """The names of the players with lines between the two offsets of the list"""
+        return self._members_between(self.players_key, self.player_key, start, end)
+
+    def find(
+        self, index_keys: list[str], start: int = 0, end: int | None = None
+    ) -> list[StructuredLogLineWithMetaData] | None:
+        """The lines of the given indexes between the two offsets of the list, newest first
+
+        Returns None when the list isn't indexed or when too many lines match
+        for fetching them one by one to be worth it, the caller should then
+        read the list instead.
+        """
+        if end is None:
+            end = self.max_len
+        if not self.is_indexed():
+            return None
+        if not index_keys:
+            return []
+
+        head = int(self.red.get(self.head_key) or 0)
+        pipe = self.red.pipeline(transaction=False)
+        pipe.llen(self.key)
+        for key in index_keys:
+            pipe.zcount(key, head - end + 1, head - start)
+        length, *counts = pipe.execute()
+        matching = sum(counts)
+        if (
+            matching > self.MAX_INDEXED_LINES
+            or matching > (min(end, length) - start) * self.MAX_INDEXED_FRACTION
+        ):
+            return None
+
+        keys = [self.key, self.head_key, *index_keys]
+        args = [start, end, self.MAX_RUN_GAP]
+        try:
+            lines = self.red.evalsha(_FIND_LINES_SHA, len(keys), *keys, *args)
+        except redis.exceptions.NoScriptError:
+            lines = self.red.eval(_FIND_LINES, len(keys), *keys, *args)
+        return [self.deserializer(line) for line in lines if line is not None]
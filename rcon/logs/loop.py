@@ -12,12 +12,15 @@ from discord.utils import escape_markdown
 
 from rcon.cache_utils import get_redis_client, ttl_cache
 from rcon.discord import make_hook
+from rcon.logs.cursor import LogFeed
+from rcon.logs.dedup import LogDedupIndex
+from rcon.logs.history import LogHistory
 from rcon.rcon import get_rcon
-from rcon.types import AllLogTypes, ParsedLogsType, GetDetailedPlayer, StructuredLogLineWithMetaData, PlayerStat
+from rcon.types import AllLogTypes, GetDetailedPlayer, StructuredLogLineWithMetaData, PlayerStat
 from rcon.user_config.log_line_webhooks import LogLineWebhookUserConfig
 from rcon.user_config.rcon_server_settings import RconServerSettingsUserConfig
 from rcon.user_config.webhooks import DiscordMentionWebhook
-from rcon.utils import FixedLenList, MapsHistory
+from rcon.utils import MapsHistory
 
 logger = logging.getLogger(__name__)
 
@@ -221,35 +224,34 @@ class LogLoop:
     def __init__(self):
         self.rcon = get_rcon()
         self.red = get_redis_client()
-        self.duplicate_guard_key = "unique_logs"
+        self.duplicate_guard = LogDedupIndex(self.red)
+        self.feed_position_key = "log_loop_feed_position"
         self.log_history = self.get_log_history_list()
+        self.maps_history = MapsHistory()
+        self.log_feed = LogFeed(rcon=self.rcon, red=self.red)
 
         logger.info("Registered hooks: %s", HOOKS)
 
     @staticmethod
-    def get_log_history_list() -> FixedLenList[StructuredLogLineWithMetaData]:
-        return FixedLenList(key=LogLoop.log_history_key, max_len=100_000)
+    def get_log_history_list() -> LogHistory:
+        return LogHistory(key=LogLoop.log_history_key, max_len=100_000)
 
-    def run(self, loop_frequency_secs=2, cleanup_frequency_minutes=10):
-        since_min = 180
+    def run(self, loop_frequency_secs=2):
         self.cleanup()
-        last_cleanup_time = datetime.datetime.now()
+        # Resume from the last batch handled before a restart
+        feed_id = self.red.get(self.feed_position_key) or "0"
+        if isinstance(feed_id, bytes):
+            feed_id = feed_id.decode()
 
         while True:
             load_generic_hooks()
-            logs: ParsedLogsType = self.rcon.get_structured_logs(
-                since_min_ago=since_min
-            )
-            since_min = 5
-            for log in reversed(logs["logs"]):
-                line = self.record_line(log)
-                if line:
-                    self.process_hooks(line)
-            if (
-                    datetime.datetime.now() - last_cleanup_time
-            ).total_seconds() >= cleanup_frequency_minutes * 60:
-                self.cleanup()
-                last_cleanup_time = datetime.datetime.now()
+            self.log_feed.poll()
+            new_feed_id, logs = self.log_feed.read(feed_id)
+            for line in self.record_lines(reversed(logs)):
+                self.process_hooks(line)
+            if new_feed_id != feed_id:
+                feed_id = new_feed_id
+                self.red.set(self.feed_position_key, feed_id)
 
             dp = self.rcon.get_detailed_players()
             if dp["fail_count"] > 0:
@@ -263,76 +265,114 @@ class LogLoop:
             time.sleep(loop_frequency_secs)
 
     def record_player_stats(self, players: dict[str, GetDetailedPlayer]):
-        maps = MapsHistory()
-        if len(maps) == 0:
+        """Update the scores of the players of the current map, only the changed ones are written"""
+        maps = self.maps_history
+        try:
+            m = maps[0]
+        except IndexError:
             logger.info("No map seems to be running, skipping saving stats")
             return
-        m = maps[0]
         # give us and the gameserver some time after map switch to zero out scores.
         # No clue, why this is actually needed, tbh, but without it, it seems that score values
         # from the previous map may leak into the current one
         if m["start"] > datetime.datetime.now().timestamp() - 30:
             return
-        for player_id in players:
-            player = players.get(player_id)
-            map_players = m.setdefault("player_stats", dict())
-            p = map_players.get(
-                player_id,
-                PlayerStat(
-                    combat=player["combat"],
-                    p_combat=0,
-                    offense=player["offense"],
-                    p_offense=0,
-                    defense=player["defense"],
-                    p_defense=0,
-                    support=player["support"],
-                    p_support=0,
-                    level=player["level"],
-                ),
+        # The stats were saved with the map when it ended
+        if m["end"] is not None:
+            return
+
+        map_players = maps.get_player_stats(m)
+        changed: dict[str, PlayerStat] = {}
+        for player_id, player in players.items():
+            previous = map_players.get(player_id)
+            p = PlayerStat(**previous) if previous else PlayerStat(
+                combat=player["combat"],
+                p_combat=0,
+                offense=player["offense"],
+                p_offense=0,
+                defense=player["defense"],
+                p_defense=0,
+                support=player["support"],
+                p_support=0,
+                level=player["level"],
             )
             for stat in ["combat", "offense", "defense", "support"]:
                 if player[stat] < p[stat]:
                     p["p_" + stat] = p["p_" + stat] + p[stat]
 
                 p[stat] = player[stat]
-                
+
             p["level"] = player["level"]
-            map_players[player_id] = p
-        maps.update(0, m)
+            if p != previous:
+                changed[player_id] = p
+        maps.save_player_stats(m, changed)
 
     def record_line(self, log: StructuredLogLineWithMetaData):
-        id_ = f"{log['timestamp_ms']}|{log['line_without_time']}"
-        if not self.red.sadd(self.duplicate_guard_key, id_):
-            # logger.debug("Skipping duplicate: %s", id_)
-            return None
+        recorded = self.record_lines([log])
+        return recorded[0] if recorded else None
+
+    def record_lines(
+        self, logs: Iterable[StructuredLogLineWithMetaData]
+    ) -> list[StructuredLogLineWithMetaData]:
+        """Record the new lines, oldest first, and return the ones that were recorded
+
+        Same checks as recording the lines one by one, but the duplicate guard and
+        the head of the history are read in one round trip and the recorded lines
+        are written in another, regardless of the number of lines.
+        """
+        logs = list(logs)
+        if not logs:
+            return []
+
+        ids = [f"{log['timestamp_ms']}|{log['line_without_time']}" for log in logs]
+        pipe = self.red.pipeline(transaction=False)
+        for log in logs:
+            self.duplicate_guard.queue_add(
+                pipe, log["timestamp_ms"], log["line_without_time"]
+            )
+        pipe.lindex(self.log_history.key, 0)
+        self.duplicate_guard.queue_expire(pipe, (log["timestamp_ms"] for log in logs))
+        results = pipe.execute()
+        added, raw_last_line = results[: len(logs)], results[len(logs)]
 
-        logger.info("Caching line: %s", id_)
-        try:
-            last_line = self.log_history[0]
-        except IndexError:
+        if raw_last_line is None:
             last_line = None
-        if not isinstance(last_line, dict):
-            logger.error("Can't check against last_line, invalid_format %s", last_line)
-        elif last_line and last_line["timestamp_ms"] > log["timestamp_ms"]:
-            logger.warning("Received old log record, ignoring")
-            return None
-
-        self.log_history.add(log)
-        return log
-
-    def cleanup(self):
-        logger.info("Starting cleanup")
-        for k in self.red.sscan_iter(self.duplicate_guard_key):
+        else:
             try:
-                ts, _ = k.decode().split("|", 1)
+                last_line = self.log_history.deserializer(raw_last_line)
             except ValueError:
-                logger.exception("Invalid key %s", k)
+                last_line = raw_last_line
+
+        recorded: list[StructuredLogLineWithMetaData] = []
+        for log, id_, is_new in zip(logs, ids, added):
+            if not is_new:
+                # logger.debug("Skipping duplicate: %s", id_)
+                continue
+
+            logger.info("Caching line: %s", id_)
+            if not isinstance(last_line, dict):
+                logger.error(
+                    "Can't check against last_line, invalid_format %s", last_line
+                )
+            elif last_line and last_line["timestamp_ms"] > log["timestamp_ms"]:
+                logger.warning("Received old log record, ignoring")
                 continue
-            t = datetime.datetime.fromtimestamp(int(ts) / 1000)
-            if (datetime.datetime.now() - t).total_seconds() > 280 * 60:
-                logger.debug("Older than 180min, removing: %s", k)
-                self.red.srem(self.duplicate_guard_key, k)
-        logger.info("Cleanup done")
+
+            recorded.append(log)
+            last_line = log
+
+        self.log_history.add_many(recorded)
+        return recorded
+
+    def cleanup(self):
+        """Migrate the duplicate guard from the single set it used to be and index the log history
+
+        The minute buckets expire on their own and the indexes are kept up to
+        date when recording lines, this is a no-op once migrated.
+        """
+        self.duplicate_guard.migrate_legacy_set()
+        if not self.log_history.is_indexed():
+            self.log_history.rebuild_index()
 
     def process_hooks(self, log: StructuredLogLineWithMetaData):
         logger.debug("Processing %s", f"{log['action']} | {log['message']}")
@@ -0,0 +1,268 @@
+"""Parser for the raw log lines returned by the game server
+
+Lines are dispatched on their first character to the few handlers whose prefix
+could match, each handler only runs the compiled pattern of its own line type.
+"""
+
+import logging
+import re
+from typing import Callable, Iterable, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+chat_regexp = re.compile(r"CHAT\[(Team|Unit)\]\[(.*)\((Allies|Axis)/(.*)\)\]: (.*)")
+connect_disconnect_pattern = re.compile(r"(.+) \((.*)\)")
+kill_teamkill_pattern = re.compile(
+    r"(.*)\((?:Allies|Axis)\/(.*)\) -> (.*)\((?:Allies|Axis)\/(.*)\) with (.*)"
+)
+camera_pattern = re.compile(r"\[(.*) \((.*)\)\] (.*)")
+teamswitch_pattern = re.compile(r"TEAMSWITCH\s(.*)\s\((.*\s>\s.*)\)")
+kick_ban_pattern = re.compile(
+    r"(KICK|BAN): \[(.*)\] (.*\[(KICKED|BANNED|PERMANENTLY|YOU|Host|Anti-Cheat|[^\]]*)[^\]]*)(?:\])*"
+)
+vote_pattern = re.compile(r"VOTESYS: Player \[(.*)\] voted \[.*\] for VoteID\[\d+\]")
+vote_started_pattern = re.compile(
+    r"VOTESYS: Player \[(.*)\] Started a vote of type \(.*\) against \[(.*)\]. VoteID: \[\d+\]"
+)
+vote_complete_pattern = re.compile(r"VOTESYS: Vote \[\d+\] completed. Result: (.*)")
+vote_expired_pattern = re.compile(r"VOTESYS: Vote \[\d+\] (expired|prematurely)")
+vote_passed_pattern = re.compile(r"VOTESYS: (Vote Kick \{(.*)\} .*\[(.*)\])")
+# Need the DOTALL flag to allow `.` to capture newlines in multi line messages
+message_pattern = re.compile(
+    r"MESSAGE: player \[(.+)\((.*)\)\], content \[(.+)\]", re.DOTALL
+)
+raw_log_line_pattern = re.compile(r"^(\[.+? \((\d+)\)\]) ([\w\W]*)$", re.M)
+
+_match_chat = chat_regexp.match
+_match_connect_disconnect = connect_disconnect_pattern.match
+_match_kill_teamkill = kill_teamkill_pattern.match
+_match_camera = camera_pattern.match
+_match_teamswitch = teamswitch_pattern.match
+_match_kick_ban = kick_ban_pattern.match
+_match_vote = vote_pattern.match
+_match_vote_started = vote_started_pattern.match
+_match_vote_complete = vote_complete_pattern.match
+_match_vote_expired = vote_expired_pattern.match
+_match_vote_passed = vote_passed_pattern.match
+_match_message = message_pattern.match
+_match_raw_log_line = raw_log_line_pattern.match
+
+KICK_BAN_TYPES = {
+    "PERMANENTLY": "PERMA BANNED",
+    "YOU": "IDLE",
+    "Host": "",
+    "Anti-Cheat": "ANTI-CHEAT",
+    "KICKED": "KICKED",
+    "BANNED": "BANNED",
+}
+
+
+class LogLineRecord(NamedTuple):
+    action: str
+    player_name_1: str | None
+    player_id_1: str | None
+    player_name_2: str | None
+    player_id_2: str | None
+    weapon: str | None
+    message: str
+    sub_content: str | None
+
+
+def _parse_kill(raw_line: str) -> LogLineRecord:
+    # KILL: Muctar(Axis/71234567891234567) -> Chris(Allies/71234567891234576) with GEWEHR 43
+    # TEAM KILL: SonofJack(Allies/71234567891234567) -> Joseph Cannon(Allies/71234567891234576) with M1 GARAND
+    action, content = raw_line.split(": ", 1)
+    if match := _match_kill_teamkill(content):
+        player, player_id_1, player2, player_id_2, weapon = match.groups()
+        return LogLineRecord(
+            action, player, player_id_1, player2, player_id_2, weapon, content, None
+        )
+    raise ValueError(f"Unable to parse line: {raw_line}")
+
+
+def _parse_connect_disconnect(raw_line: str) -> LogLineRecord:
+    action, name_and_player_id = raw_line.split(" ", 1)
+    if match := _match_connect_disconnect(name_and_player_id):
+        player, player_id_1 = match.groups()
+        return LogLineRecord(
+            action, player, player_id_1, None, None, None, name_and_player_id, None
+        )
+    raise ValueError(f"Unable to parse line: {raw_line}")
+
+
+def _parse_chat(raw_line: str) -> LogLineRecord:
+    # CHAT[Team][Azure(Allies/71234567891234567)]: supply truck bot hq for nodes
+    # CHAT[Unit][dominguez1987(Axis/71234567891234567)]: back
+    if match := _match_chat(raw_line):
+        scope, player, side, player_id_1, sub_content = match.groups()
+        return LogLineRecord(
+            f"CHAT[{side}][{scope}]",
+            player,
+            player_id_1,
+            None,
+            None,
+            None,
+            f"{player}: {sub_content} ({player_id_1})",
+            sub_content,
+        )
+    raise ValueError(f"Unknown type line: '{raw_line}'")
+
+
+def _parse_teamswitch(raw_line: str) -> LogLineRecord:
+    # TEAMSWITCH Plebs_23 (Axis > None)
+    # TEAMSWITCH SupremeOneechan (None > Allies)
+    if match := _match_teamswitch(raw_line):
+        player, sub_content = match.groups()
+        return LogLineRecord(
+            "TEAMSWITCH", player, None, None, None, None, raw_line, sub_content
+        )
+    raise ValueError(f"Unable to parse line: {raw_line}")
+
+
+def _parse_kick_ban(raw_line: str) -> LogLineRecord:
+    if match := _match_kick_ban(raw_line):
+        _action, player, sub_content, type_ = match.groups()
+    else:
+        raise ValueError(f"Unable to parse line: {raw_line}")
+
+    type_ = KICK_BAN_TYPES.get(type_, "MISC")
+    action = f"ADMIN {type_}".strip()
+
+    if "FOR TEAM KILLING" in raw_line:
+        action = f"TK AUTO {type_}"
+
+    # Reconstruct the log line without the newlines and tack on the trailing ] we lose
+    content = f"{_action}: [{player}] {sub_content}"
+    if content[-1] != "]":
+        content += "]"
+        sub_content = sub_content + "]" if sub_content else ""
+    return LogLineRecord(action, player, None, None, None, None, content, sub_content)
+
+
+def _parse_vote(raw_line: str) -> LogLineRecord:
+    action = "VOTE"
+    player = player2 = None
+
+    _, sub_content = raw_line.split("VOTESYS: ", 1)
+    content = sub_content
+
+    # VOTESYS: Player [Dingbat252] voted [PV_Favour] for VoteID[2]
+    if match := _match_vote(raw_line):
+        player = match.groups()[0]
+    # VOTESYS: Player [NoodleArms] Started a vote of type (PVR_Kick_Abuse) against [buscÃ´O-sensei]. VoteID: [2]
+    elif match := _match_vote_started(raw_line):
+        action = "VOTE STARTED"
+        player, player2 = match.groups()
+    # VOTESYS: Vote [2] completed. Result: PVR_Passed
+    elif match := _match_vote_complete(raw_line):
+        action = "VOTE COMPLETED"
+    # VOTESYS: Vote [1] expired before completion.
+    elif match := _match_vote_expired(raw_line):
+        action = "VOTE EXPIRED"
+    # VOTESYS: Vote Kick {buscÃ´O-sensei} successfully passed. [For: 2/1 - Against: 0]
+    elif match := _match_vote_passed(raw_line):
+        action = "VOTE PASSED"
+        content, player, sub_content = match.groups()
+    else:
+        raise ValueError(f"Unable to parse line: {raw_line}")
+
+    return LogLineRecord(
+        action, player, None, player2, None, None, content, sub_content
+    )
+
+
+def _parse_camera(raw_line: str) -> LogLineRecord:
+    # Player [Fachi (71234567891234567)] Entered Admin Camera
+    _, content = raw_line.split(" ", 1)
+    if match := _match_camera(content):
+        player, player_id_1, sub_content = match.groups()
+        return LogLineRecord(
+            "CAMERA", player, player_id_1, None, None, None, content, sub_content
+        )
+    raise ValueError(f"Unable to parse line: {raw_line}")
+
+
+def _parse_match_start(raw_line: str) -> LogLineRecord:
+    # MATCH START UTAH BEACH WARFARE
+    _, sub_content = raw_line.split("MATCH START ")
+    return LogLineRecord(
+        "MATCH START", None, None, None, None, None, raw_line, sub_content
+    )
+
+
+def _parse_match_ended(raw_line: str) -> LogLineRecord:
+    # MATCH ENDED `Kharkov WARFARE` ALLIED (0 - 5) AXIS
+    _, sub_content = raw_line.split("MATCH ENDED ")
+    return LogLineRecord(
+        "MATCH ENDED", None, None, None, None, None, raw_line, sub_content
+    )
+
+
+def _parse_message(raw_line: str) -> LogLineRecord:
+    raw_line = raw_line.replace("\n", " ")
+    if match := _match_message(raw_line):
+        player, player_id_1, message_content = match.groups()
+        return LogLineRecord(
+            "MESSAGE",
+            player,
+            player_id_1,
+            None,
+            None,
+            None,
+            f"{player}({player_id_1}): {message_content}",
+            message_content,
+        )
+    raise ValueError(f"Unable to parse line: {raw_line}")
+
+
+# (prefix, case sensitive, handler), a line is handled by the first entry it starts with
+LINE_TYPES: tuple[tuple[str, bool, Callable[[str], LogLineRecord]], ...] = (
+    ("KILL", True, _parse_kill),
+    ("TEAM KILL", True, _parse_kill),
+    ("DISCONNECTED", True, _parse_connect_disconnect),
+    ("CONNECTED", True, _parse_connect_disconnect),
+    ("CHAT", True, _parse_chat),
+    ("TEAMSWITCH", False, _parse_teamswitch),
+    ("KICK", True, _parse_kick_ban),
+    ("BAN", True, _parse_kick_ban),
+    ("VOTE", True, _parse_vote),
+    ("PLAYER", False, _parse_camera),
+    ("MATCH START", False, _parse_match_start),
+    ("MATCH ENDED", False, _parse_match_ended),
+    ("MESSAGE", False, _parse_message),
+)
+
+
+def _build_prefix_table():
+    """Group the line types by the first character a matching line can start with"""
+    table: dict[str, list[tuple[str, int, bool, Callable[[str], LogLineRecord]]]] = {}
+    for prefix, case_sensitive, handler in LINE_TYPES:
+        first_chars = {prefix[0]} if case_sensitive else {prefix[0], prefix[0].lower()}
+        for char in first_chars:
+            table.setdefault(char, []).append(
+                (prefix, len(prefix), case_sensitive, handler)
+            )
+    return {char: tuple(entries) for char, entries in table.items()}
+
+
+PREFIX_TABLE = _build_prefix_table()
+
+
+def parse_log_line(raw_line: str) -> LogLineRecord:
+    """Parse a single raw RCON log event or raise a ValueError"""
+    for prefix, size, case_sensitive, handler in PREFIX_TABLE.get(raw_line[:1], ()):
+        head = raw_line[:size]
+        if head == prefix or (not case_sensitive and head.upper() == prefix):
+            return handler(raw_line)
+    raise ValueError(f"Unknown type line: '{raw_line}'")
+
+
+def split_raw_log_lines(raw_logs: Iterable[str]) -> Iterable[tuple[str, str, str]]:
+    """Split raw game server logs into the relative time, timestamp and content"""
+    for raw_log in raw_logs:
+        log = _match_raw_log_line(raw_log)
+        if log is None:
+            logger.error(f"Unable to parse log line: '{raw_log}'")
+            continue
+        raw_relative_time, raw_timestamp, raw_log_line = log.groups()
+        yield raw_relative_time, raw_timestamp, raw_log_line.strip()
@@ -5,6 +5,7 @@ import time
 from typing import Callable, Iterable
 
 from sqlalchemy import desc
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
@@ -15,8 +16,17 @@ from rcon.utils import get_server_number
 
 logger = logging.getLogger(__name__)
 
+# 12 parameters per row, stays well under the 65535 parameters a statement can have
+INSERT_BATCH_SIZE = 1000
+
+
+def iter_log_history() -> Iterable[StructuredLogLineWithMetaData]:
+    """The log history newest first, fetched page by page so we can stop at the last recorded line"""
+    return LogLoop.get_log_history_list().iter_paged()
+
+
 class LogRecorder:
-    def __init__(self, dump_frequency_seconds=10, log_history_fn: Callable[[], Iterable[StructuredLogLineWithMetaData]] = LogLoop.get_log_history_list):
+    def __init__(self, dump_frequency_seconds=10, log_history_fn: Callable[[], Iterable[StructuredLogLineWithMetaData]] = iter_log_history):
         self.dump_frequency_seconds = dump_frequency_seconds
         self.server_id = get_server_number()
         self.log_history_fn = log_history_fn
@@ -33,61 +43,106 @@ class LogRecorder:
             .one_or_none()
         )
         logger.info("Getting new logs from %s", last_log.event_time if last_log else 0)
+        last_timestamp = last_log.event_time.timestamp() if last_log else None
         log: StructuredLogLineWithMetaData
         for log in self.log_history_fn():
             if not isinstance(log, dict):
                 logger.warning("Log is invalid, not a dict: %s", log)
                 continue
-            if last_log and int(log["timestamp_ms"]) / 1000 == last_log.event_time.timestamp() and '] ' + log["line_without_time"] in last_log.raw:
+            timestamp = int(log["timestamp_ms"]) / 1000
+            if last_log and timestamp == last_timestamp and '] ' + log["line_without_time"] in last_log.raw:
+                break
+            # The history is newest first, everything past this point is already recorded
+            if last_timestamp is not None and timestamp < last_timestamp:
                 break
             to_store.append(log)
         return to_store
 
-    def _collect_player_ids(self, sess: Session, logs: list[StructuredLogLineWithMetaData]) -> dict[str, PlayerID | None]:
-        players: dict[str, PlayerID | None] = {}
+    def _collect_player_ids(self, sess: Session, logs: list[StructuredLogLineWithMetaData]) -> dict[str, int | None]:
+        """Map the player IDs of the logs to the primary key of their PlayerID in a single query"""
+        players: dict[str, int | None] = {}
         for log in logs:
             if log["player_id_1"] is not None:
                 players.setdefault(log["player_id_1"], None)
             if log["player_id_2"] is not None:
                 players.setdefault(log["player_id_2"], None)
-        player_ids = sess.query(PlayerID).filter(PlayerID.player_id.in_(list(players.keys())))
-        for pid in player_ids:
-            players[pid.player_id] = pid
+        if not players:
+            return players
+
+        rows = sess.query(PlayerID.player_id, PlayerID.id).filter(
+            PlayerID.player_id.in_(list(players.keys()))
+        )
+        for player_id, id_ in rows:
+            players[player_id] = id_
 
         return players
 
-    def _save_logs(self, sess, to_store: list[StructuredLogLineWithMetaData]):
+    def _to_rows(self, sess: Session, to_store: list[StructuredLogLineWithMetaData]) -> list[dict]:
         players = self._collect_player_ids(sess, to_store)
+        creation_time = datetime.datetime.utcnow()
+        server = os.getenv("SERVER_NUMBER")
 
-        for log in to_store:
+        rows: list[dict] = []
+        seen: set[tuple[int, str]] = set()
+        # Oldest first so the row IDs follow the event order
+        for log in reversed(to_store):
+            event_time = log["timestamp_ms"] // 1000
+            if (event_time, log["raw"]) in seen:
+                continue
+            seen.add((event_time, log["raw"]))
+            rows.append(
+                {
+                    "version": log["version"],
+                    "creation_time": creation_time,
+                    "event_time": datetime.datetime.fromtimestamp(event_time),
+                    "type": log["action"],
+                    "player1_name": log["player_name_1"],
+                    "player1_steamid": players.get(log["player_id_1"]) if log["player_id_1"] else None,
+                    "player2_name": log["player_name_2"],
+                    "player2_steamid": players.get(log["player_id_2"]) if log["player_id_2"] else None,
+                    "raw": log["raw"],
+                    "content": log["message"],
+                    "server": server,
+                    "weapon": log["weapon"],
+                }
+            )
+        return rows
+
+    @staticmethod
+    def _insert_rows(sess: Session, rows: list[dict]) -> int:
+        """Insert the rows skipping the ones already recorded, returning the number of inserted rows"""
+        stmt = insert(LogLine.__table__).on_conflict_do_nothing(
+            constraint="unique_log_line"
+        )
+        inserted = 0
+        for start in range(0, len(rows), INSERT_BATCH_SIZE):
+            result = sess.execute(stmt.values(rows[start : start + INSERT_BATCH_SIZE]))
+            inserted += result.rowcount
+        return inserted
+
+    def _save_logs(self, sess, to_store: list[StructuredLogLineWithMetaData]) -> int:
+        """Record the logs in a single transaction, returning the number of inserted rows"""
+        if not to_store:
+            return 0
+        rows = self._to_rows(sess, to_store)
+
+        try:
+            inserted = self._insert_rows(sess, rows)
+            sess.commit()
+            return inserted
+        except IntegrityError:
+            sess.rollback()
+            logger.exception("Unable to record %s logs at once, recording them one by one", len(rows))
+
+        inserted = 0
+        for row in rows:
             try:
-                player_1: PlayerID | None = None
-                player_2: PlayerID | None = None
-                if log["player_id_1"]:
-                    player_1 = players[log["player_id_1"]]
-                if log["player_id_2"]:
-                    player_2 = players[log["player_id_2"]]
-                sess.add(
-                    LogLine(
-                        version=log["version"],
-                        event_time=datetime.datetime.fromtimestamp(
-                            log["timestamp_ms"] // 1000
-                        ),
-                        type=log["action"],
-                        player1_name=log["player_name_1"],
-                        player2_name=log["player_name_2"],
-                        player_1=player_1,
-                        player_2=player_2,
-                        raw=log["raw"],
-                        content=log["message"],
-                        server=os.getenv("SERVER_NUMBER"),
-                        weapon=log["weapon"],
-                    )
-                )
+                inserted += self._insert_rows(sess, [row])
                 sess.commit()
             except IntegrityError:
                 sess.rollback()
-                logger.exception("Unable to recorder %s", log)
+                logger.exception("Unable to recorder %s", row)
+        return inserted
 
     def run(self, run_immediately=False, one_off=False):
         last_run = datetime.datetime.now()
@@ -101,10 +156,20 @@ class LogRecorder:
                 time.sleep(5)
                 continue
             with enter_session() as sess:
+                started = time.monotonic()
                 to_store = self._get_new_logs(sess)
                 logger.info("%s log lines to record", len(to_store))
 
-                self._save_logs(sess, to_store)
+                inserted = self._save_logs(sess, to_store)
+                elapsed = time.monotonic() - started
+                if to_store:
+                    logger.info(
+                        "Recorded %s new log lines out of %s in %.3fs (%.0f rows/s)",
+                        inserted,
+                        len(to_store),
+                        elapsed,
+                        len(to_store) / elapsed if elapsed else 0,
+                    )
 
                 last_run = datetime.datetime.now()
             if one_off:
@@ -6,6 +6,8 @@ from collections import defaultdict
 import redis
 
 from rcon.cache_utils import get_redis_client
+from rcon.codecs import ORJSON
+from rcon.logs.cursor import LogFeed
 from rcon.rcon import Rcon, get_rcon
 from rcon.types import StructuredLogLineWithMetaData
 from rcon.user_config.log_stream import LogStreamUserConfig
@@ -26,7 +28,10 @@ class LogStream:
         self.rcon = rcon or get_rcon()
         self.red = red or get_redis_client()
         self.log_history_key = key
-        self.log_stream = Stream(key=key, maxlen=maxlen or config.stream_size)
+        self.log_stream = Stream(
+            key=key, maxlen=maxlen or config.stream_size, codec=ORJSON
+        )
+        self.log_feed = LogFeed(rcon=self.rcon, red=self.red)
 
     def clear(self):
         logger.info("Clearing stream")
@@ -63,15 +68,18 @@ class LogStream:
             self,
             loop_frequency_secs: int | None = None,
             initial_since_min: int | None = None,
-            active_since_min: int | None = None,
     ):
-        """Poll the game server and add new logs to the stream"""
+        """Add new logs from the shared log feed to the stream"""
 
         config = LogStreamUserConfig.load_from_db()
 
         since_min = initial_since_min or config.startup_since_mins
-        logs = self.rcon.get_structured_logs(since_min_ago=since_min)["logs"]
-        since_min = active_since_min or config.refresh_since_mins
+        self.log_feed.poll()
+        feed_id, logs = self.log_feed.read(
+            self.log_feed.stream_id_minutes_ago(since_min)
+        )
+        oldest_ms = (time.time() - since_min * 60) * 1000
+        logs = [log for log in logs if log["timestamp_ms"] >= oldest_ms]
 
         last_seen_id = None
         while True:
@@ -93,7 +101,8 @@ class LogStream:
             if new_logs:
                 logger.info(f"Added {new_logs} new logs {last_seen_id=}")
             time.sleep(loop_frequency_secs or config.refresh_frequency_sec)
-            logs = self.rcon.get_structured_logs(since_min_ago=since_min)["logs"]
+            self.log_feed.poll()
+            feed_id, logs = self.log_feed.read(feed_id)
 
     def logs_since(
             self, last_seen: StreamID | None = None, block_ms=500
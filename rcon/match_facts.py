@@ -0,0 +1,116 @@
+"""The weapons, victims and killers of player_stats as one row per key
+
+player_stats keeps them as JSONB objects, unnesting those for every player
+and match is what made weapon rankings and filters slow. The fact tables
+hold the same counts with B-tree indexes, record_stats_from_map refreshes
+the rows of the matches it records and backfill_match_facts fills them for
+the matches recorded before.
+
+The side of each player in a match is kept the same way in
+player_match_side, parsed once from the KILL logs of the match.
+"""
+
+import logging
+from typing import Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Table -> (key column, count column, player_stats JSONB column)
+_FACTS = {
+    "player_match_weapon": ("weapon", "kills", "weapons"),
+    "player_match_victim": ("victim_name", "kills", "most_killed"),
+    "player_match_killer": ("killer_name", "deaths", "death_by"),
+}
+
+# The side of the killer in a KILL log: "KILL: name(Allies/player id) -> ..."
+_KILLER_SIDE = r"KILL: [^(]+\(([^/]+)/"
+
+
+def refresh_match_facts(
+    sess: Session, map_ids: Sequence[int], player_ids: Sequence[int] | None = None
+):
+    """Replace the fact rows of some matches, only those of player_ids if given"""
+    if not map_ids or (player_ids is not None and not player_ids):
+        return
+
+    params: dict = {"map_ids": list(map_ids)}
+    conditions = ["map_id = ANY(:map_ids)"]
+    if player_ids is not None:
+        params["player_ids"] = list(player_ids)
+        conditions.append("playersteamid_id = ANY(:player_ids)")
+    where = " AND ".join(conditions)
+    ps_where = " AND ".join(f"ps.{c}" for c in conditions)
+
+    for table, (key, count, source) in _FACTS.items():
+        sess.execute(text(f"DELETE FROM {table} WHERE {where}"), params)
+        sess.execute(
+            text(
+                f"""
+                INSERT INTO {table} (playersteamid_id, map_id, {key}, {count})
+                SELECT ps.playersteamid_id, ps.map_id, kv.key, COALESCE(kv.value::int, 0)
+                FROM player_stats ps, jsonb_each_text(ps.{source}) AS kv(key, value)
+                WHERE {ps_where} AND jsonb_typeof(ps.{source}) = 'object'
+                """
+            ),
+            params,
+        )
+    # So matches without any kill or death aren't taken as missing their facts
+    sess.execute(
+        text(
+            "UPDATE map_history SET facts_refreshed_at = now() "
+            "WHERE id = ANY(:map_ids)"
+        ),
+        params,
+    )
+
+
+def maps_missing_facts(sess: Session) -> list[int]:
+    """The matches with player stats whose facts were never built"""
+    return list(
+        sess.execute(
+            text(
+                """
+                SELECT m.id FROM map_history m
+                WHERE m.facts_refreshed_at IS NULL
+                  AND EXISTS (SELECT 1 FROM player_stats ps WHERE ps.map_id = m.id)
+                ORDER BY m.id
+                """
+            )
+        ).scalars()
+    )
+
+
+def refresh_match_sides(sess: Session, map_id: int):
+    """Replace the player_match_side rows of a match from its KILL logs
+
+    The side of a player is the one they got the most kills for, in case
+    they switched teams during the match.
+    """
+    params = {"map_id": map_id, "killer_side": _KILLER_SIDE}
+    sess.execute(text("DELETE FROM player_match_side WHERE match_id = :map_id"), params)
+    sess.execute(
+        text(
+            """
+            INSERT INTO player_match_side (player_id, match_id, side, kills)
+            SELECT DISTINCT ON (player_id) player_id, :map_id, side, kills
+            FROM (
+                SELECT ll.player1_steamid AS player_id,
+                       substring(ll.raw FROM :killer_side) AS side,
+                       COUNT(*) AS kills
+                FROM log_lines ll
+                JOIN map_history m ON m.id = :map_id
+                WHERE ll.event_time BETWEEN m.start AND m."end"
+                  AND ll.server = CAST(m.server_number AS VARCHAR)
+                  AND ll.type = 'KILL'
+                  AND ll.player1_steamid IS NOT NULL
+                GROUP BY 1, 2
+            ) side_kills
+            WHERE side IS NOT NULL
+            ORDER BY player_id, kills DESC
+            """
+        ),
+        params,
+    )
@@ -4,11 +4,11 @@ import re
 import sys
 from collections import defaultdict
 from contextlib import contextmanager
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 from typing import Any, Generator, List, Literal, Optional, Sequence, overload
 
 import pydantic
-from sqlalchemy import TIMESTAMP, Enum, ForeignKey, String, create_engine, select, text, JSON, Engine, NullPool, Pool
+from sqlalchemy import TIMESTAMP, Date, Enum, Index, ForeignKey, String, create_engine, select, text, JSON, Engine, NullPool, Pool
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.exc import InvalidRequestError, ProgrammingError
 from sqlalchemy.ext.hybrid import hybrid_property
@@ -761,6 +761,9 @@ class Maps(Base):
     # A dict with the result of the game mapped as Axis=int, Allied=int
     result: Mapped[dict[str, int]] = mapped_column(nullable=True)
     game_layout: Mapped["GameLayout"] = mapped_column(JSON, nullable=False, default=GameLayout)
+    # When the weapon, victim and killer facts of the match were last built,
+    # None until they have been even if the match has none
+    facts_refreshed_at: Mapped[Optional[datetime]] = mapped_column(TIMESTAMP)
 
     player_stats: Mapped[list["PlayerStats"]] = relationship(back_populates="map")
 
@@ -936,6 +939,124 @@ class PlayerStats(Base):
         }
 
 
+class _PlayerStatsRollupColumns:
+    """The player_stats of a player summed over many matches, kept up to date by rcon.stats_rollups"""
+
+    matches: Mapped[int] = mapped_column(nullable=False, default=0)
+    # The greatest of the names, levels, streaks... of the matches
+    name: Mapped[str] = mapped_column(nullable=True)
+    level: Mapped[int] = mapped_column(nullable=True)
+    kills_streak: Mapped[int] = mapped_column(nullable=True)
+    longest_life_secs: Mapped[int] = mapped_column(nullable=True)
+    kills: Mapped[int] = mapped_column(nullable=False, default=0)
+    deaths: Mapped[int] = mapped_column(nullable=False, default=0)
+    teamkills: Mapped[int] = mapped_column(nullable=False, default=0)
+    deaths_by_tk: Mapped[int] = mapped_column(nullable=False, default=0)
+    time_seconds: Mapped[int] = mapped_column(nullable=False, default=0)
+    combat: Mapped[int] = mapped_column(nullable=False, default=0)
+    offense: Mapped[int] = mapped_column(nullable=False, default=0)
+    defense: Mapped[int] = mapped_column(nullable=False, default=0)
+    support: Mapped[int] = mapped_column(nullable=False, default=0)
+    # The average kills per minute is the sum over the number of matches that have one
+    kills_per_minute_sum: Mapped[float] = mapped_column(nullable=False, default=0)
+    kills_per_minute_count: Mapped[int] = mapped_column(nullable=False, default=0)
+
+
+class PlayerStatsRollup(_PlayerStatsRollupColumns, Base):
+    """All the matches of a player"""
+
+    __tablename__ = "player_stats_rollup"
+
+    player_id_id: Mapped[int] = mapped_column(
+        "playersteamid_id", ForeignKey("steam_id_64.id"), primary_key=True
+    )
+
+
+class PlayerStatsRollupBucket(_PlayerStatsRollupColumns, Base):
+    """The matches of a player on a map during a day"""
+
+    __tablename__ = "player_stats_rollup_bucket"
+    __table_args__ = (
+        Index("ix_player_stats_rollup_bucket_day", "day"),
+        Index("ix_player_stats_rollup_bucket_map_name_day", "map_name", "day"),
+    )
+
+    player_id_id: Mapped[int] = mapped_column(
+        "playersteamid_id", ForeignKey("steam_id_64.id"), primary_key=True
+    )
+    map_name: Mapped[str] = mapped_column(primary_key=True)
+    # The day the matches started on, in UTC
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+
+
+class PlayerMatchWeapon(Base):
+    """The kills of a player with a weapon in a match, from PlayerStats.weapons"""
+
+    __tablename__ = "player_match_weapon"
+    __table_args__ = (
+        # Covers the kill totals per weapon
+        Index("ix_player_match_weapon_weapon", "weapon", postgresql_include=["kills"]),
+    )
+
+    player_id_id: Mapped[int] = mapped_column(
+        "playersteamid_id", ForeignKey("steam_id_64.id"), primary_key=True
+    )
+    map_id: Mapped[int] = mapped_column(
+        ForeignKey("map_history.id"), primary_key=True, index=True
+    )
+    weapon: Mapped[str] = mapped_column(primary_key=True)
+    kills: Mapped[int] = mapped_column(nullable=False)
+
+
+class PlayerMatchVictim(Base):
+    """The kills of a player on another one in a match, from PlayerStats.most_killed"""
+
+    __tablename__ = "player_match_victim"
+
+    player_id_id: Mapped[int] = mapped_column(
+        "playersteamid_id", ForeignKey("steam_id_64.id"), primary_key=True
+    )
+    map_id: Mapped[int] = mapped_column(
+        ForeignKey("map_history.id"), primary_key=True, index=True
+    )
+    victim_name: Mapped[str] = mapped_column(primary_key=True)
+    kills: Mapped[int] = mapped_column(nullable=False)
+
+
+class PlayerMatchKiller(Base):
+    """The deaths of a player by another one in a match, from PlayerStats.death_by"""
+
+    __tablename__ = "player_match_killer"
+
+    player_id_id: Mapped[int] = mapped_column(
+        "playersteamid_id", ForeignKey("steam_id_64.id"), primary_key=True
+    )
+    map_id: Mapped[int] = mapped_column(
+        ForeignKey("map_history.id"), primary_key=True, index=True
+    )
+    killer_name: Mapped[str] = mapped_column(primary_key=True)
+    deaths: Mapped[int] = mapped_column(nullable=False)
+
+
+class PlayerMatchSide(Base):
+    """The side a player got most of their kills for in a match, from the KILL logs
+
+    Players without kills in a match, or whose match predates the log
+    capture, have no row.
+    """
+
+    __tablename__ = "player_match_side"
+
+    player_id_id: Mapped[int] = mapped_column(
+        "player_id", ForeignKey("steam_id_64.id"), primary_key=True
+    )
+    match_id: Mapped[int] = mapped_column(
+        ForeignKey("map_history.id"), primary_key=True, index=True
+    )
+    side: Mapped[str] = mapped_column(nullable=False, index=True)
+    kills: Mapped[int] = mapped_column(nullable=False)
+
+
 class PlayerComment(Base):
     __tablename__ = "player_comments"
     id: Mapped[int] = mapped_column(primary_key=True)
@@ -1,25 +1,207 @@
+import atexit
+import bisect
 import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+import redis.exceptions
 
 from rcon.cache_utils import get_redis_client
 
 logger = logging.getLogger(__name__)
 
+# Upper bounds in milliseconds of the latency histogram buckets, the last bucket has no upper bound
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+LATENCY_PERCENTILES = (50, 95, 99)
+
+
+def percentile_from_histogram(buckets: list[int], percentile: float) -> float | None:
+    """Estimate a percentile in milliseconds from the counts of the LATENCY_BUCKETS_MS buckets
+
+    Latencies are assumed to be spread evenly within a bucket, the last bucket
+    is reported as its lower bound.
+    """
+    total = sum(buckets)
+    if not total:
+        return None
+
+    rank = total * percentile / 100
+    seen = 0
+    for idx, count in enumerate(buckets):
+        if count and seen + count >= rank:
+            if idx == len(LATENCY_BUCKETS_MS):
+                return float(LATENCY_BUCKETS_MS[-1])
+            lower = LATENCY_BUCKETS_MS[idx - 1] if idx else 0
+            upper = LATENCY_BUCKETS_MS[idx]
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
 class PerformanceStatistics:
     """
     Provides a way to persist performance-related metrics over multiple service (instances).
+
+    Counters and latencies are aggregated in process and written to Redis in a
+    single pipeline every flush_interval_seconds by a background thread (and
+    when the process exits), the names of the metrics are kept in registry
+    sets so dump() doesn't have to scan keys.
     """
-    def __init__(self, namespace: str, enabled: bool = False):
+    def __init__(self, namespace: str, enabled: bool = False, flush_interval_seconds: float = 5):
         self.red = get_redis_client()
         self.namespace = namespace
         self.enabled = enabled
+        self.flush_interval_seconds = flush_interval_seconds
+        self._lock = threading.Lock()
+        self._counters: Counter[str] = Counter()
+        self._gauges: dict[str, int] = {}
+        self._latencies: defaultdict[str, list[int]] = defaultdict(
+            lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        )
+        self._last_flush = time.monotonic()
+        self._flusher: threading.Thread | None = None
 
     def metric_key(self, metric: str) -> str:
         return self.namespace + '::' + metric
 
+    def gauges_key(self) -> str:
+        return self.namespace + ':gauges'
+
+    def metrics_key(self) -> str:
+        """The set of the counters recorded so far"""
+        return self.namespace + ':metrics'
+
+    def latency_key(self, command: str) -> str:
+        return self.namespace + ':latency::' + command
+
+    def latency_commands_key(self) -> str:
+        """The set of the commands with recorded latencies"""
+        return self.namespace + ':latency_commands'
+
     def increment(self, metric: str, value: int = 1):
         if not self.enabled:
             return
-        self.red.incr(self.metric_key(metric), value)
+        with self._lock:
+            self._counters[metric] += value
+        self._maybe_flush()
+
+    def gauge(self, metric: str, value: int):
+        """
+        Records the current value of a metric (like the size of a pool). Unlike counters, gauges are not reset when
+        the metrics are dumped.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[metric] = value
+        self._maybe_flush()
+
+    def timing(self, command: str, seconds: float):
+        """Records how long a command took"""
+        if not self.enabled:
+            return
+        bucket = bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+        with self._lock:
+            self._latencies[command][bucket] += 1
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        # Started on the first metric, stats that are disabled or never used don't need it
+        if self._flusher is None:
+            self._start_flusher()
+        if time.monotonic() - self._last_flush >= self.flush_interval_seconds:
+            self.flush()
+
+    def _start_flusher(self):
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._flush_loop,
+                name=f"perf-stats-{self.namespace}",
+                daemon=True,
+            )
+            self._flusher.start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        """Flush the metrics that aren't followed by others, e.g. the last latencies of a burst"""
+        while True:
+            time.sleep(self.flush_interval_seconds)
+            if time.monotonic() - self._last_flush < self.flush_interval_seconds:
+                continue
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Unable to flush performance statistics")
+
+    def flush(self):
+        """Write the metrics aggregated in process to Redis"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            counters, self._counters = self._counters, Counter()
+            gauges, self._gauges = self._gauges, {}
+            latencies = self._latencies
+            self._latencies = defaultdict(lambda: [0] * (len(LATENCY_BUCKETS_MS) + 1))
+
+        if not (counters or gauges or latencies):
+            return
+
+        p = self.red.pipeline(transaction=False)
+        if counters:
+            p.sadd(self.metrics_key(), *counters.keys())
+            for metric, value in counters.items():
+                p.incrby(self.metric_key(metric), value)
+        if gauges:
+            p.hset(self.gauges_key(), mapping=gauges)
+        if latencies:
+            p.sadd(self.latency_commands_key(), *latencies.keys())
+            for command, buckets in latencies.items():
+                for idx, count in enumerate(buckets):
+                    if count:
+                        p.hincrby(self.latency_key(command), str(idx), count)
+        try:
+            p.execute()
+        except redis.exceptions.RedisError:
+            logger.exception("Unable to record performance statistics")
+
+    def _read_latencies(self, commands: list[str], reset: bool) -> dict[str, list[int]]:
+        p = self.red.pipeline(transaction=reset)
+        for command in commands:
+            p.hgetall(self.latency_key(command))
+            if reset:
+                p.delete(self.latency_key(command))
+        raw = p.execute()
+        if reset:
+            raw = raw[::2]
+
+        latencies = {}
+        for command, fields in zip(commands, raw):
+            buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+            for idx, count in fields.items():
+                buckets[int(idx)] = int(count)
+            latencies[command] = buckets
+        return latencies
+
+    def latency_percentiles(self, reset: bool = False) -> dict[str, dict[str, float | int | None]]:
+        """
+        The p50/p95/p99 latency in milliseconds and the number of calls of each command since the last dump,
+        slowest p95 first.
+        """
+        commands = sorted(
+            k.decode() if isinstance(k, bytes) else k
+            for k in self.red.smembers(self.latency_commands_key())
+        )
+        res = {}
+        for command, buckets in self._read_latencies(commands, reset).items():
+            if not any(buckets):
+                continue
+            stats: dict[str, float | int | None] = {"count": sum(buckets)}
+            for percentile in LATENCY_PERCENTILES:
+                stats[f"p{percentile}_ms"] = percentile_from_histogram(buckets, percentile)
+            res[command] = stats
+        return dict(sorted(res.items(), key=lambda item: item[1]["p95_ms"] or 0, reverse=True))
 
     def dump(self) -> dict[str, int]:
         """
@@ -28,15 +210,20 @@ class PerformanceStatistics:
         will be reset to 0.
         :return:
         """
-        keys = self.red.keys(self.metric_key('*'), decode_responses=True)
+        self.flush()
+        metrics = sorted(
+            k.decode() if isinstance(k, bytes) else k
+            for k in self.red.smembers(self.metrics_key())
+        )
         p = self.red.pipeline()
-        for k in keys:
-            p.set(k, 0, get=True)
+        for metric in metrics:
+            p.set(self.metric_key(metric), 0, get=True)
         a = p.execute()
 
         res = {}
-        idx = 0
-        for k in keys:
-            res[k.decode().replace(self.namespace + '::', '')] = int(a[idx])
-            idx += 1
+        for metric, value in zip(metrics, a):
+            res[metric] = int(value or 0)
+
+        for k, v in self.red.hgetall(self.gauges_key()).items():
+            res[k.decode() if isinstance(k, bytes) else k] = int(v)
         return res
@@ -1,14 +1,15 @@
 import datetime
 import logging
 import os
-import pickle
 import re
 import time
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import Callable
 
 from rcon.cache_utils import get_redis_client
+from rcon.codecs import COMPRESSED_PICKLE
 from rcon.game_logs import get_historical_logs_records, get_recent_logs
+from rcon.logs.loop import LogLoop
 from rcon.models import enter_session
 from rcon.player_history import _get_profiles, get_player_profile_by_player_ids
 from rcon.rcon import get_rcon
@@ -41,6 +42,12 @@ class BaseStats:
         self.voted_yes_regex = re.compile(".*PV_Favour.*")
         self.voted_no_regex = re.compile(".*PV_Against.*")
         self.red = get_redis_client()
+        self.actions_processors = {
+            "KILL": self._add_kill,
+            "TEAM KILL": self._add_tk,
+            "VOTE STARTED": self._add_vote_started,
+            "VOTE": self._add_vote,
+        }
 
     def _is_player_death(self, player, log):
         return player["name"] == log["player_name_2"]
@@ -162,65 +169,62 @@ class BaseStats:
         """
         stats_by_player = {}
 
-        actions_processors = {
-            "KILL": self._add_kill,
-            "TEAM KILL": self._add_tk,
-            "VOTE STARTED": self._add_vote_started,
-            "VOTE": self._add_vote,
-        }
         for p in players:
             logger.debug("Crunching stats for %s", p)
             player_logs: list[StructuredLogLineWithMetaData] = indexed_logs.get(
                 p["name"], []
             )
             profile = profiles_by_id.get(p.get(PLAYER_ID))
-            stats = {
-                "player": p["name"],
-                PLAYER_ID: p.get(PLAYER_ID),
-                "steaminfo": (
-                    profile.steaminfo.to_dict()
-                    if profile and profile.steaminfo
-                    else None
-                ),
-                "kills": 0,
-                "kills_streak": 0,
-                "deaths": 0,
-                "death_by_weapons": {},
-                "deaths_without_kill_streak": 0,
-                "teamkills": 0,
-                "teamkills_streak": 0,
-                "deaths_by_tk": 0,
-                "deaths_by_tk_streak": 0,
-                "nb_vote_started": 0,
-                "nb_voted_yes": 0,
-                "nb_voted_no": 0,
-                "longest_life_secs": 0,
-                "shortest_life_secs": 9999,
-                "last_spawn": self._get_player_first_appearance(p),
-                "time_seconds": self._get_player_session_time(p),
-                "weapons": {},
-                "death_by": {},
-                "most_killed": {},
-                "combat": 0,
-                "offense": 0,
-                "defense": 0,
-                "support": 0,
-                "level": 0,
-            }
+            stats = self._new_player_stats(p, profile)
 
             streaks = Streaks()
-            # player_p = p
-            # import ipdb; ipdb.set_trace()
             for l in player_logs:
-                action = l["action"]
-                processor = actions_processors.get(action, lambda **kargs: None)
-                processor(stats=stats, player=p, log=l)
-                self._streaks_accumulator(p, l, stats, streaks)
+                self._process_log(p, l, stats, streaks)
 
             stats_by_player[p["name"]] = self._compute_stats(stats)
 
         return stats_by_player
 
+    def _new_player_stats(self, player, profile):
+        return {
+            "player": player["name"],
+            PLAYER_ID: player.get(PLAYER_ID),
+            "steaminfo": (
+                profile.steaminfo.to_dict() if profile and profile.steaminfo else None
+            ),
+            "kills": 0,
+            "kills_streak": 0,
+            "deaths": 0,
+            "death_by_weapons": {},
+            "deaths_without_kill_streak": 0,
+            "teamkills": 0,
+            "teamkills_streak": 0,
+            "deaths_by_tk": 0,
+            "deaths_by_tk_streak": 0,
+            "nb_vote_started": 0,
+            "nb_voted_yes": 0,
+            "nb_voted_no": 0,
+            "longest_life_secs": 0,
+            "shortest_life_secs": 9999,
+            "last_spawn": self._get_player_first_appearance(player),
+            "time_seconds": self._get_player_session_time(player),
+            "weapons": {},
+            "death_by": {},
+            "most_killed": {},
+            "combat": 0,
+            "offense": 0,
+            "defense": 0,
+            "support": 0,
+            "level": 0,
+        }
+
+    def _process_log(self, player, log, stats, streaks: Streaks):
+        """Add a log line of the player to his stats"""
+        processor = self.actions_processors.get(log["action"])
+        if processor:
+            processor(stats=stats, player=player, log=log)
+        self._streaks_accumulator(player, log, stats, streaks)
+
     def _compute_stats(self, stats):
         new_stats = dict(**stats)
         new_stats["kills_per_minute"] = round(
@@ -334,7 +338,7 @@ class LiveStats(BaseStats):
         stats = self.get_current_players_stats()
         self.red.set(
             "LIVE_STATS",
-            pickle.dumps(
+            COMPRESSED_PICKLE.dumps(
                 dict(snapshot_timestamp=snapshot_ts, stats=list(stats.values()))
             ),
         )
@@ -342,7 +346,7 @@ class LiveStats(BaseStats):
     def get_cached_stats(self):
         stats = self.red.get("LIVE_STATS")
         if stats:
-            stats = pickle.loads(stats)
+            stats = COMPRESSED_PICKLE.loads(stats)
         return stats
 
 
@@ -390,6 +394,37 @@ class TimeWindowStats(BaseStats):
         # if we had a player that disconnected but was not in the time record it means he did have any kill / death or other actions like chat, vote
         # This player won't have a session time (most likely and AFK one)
 
+    def _set_session_totals(
+        self, players_times, until, offset_cooldown_time_seconds=100
+    ):
+        # Here we massage the session times for a player. 1 session should be a pair of times a start and an end
+        for player, times in players_times.items():
+            starts = times["start"]
+            ends = times["end"]
+            times["total"] = 0
+            # This is an error check, it should never happend to not have a start time
+            # If the player connected prior to the time window we're computing the start for, then the start time should be the start of that window
+            if len(starts) == 0:
+                logger.error("No start time for  %s - %s", player, times)
+            # If there's 1 start more that there are ends, it means that the player did not leave the game, and therefore we add the end of the session as the end of the window we're computing the stats for
+            # We discount the cooldown time at the end of the game to get a more accurate kill / min
+            elif len(starts) == len(ends) + 1:
+                logger.debug("Adding end time to end of range for %s", player)
+                ends.append(
+                    until - datetime.timedelta(seconds=offset_cooldown_time_seconds)
+                )
+            # If starts and ends don't match something's probably wrong the the code
+            if len(starts) != len(ends):
+                logger.error("Sessions time don't match for %s - %s", player, times)
+                continue
+
+            # We loop over the pairs of start and ends (chronologically in the order we encountered them)
+            # and we compute the total play time of the player for the window we're looking at
+            for pair in zip(starts, ends):
+                start, end = pair
+                time = end - start
+                times["total"] += time.total_seconds()
+
     def _get_player_session_time(self, player):
         # TODO: Make safe
         try:
@@ -443,34 +478,7 @@ class TimeWindowStats(BaseStats):
             dict(name=player_name, player_id=player_id)
             for player_name, player_id in players
         ]
-        # Here we massage the session times for a player. 1 session should be a pair of times a start and an end
-        for player, times in players_times.items():
-            starts = times["start"]
-            ends = times["end"]
-            times["total"] = 0
-            # This is an error check, it should never happend to not have a start time
-            # If the player connected prior to the time window we're computing the start for, then the start time should be the start of that window
-            if len(starts) == 0:
-                logger.error("No start time for  %s - %s", player, times)
-            # If there's 1 start more that there are ends, it means that the player did not leave the game, and therefore we add the end of the session as the end of the window we're computing the stats for
-            # We discount the cooldown time at the end of the game to get a more accurate kill / min
-            elif len(starts) == len(ends) + 1:
-                logger.debug("Adding end time to end of range for %s", player)
-                ends.append(
-                    until - datetime.timedelta(seconds=offset_cooldown_time_seconds)
-                )
-            # If starts and ends don't match something's probably wrong the the code
-            if len(starts) != len(ends):
-                logger.error("Sessions time don't match for %s - %s", player, times)
-                continue
-
-            # We loop over the pairs of start and ends (chronologically in the order we encountered them)
-            # and we compute the total play time of the player for the window we're looking at
-            for pair in zip(starts, ends):
-                start, end = pair
-                time = end - start
-                times["total"] += time.total_seconds()
-
+        self._set_session_totals(players_times, until, offset_cooldown_time_seconds)
         self.times = players_times
 
         logger.debug("Indexing profiles by id")
@@ -539,6 +547,159 @@ class TimeWindowStats(BaseStats):
         )
 
 
+@dataclass
+class GameStatsAccumulator:
+    """The running stats of a time window, everything needed to add new log lines to them"""
+
+    from_timestamp: float
+    # (timestamp_ms, line_without_time) of the newest log line accumulated
+    last_line: tuple[int, str] | None = None
+    players: set[tuple[str, str]] = field(default_factory=set)
+    players_times: dict = field(default_factory=dict)
+    stats: dict[str, dict] = field(default_factory=dict)
+    streaks: dict[str, Streaks] = field(default_factory=dict)
+
+
+class IncrementalTimeWindowStats(TimeWindowStats):
+    """Same stats as TimeWindowStats.get_players_stats_from_time, but only the log
+    lines added since the previous call are processed
+
+    The accumulated stats are checkpointed in redis and start over when the
+    window starts at a different time or when a MATCH START line comes in.
+    """
+
+    checkpoint_key = "LIVE_GAME_STATS_ACCUMULATOR"
+
+    def _load(self, from_timestamp: float) -> GameStatsAccumulator:
+        raw = self.red.get(self.checkpoint_key)
+        if raw:
+            try:
+                acc = COMPRESSED_PICKLE.loads(raw)
+                # Started over on a MATCH START line before the window moved to it
+                if acc.from_timestamp >= from_timestamp:
+                    return acc
+                logger.info("Time window changed, starting stats over")
+            except Exception:
+                logger.exception("Invalid stats checkpoint, starting stats over")
+        return GameStatsAccumulator(from_timestamp=from_timestamp)
+
+    def _save(self, acc: GameStatsAccumulator):
+        self.red.set(self.checkpoint_key, COMPRESSED_PICKLE.dumps(acc))
+
+    def _get_new_logs(
+        self, acc: GameStatsAccumulator
+    ) -> list[StructuredLogLineWithMetaData] | None:
+        """The lines of the window after the checkpoint, oldest first
+
+        None if the checkpointed line isn't in the log history anymore.
+        """
+        new_logs = []
+        log: StructuredLogLineWithMetaData
+        for log in LogLoop.get_log_history_list().iter_paged(page_size=200):
+            if not isinstance(log, dict):
+                continue
+            if acc.last_line:
+                if (log["timestamp_ms"], log["line_without_time"]) == acc.last_line:
+                    break
+                # The history is newest first, we're past the checkpoint without seeing it
+                if log["timestamp_ms"] < acc.last_line[0]:
+                    return None
+            if log["timestamp_ms"] / 1000 < acc.from_timestamp:
+                break
+            new_logs.append(log)
+        else:
+            if acc.last_line:
+                return None
+        new_logs.reverse()
+        return new_logs
+
+    def _accumulate(self, acc: GameStatsAccumulator, log):
+        from_ = datetime.datetime.utcfromtimestamp(acc.from_timestamp)
+        names = []
+        for name_key, id_key in (
+            ("player_name_1", "player_id_1"),
+            ("player_name_2", "player_id_2"),
+        ):
+            if player := log.get(name_key):
+                self._set_start_end_times(player, acc.players_times, log, from_)
+                if player_id := log.get(id_key):
+                    acc.players.add((player, player_id))
+                names.append(player)
+
+        for player in names:
+            p = dict(name=player)
+            if player not in acc.stats:
+                # The session time is only known when the stats are read
+                times = acc.players_times.get(player)
+                self.times = {player: {**times, "total": 0}} if times else {}
+                acc.stats[player] = self._new_player_stats(p, None)
+                acc.streaks[player] = Streaks()
+            self._process_log(p, log, acc.stats[player], acc.streaks[player])
+
+    def _update(self, from_timestamp: float) -> GameStatsAccumulator:
+        acc = self._load(from_timestamp)
+        new_logs = self._get_new_logs(acc)
+        if new_logs is None:
+            logger.warning(
+                "Stats checkpoint not found in the logs, starting stats over"
+            )
+            acc = GameStatsAccumulator(from_timestamp=from_timestamp)
+            new_logs = self._get_new_logs(acc) or []
+
+        logger.debug("%s new log lines to add to the stats", len(new_logs))
+        for log in new_logs:
+            if log["action"] == "MATCH START":
+                acc = GameStatsAccumulator(from_timestamp=log["timestamp_ms"] // 1000)
+            self._accumulate(acc, log)
+            acc.last_line = (log["timestamp_ms"], log["line_without_time"])
+
+        if new_logs:
+            self._save(acc)
+        return acc
+
+    def get_players_stats_from_time(self, from_timestamp):
+        acc = self._update(from_timestamp)
+
+        players_times = {
+            player: {"start": list(times["start"]), "end": list(times["end"])}
+            for player, times in acc.players_times.items()
+        }
+        self._set_session_totals(
+            players_times, datetime.datetime.utcnow(), offset_cooldown_time_seconds=0
+        )
+        self.times = players_times
+
+        players = [
+            dict(name=player_name, player_id=player_id)
+            for player_name, player_id in acc.players
+        ]
+        with enter_session() as sess:
+            profiles_by_id = {
+                profile.player_id: profile
+                for profile in get_player_profile_by_player_ids(
+                    sess, [p[PLAYER_ID] for p in players]
+                )
+            }
+
+            stats_by_player = {}
+            for p in players:
+                profile = profiles_by_id.get(p[PLAYER_ID])
+                stats = {
+                    **acc.stats[p["name"]],
+                    "player": p["name"],
+                    PLAYER_ID: p[PLAYER_ID],
+                    "steaminfo": (
+                        profile.steaminfo.to_dict()
+                        if profile and profile.steaminfo
+                        else None
+                    ),
+                    "time_seconds": self._get_player_session_time(p),
+                }
+                stats_by_player[p["name"]] = self._compute_stats(stats)
+
+        return stats_by_player
+
+
 def live_stats_loop():
     live = LiveStats()
     config = RconServerSettingsUserConfig.load_from_db()
@@ -575,7 +736,7 @@ def live_stats_loop():
                 logger.debug("Refreshed current_game_stats")
                 red.set(
                     "LIVE_GAME_STATS",
-                    pickle.dumps(
+                    COMPRESSED_PICKLE.dumps(
                         dict(
                             snapshot_timestamp=snapshot_ts,
                             stats=list(stats.values()),
@@ -596,10 +757,12 @@ def current_game_stats():
         logger.error("No maps information available")
         return {}
 
-    stats = TimeWindowStats().get_players_stats_from_time(current_map["start"])
+    stats = IncrementalTimeWindowStats().get_players_stats_from_time(
+        current_map["start"]
+    )
+    player_stats = MapsHistory().get_player_stats(current_map)
     for name in stats:
         stat = stats.setdefault(name)
-        player_stats = current_map.get("player_stats", dict())
         map_stat = player_stats.get(stat[PLAYER_ID], None)
         if map_stat is None:
             logger.info("No stats for: " + stat[PLAYER_ID])
@@ -616,7 +779,7 @@ def get_cached_live_game_stats() -> CachedLiveGameStats:
     red = get_redis_client()
     stats = red.get("LIVE_GAME_STATS")
     if stats:
-        stats = pickle.loads(stats)
+        stats = COMPRESSED_PICKLE.loads(stats)
     return stats
 
 
@@ -13,13 +13,27 @@ from dateutil import parser
 
 from rcon.connection import HLLCommandError
 import rcon.steam_utils
-from rcon.cache_utils import get_redis_client, invalidates, ttl_cache
+from rcon.cache_utils import (
+    get_redis_client,
+    invalidates,
+    set_l1_perf_stats,
+    ttl_cache,
+)
+from rcon.codecs import COMPRESSED_PICKLE
 from rcon.commands import HLLCommandFailedError, ServerCtl, VipId
 from rcon.maps import UNKNOWN_MAP_NAME, Layer, is_server_loading_map, parse_layer
+from rcon.logs import parser as log_parser
 from rcon.models import PlayerID, PlayerVIP, enter_session, GameLayout
 from rcon.perf_statistics import PerformanceStatistics
 from rcon.player_history import get_profiles, safe_save_player_action, save_player, get_player_profile
 from rcon.settings import SERVER_INFO
+from rcon.team_view import (
+    UNASSIGNED,
+    build_team_view,
+    get_published_team_view,
+    guess_squad_type,
+    has_leader,
+)
 from rcon.types import (
     AdminType,
     GameLayoutRandomConstraints,
@@ -44,8 +58,6 @@ from rcon.user_config.rcon_connection_settings import RconConnectionSettingsUser
 from rcon.user_config.rcon_server_settings import RconServerSettingsUserConfig
 from rcon.user_config.utils import BaseUserConfig
 from rcon.utils import (
-    ALL_ROLES,
-    ALL_ROLES_KEY_INDEX_MAP,
     INDEFINITE_VIP_DATE,
     MapsHistory,
     default_player_info_dict,
@@ -56,7 +68,6 @@ from rcon.utils import (
 PLAYER_ID = "player_id"
 NAME = "name"
 ROLE = "role"
-UNASSIGNED = "unassigned"
 
 TEMP_BAN = "temp"
 PERMA_BAN = "perma"
@@ -166,38 +177,32 @@ class Rcon(ServerCtl):
     )
     MAX_SERV_NAME_LEN = 1024  # I totally made up that number. Unable to test
     map_regexp = re.compile(r"^(\w+_?)+$")
-    chat_regexp = re.compile(r"CHAT\[(Team|Unit)\]\[(.*)\((Allies|Axis)/(.*)\)\]: (.*)")
+    chat_regexp = log_parser.chat_regexp
     player_info_pattern = r"(.*)\(((Allies)|(Axis))/(\d+)\)"
     player_info_regexp = re.compile(r"(.*)\(((Allies)|(Axis))/(\d+)\)")
     log_time_regexp = re.compile(r".*\((\d+)\).*")
-    connect_disconnect_pattern = re.compile(r"(.+) \((.*)\)")
-    kill_teamkill_pattern = re.compile(
-        r"(.*)\((?:Allies|Axis)\/(.*)\) -> (.*)\((?:Allies|Axis)\/(.*)\) with (.*)"
-    )
-    camera_pattern = re.compile(r"\[(.*) \((.*)\)\] (.*)")
-    teamswitch_pattern = re.compile(r"TEAMSWITCH\s(.*)\s\((.*\s>\s.*)\)")
-    kick_ban_pattern = re.compile(
-        r"(KICK|BAN): \[(.*)\] (.*\[(KICKED|BANNED|PERMANENTLY|YOU|Host|Anti-Cheat|[^\]]*)[^\]]*)(?:\])*"
-    )
-    vote_pattern = re.compile(
-        r"VOTESYS: Player \[(.*)\] voted \[.*\] for VoteID\[\d+\]"
-    )
-    vote_started_pattern = re.compile(
-        r"VOTESYS: Player \[(.*)\] Started a vote of type \(.*\) against \[(.*)\]. VoteID: \[\d+\]"
-    )
-    vote_complete_pattern = re.compile(r"VOTESYS: Vote \[\d+\] completed. Result: (.*)")
-    vote_expired_pattern = re.compile(r"VOTESYS: Vote \[\d+\] (expired|prematurely)")
-    vote_passed_pattern = re.compile(r"VOTESYS: (Vote Kick \{(.*)\} .*\[(.*)\])")
-    # Need the DOTALL flag to allow `.` to capture newlines in multi line messages
-    message_pattern = re.compile(
-        r"MESSAGE: player \[(.+)\((.*)\)\], content \[(.+)\]", re.DOTALL
-    )
+    connect_disconnect_pattern = log_parser.connect_disconnect_pattern
+    kill_teamkill_pattern = log_parser.kill_teamkill_pattern
+    camera_pattern = log_parser.camera_pattern
+    teamswitch_pattern = log_parser.teamswitch_pattern
+    kick_ban_pattern = log_parser.kick_ban_pattern
+    vote_pattern = log_parser.vote_pattern
+    vote_started_pattern = log_parser.vote_started_pattern
+    vote_complete_pattern = log_parser.vote_complete_pattern
+    vote_expired_pattern = log_parser.vote_expired_pattern
+    vote_passed_pattern = log_parser.vote_passed_pattern
+    message_pattern = log_parser.message_pattern
 
     def __init__(self, *args, pool_size: bool | None = None, **kwargs):
         config = RconConnectionSettingsUserConfig.load_from_db()
         super().__init__(
-            *args, **kwargs, perf_stats=PerformanceStatistics("rcon", config.performance_statistics_enabled)
+            *args,
+            **kwargs,
+            perf_stats=PerformanceStatistics("rcon", config.performance_statistics_enabled),
+            multiplexed=config.multiplexed_connections_enabled,
+            multiplexed_pool_size=config.multiplexed_pool_size,
         )
+        set_l1_perf_stats(self.perf_stats)
         if pool_size is not None:
             self.pool_size = pool_size
         else:
@@ -240,28 +245,31 @@ class Rcon(ServerCtl):
 
     # TODO
     # When returns value from the cache it is always {}
-    @ttl_cache(ttl=5)
+    @ttl_cache(ttl=5, stale_ttl=5)
     def get_players(self) -> list[GetPlayersType]:
-        player_ids = {
-            player_id: {NAME: name, PLAYER_ID: player_id}
-            for name, player_id in self.get_player_ids()
-        }
+        player_names = {player_id: name for name, player_id in self.get_player_ids()}
+        return list(self.get_players_by_id(player_names).values())
+
+    def get_players_by_id(
+        self, player_names: dict[str, str]
+    ) -> dict[str, GetPlayersType]:
+        """The get_players entries of the given player IDs (mapped to their names), uncached"""
         # can't pickle dict keys object
         steam_profiles = rcon.steam_utils.get_steam_profiles_mult_players(
-            steam_id_64s=[k for k in player_ids.keys()]
+            steam_id_64s=[k for k in player_names.keys()]
         )
 
         vip_player_ids = set(v[PLAYER_ID] for v in super().get_vip_ids())
         profiles = {
             p[PLAYER_ID]: p
-            for p in get_profiles([player_id for player_id in player_ids.keys()])
+            for p in get_profiles([player_id for player_id in player_names.keys()])
         }
 
         players: dict[str, GetPlayersType] = {}
-        for player_id in player_ids.keys():
+        for player_id, name in player_names.items():
             profile = steam_profiles.get(player_id)
             players[player_id] = {
-                NAME: player_ids[player_id]["name"],
+                NAME: name,
                 PLAYER_ID: player_id,
                 "country": profile.get("country") if profile else None,
                 "steam_bans": profile.get("bans") if profile else None,
@@ -269,9 +277,20 @@ class Rcon(ServerCtl):
                 "is_vip": player_id in vip_player_ids,
             }
 
-        return [p for p in players.values()]
+        return players
 
     def get_detailed_players(self) -> GetDetailedPlayers:
+        return self.detail_players(self.get_players(), super().get_all_player_info())
+
+    def detail_players(
+        self,
+        players: Iterable[GetPlayersType],
+        all_player_info: Iterable[PlayerInfoType],
+    ) -> GetDetailedPlayers:
+        """Merge players with their info from a get_all_player_info poll
+
+        Players missing from the poll (they left meanwhile) are skipped.
+        """
         try:
             current_map_start = MapsHistory()[0]["start"]
             if not current_map_start:
@@ -284,14 +303,10 @@ class Rcon(ServerCtl):
             int(datetime.now(timezone.utc).timestamp() - current_map_start)
         )
 
-        players = self.get_players()
         fail_count = 0
         players_by_id: dict[str, GetDetailedPlayer] = {}
 
-        all_player_info = {
-            p["iD"]: p
-            for p in super().get_all_player_info()
-        }
+        all_player_info = {p["iD"]: p for p in all_player_info}
 
         for player in players:
             player_id = player[PLAYER_ID]
@@ -322,71 +337,16 @@ class Rcon(ServerCtl):
             "fail_count": fail_count,
         }
 
-    @ttl_cache(ttl=2, cache_falsy=False)
+    @ttl_cache(ttl=2, stale_ttl=2, cache_falsy=False, codec=COMPRESSED_PICKLE)
     def get_team_view(self):
-        teams = {}
-        detailed_players = self.get_detailed_players()
-        players_by_id = detailed_players["players"]
-        fail_count = detailed_players["fail_count"]
-
-        for player in players_by_id.values():
-            team_name = player.get("team") if player.get("team") is not None else UNASSIGNED
-            team = teams.setdefault(team_name, {})
-            squad = team.setdefault(player.get("unit_name"), {})
-            squad_players = squad.setdefault("players", [])
-            squad_players.append(player)
-
-        for team, squads in teams.items():
-            for squad_name, squad in squads.items():
-                squad["players"] = sorted(
-                    squad["players"],
-                    key=lambda player: (
-                        ALL_ROLES_KEY_INDEX_MAP.get(player.get("role"), len(ALL_ROLES)),
-                        player.get(PLAYER_ID),
-                    ),
-                )
-                squad["type"] = self._guess_squad_type(squad)
-                squad["has_leader"] = self._has_leader(squad)
-
-                try:
-                    squad["combat"] = sum(p["combat"] for p in squad["players"])
-                    squad["offense"] = sum(p["offense"] for p in squad["players"])
-                    squad["defense"] = sum(p["defense"] for p in squad["players"])
-                    squad["support"] = sum(p["support"] for p in squad["players"])
-                    squad["kills"] = sum(p["kills"] for p in squad["players"])
-                    squad["deaths"] = sum(p["deaths"] for p in squad["players"])
-                except Exception as e:
-                    logger.exception(e)
-
-        game = {}
-        for team, squads in teams.items():
-            commander = [
-                squad for _, squad in squads.items() if squad["type"] == "commander"
-            ]
-            if not commander:
-                commander = None
-            else:
-                commander = (
-                    commander[0]["players"][0] if commander[0].get("players") else None
-                )
-
-            game[team] = {
-                "squads": {
-                    squad_name: squad
-                    for squad_name, squad in squads.items()
-                    if squad["type"] != "commander"
-                },
-                "commander": commander,
-                "combat": sum(s["combat"] for s in squads.values()),
-                "offense": sum(s["offense"] for s in squads.values()),
-                "defense": sum(s["defense"] for s in squads.values()),
-                "support": sum(s["support"] for s in squads.values()),
-                "kills": sum(s["kills"] for s in squads.values()),
-                "deaths": sum(s["deaths"] for s in squads.values()),
-                "count": sum(len(s["players"]) for s in squads.values()),
-            }
+        """The view published by the team_view loop, or built here if it isn't running"""
+        if (view := get_published_team_view()) is not None:
+            return view
 
-        return dict(fail_count=fail_count, **game)
+        detailed_players = self.get_detailed_players()
+        return build_team_view(
+            detailed_players["players"].values(), detailed_players["fail_count"]
+        )
 
     @ttl_cache(ttl=1)
     def get_structured_logs(
@@ -403,7 +363,7 @@ class Rcon(ServerCtl):
         return super().get_admin_groups()
 
     def get_logs(
-            self, since_min_ago: int, filter_: str = "", by: str = ""
+            self, since_min_ago: int | float, filter_: str = "", by: str = ""
     ) -> list[str]:
         """Returns raw text logs from the game server with no parsing performed
 
@@ -442,23 +402,10 @@ class Rcon(ServerCtl):
     def _guess_squad_type(
             self, squad
     ) -> Literal["armor", "recon", "commander", "infantry", "artillery"]:
-        for player in squad.get("players", []):
-            if player.get("role") in ["tankcommander", "crewman"]:
-                return "armor"
-            if player.get("role") in ["spotter", "sniper"]:
-                return "recon"
-            if player.get("role") in ["armycommander"]:
-                return "commander"
-            if player.get("role") in ["artilleryobserver", "operator", "gunner"]:
-                return "artillery"
-
-        return "infantry"
+        return guess_squad_type(squad)
 
     def _has_leader(self, squad) -> bool:
-        for players in squad.get("players", []):
-            if players.get("role") in ["tankcommander", "officer", "spotter", "artilleryobserver"]:
-                return True
-        return False
+        return has_leader(squad)
 
     @ttl_cache(ttl=60 * 60 * 24, cache_falsy=False)
     def get_player_info(self, player_id: str, can_fail=False):
@@ -501,6 +448,43 @@ class Rcon(ServerCtl):
             raise HLLCommandFailedError("Player is not online")
         return self._get_detailed_player_info(player_info, player)
 
+    def get_players_info_batch(
+        self, player_ids: Iterable[str]
+    ) -> dict[str, GetDetailedPlayer | None]:
+        """Detailed info for many players at once, sharing the cache of `get_detailed_player_info`
+
+        Cached players are read in a single MGET, the others are requested from
+        the game server together and written back in a single Redis pipeline.
+        Players that aren't online map to None.
+        """
+        player_ids = list(dict.fromkeys(player_ids))
+        cache = getattr(Rcon.get_detailed_player_info, "cache", None)
+        found: dict[str, GetDetailedPlayer] = {}
+        if cache is not None:
+            cached = cache.get_many([(player_id,) for player_id in player_ids])
+            found = {p: v for p, v in zip(player_ids, cached) if v is not None}
+
+        missing = [p for p in player_ids if p not in found]
+        if missing:
+            vip_player_ids = set(v[PLAYER_ID] for v in super().get_vip_ids())
+            profiles = {p[PLAYER_ID]: p for p in get_profiles(missing)}
+            fetched: dict[str, GetDetailedPlayer] = {}
+            for player_id, player_info in super().get_players_info_batch(missing).items():
+                if not player_info:
+                    continue
+                fetched[player_id] = self._get_detailed_player_info(
+                    player_info,
+                    {  # type: ignore
+                        "is_vip": player_id in vip_player_ids,
+                        "profile": profiles.get(player_id),
+                    },
+                )
+            if cache is not None:
+                cache.set_many([((p,), v) for p, v in fetched.items()])
+            found.update(fetched)
+
+        return {player_id: found.get(player_id) for player_id in player_ids}
+
     def _get_detailed_player_info(self, player_info: PlayerInfoType, player: GetPlayersType | None = None) -> GetDetailedPlayer:
         player_data = parse_raw_player_info(player_info)
         if player is not None and 'is_vip' in player:
@@ -517,7 +501,7 @@ class Rcon(ServerCtl):
 
         return player_data
 
-    @ttl_cache(ttl=60 * 10)
+    @ttl_cache(ttl=60 * 10, l1_ttl=30)
     def get_admin_ids(self) -> list[AdminType]:
         return super().get_admin_ids()
 
@@ -573,7 +557,7 @@ class Rcon(ServerCtl):
         bans = self.get_bans()
         return list(filter(lambda x: x.get(PLAYER_ID) == player_id, bans))
 
-    @ttl_cache(ttl=60 * 5)
+    @ttl_cache(ttl=60 * 5, l1_ttl=30)
     def get_vip_ids(self) -> list[VipIdType]:
         res: list[VipId] = super().get_vip_ids()
         player_dicts = []
@@ -827,7 +811,7 @@ class Rcon(ServerCtl):
         ):
             return super().set_map_shuffle_enabled(enabled)
 
-    @ttl_cache(ttl=60 * 30)
+    @ttl_cache(ttl=60 * 30, l1_ttl=60)
     def get_name(self) -> str:
         name = super().get_name()
         if len(name) > self.MAX_SERV_NAME_LEN:
@@ -968,7 +952,7 @@ class Rcon(ServerCtl):
             "server_number": int(get_server_number()),
         }
 
-    @ttl_cache(ttl=60 * 60 * 24)
+    @ttl_cache(ttl=60 * 60 * 24, l1_ttl=60)
     def get_maps(self) -> list[Layer]:
         return [parse_layer(m) for m in super().get_maps()]
 
@@ -1371,161 +1355,12 @@ class Rcon(ServerCtl):
     @staticmethod
     def parse_log_line(raw_line: str) -> StructuredLogLineType:
         """Parse a single raw RCON log event or raise a ValueError"""
-
-        player: str | None = None
-        player2: str | None = None
-        player_id_1: str | None = None
-        player_id_2: str | None = None
-        weapon: str | None = None
-        action: str | None = None
-        content: str = raw_line
-        sub_content: str | None = None
-
-        if raw_line.startswith("KILL") or raw_line.startswith("TEAM KILL"):
-            # KILL: Muctar(Axis/71234567891234567) -> Chris(Allies/71234567891234576) with GEWEHR 43
-            # TEAM KILL: SonofJack(Allies/71234567891234567) -> Joseph Cannon(Allies/71234567891234576) with M1 GARAND
-            action, content = raw_line.split(": ", 1)
-            if match := re.match(Rcon.kill_teamkill_pattern, content):
-                player, player_id_1, player2, player_id_2, weapon = match.groups()
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
-        elif raw_line.startswith("DISCONNECTED") or raw_line.startswith("CONNECTED"):
-            action, name_and_player_id = raw_line.split(" ", 1)
-            if match := re.match(Rcon.connect_disconnect_pattern, name_and_player_id):
-                player, player_id_1 = match.groups()
-                content = name_and_player_id
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
-        elif raw_line.startswith("CHAT"):
-            # CHAT[Team][Azure(Allies/71234567891234567)]: supply truck bot hq for nodes
-            # CHAT[Unit][dominguez1987(Axis/71234567891234567)]: back
-            if match := Rcon.chat_regexp.match(raw_line):
-                scope, player, side, player_id_1, sub_content = match.groups()
-                action = f"CHAT[{side}][{scope}]"
-                content = f"{player}: {sub_content} ({player_id_1})"
-        elif raw_line.upper().startswith("TEAMSWITCH"):
-            # TEAMSWITCH Plebs_23 (Axis > None)
-            # TEAMSWITCH SupremeOneechan (None > Allies)
-            action = "TEAMSWITCH"
-            if match := re.match(Rcon.teamswitch_pattern, raw_line):
-                player, sub_content = match.groups()
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
-        elif raw_line.startswith("KICK") or raw_line.startswith("BAN"):
-            if match := re.match(Rcon.kick_ban_pattern, raw_line):
-                _action, player, sub_content, type_ = match.groups()
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
-
-            if type_ == "PERMANENTLY":
-                type_ = "PERMA BANNED"
-            elif type_ == "YOU":
-                type_ = "IDLE"
-            elif type_ == "Host":
-                type_ = ""
-            elif type_ == "Anti-Cheat":
-                type_ = "ANTI-CHEAT"
-            elif type_ == "KICKED":
-                type_ = "KICKED"
-            elif type_ == "BANNED":
-                type_ = "BANNED"
-            else:
-                type_ = "MISC"
-
-            action = f"ADMIN {type_}".strip()
-
-            if "FOR TEAM KILLING" in raw_line:
-                action = f"TK AUTO {type_}"
-
-            # Reconstruct the log line without the newlines and tack on the trailing ] we lose
-            content = f"{_action}: [{player}] {sub_content}"
-            if content[-1] != "]":
-                content += "]"
-                sub_content = sub_content + "]" if sub_content else ""
-        elif raw_line.startswith("VOTE"):
-            action = "VOTE"
-
-            _, sub_content = raw_line.split("VOTESYS: ", 1)
-            content = sub_content
-
-            # VOTESYS: Player [Dingbat252] voted [PV_Favour] for VoteID[2]
-            if match := re.match(Rcon.vote_pattern, raw_line):
-                player = match.groups()[0]
-            # VOTESYS: Player [NoodleArms] Started a vote of type (PVR_Kick_Abuse) against [buscÃ´O-sensei]. VoteID: [2]
-            elif match := re.match(
-                    Rcon.vote_started_pattern,
-                    raw_line,
-            ):
-                action = "VOTE STARTED"
-                player, player2 = match.groups()
-            # VOTESYS: Vote [2] completed. Result: PVR_Passed
-            elif match := re.match(Rcon.vote_complete_pattern, raw_line):
-                action = "VOTE COMPLETED"
-            # VOTESYS: Vote [1] expired before completion.
-            elif match := re.match(Rcon.vote_expired_pattern, raw_line):
-                action = "VOTE EXPIRED"
-            # VOTESYS: Vote Kick {buscÃ´O-sensei} successfully passed. [For: 2/1 - Against: 0]
-            elif match := re.match(Rcon.vote_passed_pattern, raw_line):
-                action = "VOTE PASSED"
-                content, player, sub_content = match.groups()
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
-
-        elif raw_line.upper().startswith("PLAYER"):
-            # Player [Fachi (71234567891234567)] Entered Admin Camera
-            action = "CAMERA"
-            _, content = raw_line.split(" ", 1)
-
-            if match := re.match(Rcon.camera_pattern, content):
-                player, player_id_1, sub_content = match.groups()
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
-
-        elif raw_line.upper().startswith("MATCH START"):
-            # MATCH START UTAH BEACH WARFARE
-            action = "MATCH START"
-            _, sub_content = raw_line.split("MATCH START ")
-            content = raw_line
-        elif raw_line.upper().startswith("MATCH ENDED"):
-            # MATCH ENDED `Kharkov WARFARE` ALLIED (0 - 5) AXIS
-            action = "MATCH ENDED"
-            _, sub_content = raw_line.split("MATCH ENDED ")
-        elif raw_line.upper().startswith("MESSAGE"):
-            action = "MESSAGE"
-            raw_line = raw_line.replace("\n", " ")
-            content = raw_line
-            if match := re.match(Rcon.message_pattern, raw_line):
-                player, player_id_1, message_content = match.groups()
-                content = f"{player}({player_id_1}): {message_content}"
-                sub_content = message_content
-            else:
-                raise ValueError(f"Unable to parse line: {raw_line}")
-
-        if action is None:
-            raise ValueError(f"Unknown type line: '{raw_line}'")
-
-        return {
-            "action": action,
-            "player_name_1": player,
-            "player_id_1": player_id_1,
-            "player_name_2": player2,
-            "player_id_2": player_id_2,
-            "weapon": weapon,
-            "message": content,
-            "sub_content": sub_content,
-        }
+        return log_parser.parse_log_line(raw_line)._asdict()  # type: ignore
 
     @staticmethod
     def split_raw_log_lines(raw_logs: list[str]) -> Iterable[tuple[str, str, str]]:
         """Split raw game server logs into the relative time, timestamp and content"""
-        for raw_log in raw_logs:
-            log = re.match(r"^(\[.+? \((\d+)\)\]) ([\w\W]*)$", raw_log, flags=re.M)
-            if log is None:
-                logger.error(f"Unable to parse log line: '{raw_log}'")
-                continue
-
-            (raw_relative_time, raw_timestamp, raw_log_line) = log.groups()
-            yield raw_relative_time, raw_timestamp, raw_log_line.strip()
+        return log_parser.split_raw_log_lines(raw_logs)
 
     @staticmethod
     def parse_logs(
@@ -1540,50 +1375,51 @@ class Rcon(ServerCtl):
         actions: set[str] = set()
         players: set[str] = set()
 
-        for raw_relative_time, raw_timestamp, raw_log_line in Rcon.split_raw_log_lines(
+        parse_log_line = log_parser.parse_log_line
+        for raw_relative_time, raw_timestamp, raw_log_line in log_parser.split_raw_log_lines(
                 raw_logs
         ):
             time = Rcon._extract_time(raw_timestamp)
             try:
-                log_line = Rcon.parse_log_line(raw_log_line)
-
-                if filter_action and not log_line["action"].startswith(filter_action):
-                    continue
-
-                if filter_player and filter_player not in raw_log_line:
-                    continue
-
-                parsed_log_lines.append(
-                    {
-                        "version": 1,
-                        "timestamp_ms": int(time.timestamp() * 1000),
-                        "event_time": datetime.fromtimestamp(int(raw_timestamp)),
-                        "relative_time_ms": (time - now).total_seconds() * 1000,
-                        "raw": raw_relative_time + " " + raw_log_line,
-                        "line_without_time": raw_log_line,
-                        "action": log_line["action"],
-                        "player_name_1": log_line["player_name_1"],
-                        "player_id_1": log_line["player_id_1"],
-                        "player_name_2": log_line["player_name_2"],
-                        "player_id_2": log_line["player_id_2"],
-                        "weapon": log_line["weapon"],
-                        "message": log_line["message"],
-                        "sub_content": log_line["sub_content"],
-                    }
-                )
+                log_line = parse_log_line(raw_log_line)
             except ValueError:
                 logger.error(
                     f"Unable to parse line: '{raw_relative_time} {raw_timestamp} {raw_log_line}'"
                 )
                 continue
 
-            if player := log_line["player_name_1"]:
+            if filter_action and not log_line.action.startswith(filter_action):
+                continue
+
+            if filter_player and filter_player not in raw_log_line:
+                continue
+
+            parsed_log_lines.append(
+                {
+                    "version": 1,
+                    "timestamp_ms": int(time.timestamp() * 1000),
+                    "event_time": datetime.fromtimestamp(int(raw_timestamp)),
+                    "relative_time_ms": (time - now).total_seconds() * 1000,
+                    "raw": raw_relative_time + " " + raw_log_line,
+                    "line_without_time": raw_log_line,
+                    "action": log_line.action,
+                    "player_name_1": log_line.player_name_1,
+                    "player_id_1": log_line.player_id_1,
+                    "player_name_2": log_line.player_name_2,
+                    "player_id_2": log_line.player_id_2,
+                    "weapon": log_line.weapon,
+                    "message": log_line.message,
+                    "sub_content": log_line.sub_content,
+                }
+            )
+
+            if player := log_line.player_name_1:
                 players.add(player)
 
-            if player2 := log_line["player_name_2"]:
+            if player2 := log_line.player_name_2:
                 players.add(player2)
 
-            actions.add(log_line["action"])
+            actions.add(log_line.action)
 
         parsed_log_lines.reverse()
 
@@ -315,6 +315,22 @@ def auto_disband_empty_squads(rcon: Rcon):
         logger.error(f"[EMPTY SQUAD] Exception type: {type(e).__name__}, message: {str(e)}")
 
 
+def dump_rcon_performance_stats():
+    """Log the RCON performance statistics of the last interval and start a new one"""
+    perf_stats = PerformanceStatistics("rcon", enabled=True)
+    latencies = perf_stats.latency_percentiles(reset=True)
+    logger.info("RCON performance statistics: %s", perf_stats.dump())
+    for command, stats in latencies.items():
+        logger.info(
+            "RCON %s: %s calls, p50 %.1fms, p95 %.1fms, p99 %.1fms",
+            command,
+            stats["count"],
+            stats["p50_ms"],
+            stats["p95_ms"],
+            stats["p99_ms"],
+        )
+
+
 def run():
     max_fails = 5
     rcon = get_rcon()
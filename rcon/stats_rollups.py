@@ -0,0 +1,109 @@
+"""Pre-summed player_stats for the leaderboards
+
+player_stats_rollup holds the totals of each player over all their matches
+and player_stats_rollup_bucket their totals per map and day, so rankings can
+be read without aggregating the whole player_stats table.
+
+record_stats_from_map adds the rows of the matches it records to the rollups
+in the same transaction. Rows it overwrites can't be subtracted (the
+greatest level, streak... may have come from them), the rollups of those
+players are rebuilt from player_stats instead.
+"""
+
+import logging
+from typing import Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Column of the rollups -> how it's aggregated from player_stats ps
+_SUMMED = {
+    "matches": "COUNT(*)",
+    "kills": "COALESCE(SUM(ps.kills), 0)",
+    "deaths": "COALESCE(SUM(ps.deaths), 0)",
+    "teamkills": "COALESCE(SUM(ps.teamkills), 0)",
+    "deaths_by_tk": "COALESCE(SUM(ps.deaths_by_tk), 0)",
+    "time_seconds": "COALESCE(SUM(ps.time_seconds), 0)",
+    "combat": "COALESCE(SUM(ps.combat), 0)",
+    "offense": "COALESCE(SUM(ps.offense), 0)",
+    "defense": "COALESCE(SUM(ps.defense), 0)",
+    "support": "COALESCE(SUM(ps.support), 0)",
+    "kills_per_minute_sum": "COALESCE(SUM(ps.kills_per_minute), 0)",
+    "kills_per_minute_count": "COUNT(ps.kills_per_minute)",
+}
+_GREATEST = {
+    "name": "MAX(ps.name)",
+    "level": "MAX(ps.level)",
+    "kills_streak": "MAX(ps.kills_streak)",
+    "longest_life_secs": "MAX(ps.longest_life_secs)",
+}
+
+# Table -> its key columns and how they are selected
+_ROLLUPS = {
+    "player_stats_rollup": {
+        "playersteamid_id": "ps.playersteamid_id",
+    },
+    "player_stats_rollup_bucket": {
+        "playersteamid_id": "ps.playersteamid_id",
+        "map_name": "m.map_name",
+        "day": "CAST(m.start AS DATE)",
+    },
+}
+
+
+def _insert_select(table: str, where: str, on_conflict: str = "") -> str:
+    keys = _ROLLUPS[table]
+    aggregates = {**_SUMMED, **_GREATEST}
+    return f"""
+        INSERT INTO {table} AS r ({", ".join([*keys, *aggregates])})
+        SELECT {", ".join([*keys.values(), *aggregates.values()])}
+        FROM player_stats ps
+        JOIN map_history m ON m.id = ps.map_id
+        WHERE {where}
+        GROUP BY {", ".join(keys.values())}
+        {on_conflict}
+    """
+
+
+def _add_sql(table: str) -> str:
+    updates = [f"{c} = r.{c} + excluded.{c}" for c in _SUMMED]
+    updates += [f"{c} = GREATEST(r.{c}, excluded.{c})" for c in _GREATEST]
+    return _insert_select(
+        table,
+        "ps.map_id = :map_id AND ps.playersteamid_id = ANY(:player_ids)",
+        f"ON CONFLICT ({', '.join(_ROLLUPS[table])}) DO UPDATE SET {', '.join(updates)}",
+    )
+
+
+def add_match_to_rollups(sess: Session, map_id: int, player_ids: Sequence[int]):
+    """Add the player_stats rows of a match to the rollups, they must not be in them yet
+
+    player_ids are the steam_id_64.id of the players whose rows were just inserted.
+    """
+    if not player_ids:
+        return
+    params = {"map_id": map_id, "player_ids": list(player_ids)}
+    for table in _ROLLUPS:
+        sess.execute(text(_add_sql(table)), params)
+
+
+def rebuild_rollups(sess: Session, player_ids: Sequence[int] | None = None):
+    """Recompute the rollups of some players, or of everyone, from player_stats"""
+    if player_ids is not None and not player_ids:
+        return
+    for table in _ROLLUPS:
+        if player_ids is None:
+            sess.execute(text(f"DELETE FROM {table}"))
+            sess.execute(text(_insert_select(table, "TRUE")))
+        else:
+            params = {"player_ids": list(player_ids)}
+            sess.execute(
+                text(f"DELETE FROM {table} WHERE playersteamid_id = ANY(:player_ids)"),
+                params,
+            )
+            sess.execute(
+                text(_insert_select(table, "ps.playersteamid_id = ANY(:player_ids)")),
+                params,
+            )
@@ -0,0 +1,384 @@
+"""The team view (teams, their squads and players) materialized in redis
+
+A single producer (the team_view loop) polls the players, builds the view
+and publishes it as a versioned snapshot, so the automods, routines,
+custom tools and the web UI read it instead of each building it on their own
+cache misses.
+
+The version only moves when a squad or team actually changed, ignoring the
+fields that change all the time (positions and play times). Each new version
+also records a diff with the changed squads and teams, consumers that already
+hold a version can then fetch only the diffs since with get_team_view_changes
+and apply them with apply_team_view_diff.
+"""
+
+import logging
+import time
+from typing import Any, Iterable, Literal
+
+from rcon.cache_utils import get_redis_client
+from rcon.codecs import COMPRESSED_PICKLE
+from rcon.types import (
+    GetDetailedPlayer,
+    GetPlayersType,
+    TeamViewChangesType,
+    TeamViewDiffType,
+)
+from rcon.utils import ALL_ROLES, ALL_ROLES_KEY_INDEX_MAP
+
+logger = logging.getLogger(__name__)
+
+PLAYER_ID = "player_id"
+UNASSIGNED = "unassigned"
+
+TEAM_VIEW_SNAPSHOT_KEY = "team_view:snapshot"
+TEAM_VIEW_DIFFS_KEY = "team_view:diffs"
+
+TEAM_VIEW_REFRESH_SECONDS = 2
+# How often the producer refetches the names, profiles, VIP status and steam
+# info of everyone online, arrivals are fetched as soon as they show up
+TEAM_VIEW_PLAYERS_REFRESH_SECONDS = 30
+# Past that age the producer is assumed to be down and readers build the view themselves
+TEAM_VIEW_MAX_AGE_SECONDS = 10
+TEAM_VIEW_MAX_DIFFS = 100
+
+SQUAD_STATS = ("combat", "offense", "defense", "support", "kills", "deaths")
+# Not worth a new version on their own, they are still refreshed in the snapshot
+VOLATILE_PLAYER_FIELDS = ("world_position", "map_playtime_seconds")
+VOLATILE_PROFILE_FIELDS = ("current_playtime_seconds",)
+
+
+def guess_squad_type(
+    squad,
+) -> Literal["armor", "recon", "commander", "infantry", "artillery"]:
+    for player in squad.get("players", []):
+        if player.get("role") in ["tankcommander", "crewman"]:
+            return "armor"
+        if player.get("role") in ["spotter", "sniper"]:
+            return "recon"
+        if player.get("role") in ["armycommander"]:
+            return "commander"
+        if player.get("role") in ["artilleryobserver", "operator", "gunner"]:
+            return "artillery"
+
+    return "infantry"
+
+
+def has_leader(squad) -> bool:
+    for players in squad.get("players", []):
+        if players.get("role") in [
+            "tankcommander",
+            "officer",
+            "spotter",
+            "artilleryobserver",
+        ]:
+            return True
+    return False
+
+
+def build_squad(players: list[GetDetailedPlayer]) -> dict[str, Any]:
+    squad: dict[str, Any] = {
+        "players": sorted(
+            players,
+            key=lambda player: (
+                ALL_ROLES_KEY_INDEX_MAP.get(player.get("role"), len(ALL_ROLES)),
+                player.get(PLAYER_ID),
+            ),
+        )
+    }
+    squad["type"] = guess_squad_type(squad)
+    squad["has_leader"] = has_leader(squad)
+
+    try:
+        for stat in SQUAD_STATS:
+            squad[stat] = sum(p[stat] for p in squad["players"])
+    except Exception as e:
+        logger.exception(e)
+    return squad
+
+
+def build_team(squads: dict[str, dict[str, Any]]) -> dict[str, Any]:
+    commander = [squad for squad in squads.values() if squad["type"] == "commander"]
+    if not commander:
+        commander = None
+    else:
+        commander = commander[0]["players"][0] if commander[0].get("players") else None
+
+    team: dict[str, Any] = {
+        "squads": {
+            squad_name: squad
+            for squad_name, squad in squads.items()
+            if squad["type"] != "commander"
+        },
+        "commander": commander,
+    }
+    for stat in SQUAD_STATS:
+        team[stat] = sum(s[stat] for s in squads.values())
+    team["count"] = sum(len(s["players"]) for s in squads.values())
+    return team
+
+
+def build_team_view(
+    players: Iterable[GetDetailedPlayer], fail_count: int = 0
+) -> dict[str, Any]:
+    """The teams of the players with their squads, commander and summed stats"""
+    teams: dict[str, dict[str, list[GetDetailedPlayer]]] = {}
+    for player in players:
+        team_name = player.get("team") if player.get("team") is not None else UNASSIGNED
+        team = teams.setdefault(team_name, {})
+        team.setdefault(player.get("unit_name"), []).append(player)
+
+    game = {
+        team_name: build_team(
+            {
+                squad_name: build_squad(squad_players)
+                for squad_name, squad_players in squads.items()
+            }
+        )
+        for team_name, squads in teams.items()
+    }
+    return dict(fail_count=fail_count, **game)
+
+
+def _stable_player(player: GetDetailedPlayer | None):
+    if player is None:
+        return None
+    stable = {k: v for k, v in player.items() if k not in VOLATILE_PLAYER_FIELDS}
+    if stable.get("profile"):
+        stable["profile"] = {
+            k: v
+            for k, v in stable["profile"].items()
+            if k not in VOLATILE_PROFILE_FIELDS
+        }
+    return stable
+
+
+def _stable_squad(squad: dict[str, Any]):
+    return {
+        **squad,
+        "players": [_stable_player(p) for p in squad["players"]],
+    }
+
+
+def _teams(view: dict[str, Any]) -> dict[str, dict[str, Any]]:
+    return {k: v for k, v in view.items() if k != "fail_count"}
+
+
+def diff_team_views(
+    previous: dict[str, Any] | None, current: dict[str, Any]
+) -> TeamViewDiffType | None:
+    """The squads and teams that changed between two views, None if nothing did
+
+    A changed team carries all its fields but only its changed squads.
+    """
+    previous_teams = _teams(previous or {})
+    teams: dict[str, dict[str, Any]] = {}
+    for team_name, team in _teams(current).items():
+        previous_team = previous_teams.get(team_name) or {"squads": {}}
+        previous_squads = previous_team["squads"]
+        squads = {
+            name: squad
+            for name, squad in team["squads"].items()
+            if name not in previous_squads
+            or _stable_squad(previous_squads[name]) != _stable_squad(squad)
+        }
+        removed_squads = [
+            name for name in previous_squads if name not in team["squads"]
+        ]
+        fields = {k: v for k, v in team.items() if k != "squads"}
+        previous_fields = {k: v for k, v in previous_team.items() if k != "squads"}
+        commander_changed = _stable_player(fields.get("commander")) != _stable_player(
+            previous_fields.get("commander")
+        )
+        fields.pop("commander")
+        previous_fields.pop("commander", None)
+        if squads or removed_squads or commander_changed or fields != previous_fields:
+            teams[team_name] = {
+                **team,
+                "squads": squads,
+                "removed_squads": removed_squads,
+            }
+
+    removed_teams = [name for name in previous_teams if name not in current]
+    fail_count = current.get("fail_count", 0)
+    if (
+        not teams
+        and not removed_teams
+        and previous is not None
+        and fail_count == previous.get("fail_count")
+    ):
+        return None
+    return {
+        "version": 0,
+        "fail_count": fail_count,
+        "teams": teams,
+        "removed_teams": removed_teams,
+    }
+
+
+def apply_team_view_diff(
+    view: dict[str, Any], diff: TeamViewDiffType
+) -> dict[str, Any]:
+    """Update a view in place with a diff of get_team_view_changes"""
+    view["fail_count"] = diff["fail_count"]
+    for team_name in diff["removed_teams"]:
+        view.pop(team_name, None)
+    for team_name, changes in diff["teams"].items():
+        team = view.setdefault(team_name, {"squads": {}})
+        squads = team["squads"]
+        team.update(
+            {k: v for k, v in changes.items() if k not in ("squads", "removed_squads")}
+        )
+        for squad_name in changes["removed_squads"]:
+            squads.pop(squad_name, None)
+        squads.update(changes["squads"])
+    return view
+
+
+def _load_snapshot(red) -> dict[str, Any] | None:
+    raw = red.get(TEAM_VIEW_SNAPSHOT_KEY)
+    if raw is None:
+        return None
+    return COMPRESSED_PICKLE.loads(raw)
+
+
+def get_published_team_view(
+    max_age_seconds: float = TEAM_VIEW_MAX_AGE_SECONDS,
+) -> dict[str, Any] | None:
+    """The latest view published by the producer, None if there's none that recent"""
+    try:
+        snapshot = _load_snapshot(get_redis_client(decode_responses=False))
+    except Exception:
+        logger.exception("Unable to read the published team view")
+        return None
+    if snapshot is None or time.time() - snapshot["published_at"] > max_age_seconds:
+        return None
+    return snapshot["view"]
+
+
+def get_team_view_changes(since_version: int | None = None) -> TeamViewChangesType:
+    """What changed in the team view since a version
+
+    Returns the diffs of the versions after since_version, newest last, or
+    the whole view when since_version is missing or too old for the diffs
+    that are kept.
+    """
+    red = get_redis_client(decode_responses=False)
+    snapshot = _load_snapshot(red)
+    if snapshot is None:
+        return {"version": 0, "published_at": None, "view": None, "diffs": []}
+
+    version = snapshot["version"]
+    res: TeamViewChangesType = {
+        "version": version,
+        "published_at": snapshot["published_at"],
+        "view": None,
+        "diffs": [],
+    }
+    if since_version is not None and 0 <= version - since_version:
+        diffs = [
+            COMPRESSED_PICKLE.loads(d)
+            for d in red.zrangebyscore(
+                TEAM_VIEW_DIFFS_KEY, f"({since_version}", version
+            )
+        ]
+        if len(diffs) == version - since_version:
+            res["diffs"] = diffs
+            return res
+
+    res["view"] = snapshot["view"]
+    return res
+
+
+class TeamViewMaterializer:
+    """Builds and publishes the team view, there must be a single one running
+
+    Each refresh is a single get_all_player_info poll: what rarely changes
+    (names, profiles, VIP status and steam info) is kept per player and only
+    fetched for the players that joined since the last poll, everyone's is
+    refetched every players_refresh_seconds.
+    """
+
+    def __init__(
+        self,
+        rcon,
+        refresh_seconds: float = TEAM_VIEW_REFRESH_SECONDS,
+        players_refresh_seconds: float = TEAM_VIEW_PLAYERS_REFRESH_SECONDS,
+    ):
+        self.rcon = rcon
+        self.refresh_seconds = refresh_seconds
+        self.players_refresh_seconds = players_refresh_seconds
+        self.players: dict[str, GetPlayersType] = {}
+        self.players_fetched_at: float | None = None
+        self.red = get_redis_client(decode_responses=False)
+        # Carry on from what the last run published
+        snapshot = _load_snapshot(self.red)
+        if snapshot is None:
+            # Versions start over, older diffs would be mistaken for new ones
+            self.red.delete(TEAM_VIEW_DIFFS_KEY)
+        self.version: int = snapshot["version"] if snapshot else 0
+        self.view: dict[str, Any] | None = snapshot["view"] if snapshot else None
+
+    def _update_players(self, online: dict[str, str]):
+        """Keep the players of `online` (IDs to names), fetching the missing ones"""
+        now = time.monotonic()
+        if (
+            self.players_fetched_at is None
+            or now - self.players_fetched_at >= self.players_refresh_seconds
+        ):
+            self.players = self.rcon.get_players_by_id(online)
+            self.players_fetched_at = now
+            return
+
+        self.players = {
+            player_id: player
+            for player_id, player in self.players.items()
+            if player_id in online
+        }
+        arrivals = {
+            player_id: name
+            for player_id, name in online.items()
+            if player_id not in self.players
+        }
+        if arrivals:
+            self.players.update(self.rcon.get_players_by_id(arrivals))
+
+    def refresh(self) -> TeamViewDiffType | None:
+        """Publish the current view, returns its diff if it made a new version"""
+        all_player_info = self.rcon.get_all_player_info()
+        self._update_players({p["iD"]: p["name"] for p in all_player_info})
+        detailed_players = self.rcon.detail_players(
+            self.players.values(), all_player_info
+        )
+        view = build_team_view(
+            detailed_players["players"].values(), detailed_players["fail_count"]
+        )
+        diff = diff_team_views(self.view, view)
+
+        pipe = self.red.pipeline(transaction=True)
+        if diff is not None:
+            self.version += 1
+            diff["version"] = self.version
+            pipe.zadd(
+                TEAM_VIEW_DIFFS_KEY, {COMPRESSED_PICKLE.dumps(diff): self.version}
+            )
+            pipe.zremrangebyrank(TEAM_VIEW_DIFFS_KEY, 0, -TEAM_VIEW_MAX_DIFFS - 1)
+        pipe.set(
+            TEAM_VIEW_SNAPSHOT_KEY,
+            COMPRESSED_PICKLE.dumps(
+                {"version": self.version, "published_at": time.time(), "view": view}
+            ),
+        )
+        pipe.execute()
+        self.view = view
+        return diff
+
+    def run(self):
+        logger.info("Publishing the team view every %ss", self.refresh_seconds)
+        while True:
+            started = time.monotonic()
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Unable to refresh the team view")
+            time.sleep(max(0.0, self.refresh_seconds - (time.monotonic() - started)))
@@ -1,7 +1,7 @@
 import datetime
 import enum
 from dataclasses import dataclass
-from typing import List, Literal, Optional, Sequence
+from typing import Any, List, Literal, Optional, Sequence
 
 # # TODO: On Python 3.11.* specifically, Pydantic requires we use typing_extensions.TypedDict
 # over typing.TypedDict. Once we bump our Python image we can replace this.
@@ -537,6 +537,29 @@ class AdminUserType(TypedDict):
     player_id: str
 
 
+class RconCommandLatencyType(TypedDict):
+    count: int
+    p50_ms: float | None
+    p95_ms: float | None
+    p99_ms: float | None
+
+
+class TeamViewDiffType(TypedDict):
+    version: int
+    fail_count: int
+    # The changed teams with all their fields but only their changed squads and a removed_squads list
+    teams: dict[str, dict[str, Any]]
+    removed_teams: list[str]
+
+
+class TeamViewChangesType(TypedDict):
+    version: int
+    published_at: float | None
+    # Only set when the diffs since the requested version aren't available
+    view: dict[str, Any] | None
+    diffs: list[TeamViewDiffType]
+
+
 class AuditLogType(TypedDict):
     id: int
     username: str
@@ -9,6 +9,8 @@ class RconConnectionSettingsType(TypedDict):
     thread_pool_size: int
     performance_statistics_enabled: bool
     performance_statistics_interval_seconds: int
+    multiplexed_connections_enabled: bool
+    multiplexed_pool_size: int
 
 
 class RconConnectionSettingsUserConfig(BaseUserConfig):
@@ -17,6 +19,8 @@ class RconConnectionSettingsUserConfig(BaseUserConfig):
     thread_pool_size: int = Field(ge=1, le=100, default=20)
     performance_statistics_enabled: bool = Field(default=False)
     performance_statistics_interval_seconds: int = Field(default=30)
+    multiplexed_connections_enabled: bool = Field(default=False)
+    multiplexed_pool_size: int = Field(ge=1, le=10, default=2)
 
     @staticmethod
     def save_to_db(values: RconConnectionSettingsType, dry_run=False):
@@ -30,6 +34,8 @@ class RconConnectionSettingsUserConfig(BaseUserConfig):
             thread_pool_size=values.get("thread_pool_size"),
             performance_statistics_enabled=values.get("performance_statistics_enabled"),
             performance_statistics_interval_seconds=values.get("performance_statistics_interval_seconds"),
+            multiplexed_connections_enabled=values.get("multiplexed_connections_enabled"),
+            multiplexed_pool_size=values.get("multiplexed_pool_size"),
         )
 
         if not dry_run:
@@ -28,6 +28,7 @@ from rcon.user_config.standard_messages import (
     StandardWelcomeMessagesUserConfig,
 )
 from rcon.user_config.steam import SteamUserConfig
+from rcon.user_config.utils import invalidate_user_configs
 from rcon.user_config.vac_game_bans import VacGameBansUserConfig
 from rcon.user_config.vote_map import VoteMapUserConfig
 from rcon.user_config.watch_killrate import WatchKillRateUserConfig
@@ -81,6 +82,8 @@ def seed_default_config():
             VoteMapUserConfig.seed_db(sess)
             WatchKillRateUserConfig.seed_db(sess)
             WatchlistWebhooksUserConfig.seed_db(sess)
+        # Once committed, processes that found them missing load the defaults
+        invalidate_user_configs()
 
     except Exception as e:
         logger.exception("Failed to seed DB")
@@ -1,11 +1,20 @@
 import logging
 import os
+import threading
 from typing import Any, Iterable, Self, Type
 
 import pydantic
+import redis
+from cachetools import TTLCache
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
+from rcon.cache_utils import (
+    get_redis_client,
+    local_caches_active,
+    publish_invalidation,
+    register_local_cache,
+)
 from rcon.models import UserConfig, enter_session
 from rcon.utils import get_server_number
 
@@ -13,6 +22,10 @@ logger = logging.getLogger(__name__)
 
 USER_CONFIG_KEY_FORMAT = "{server}_{cls_name}"
 DISCORD_AUDIT_FORMAT = "changed values: `{differences}`"
+# How long a process can keep using a config changed without it being notified
+USER_CONFIG_CACHE_TTL_SECONDS = 60
+# Cached for the keys that have no row, so they aren't queried on every load
+_MISSING_CONFIG = object()
 
 
 # Sourced without modification from https://stackoverflow.com/a/17246726
@@ -75,6 +88,63 @@ class InvalidKeysConfigurationError(Exception):
         }
 
 
+class UserConfigCache:
+    """The validated user configs of this process by key
+
+    set_user_config notifies every process of the key it changed through the
+    cache invalidation channel, entries also expire after ttl_seconds in case a
+    notification is missed.
+    """
+
+    key_prefix = "user_config"
+
+    def __init__(
+        self, ttl_seconds: int = USER_CONFIG_CACHE_TTL_SECONDS, maxsize: int = 512
+    ) -> None:
+        self.configs: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl_seconds)
+        # Incremented on every invalidation, so a config read from the
+        # database while it was being changed is not cached
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._red: redis.Redis | None = None
+        register_local_cache(self)
+
+    @property
+    def red(self) -> redis.Redis:
+        if self._red is None:
+            self._red = get_redis_client(decode_responses=False)
+        return self._red
+
+    def get(self, key: str) -> "BaseUserConfig | object | None":
+        # Subscribe to the notifications on first use, while they are down
+        # the TTL still bounds how long a changed config is used
+        local_caches_active(self.red)
+        with self._lock:
+            return self.configs.get(key)
+
+    def set(self, key: str, config: "BaseUserConfig | object", generation: int) -> None:
+        with self._lock:
+            if generation == self.generation:
+                self.configs[key] = config
+
+    def l1_clear(self, key: bytes | None = None) -> None:
+        with self._lock:
+            self.generation += 1
+            if key is None:
+                self.configs.clear()
+            else:
+                self.configs.pop(key.decode(), None)
+
+    def invalidate(self, key: str | None = None) -> None:
+        """Drop key, or every key, from the cache of every process"""
+        publish_invalidation(
+            self.red, self.key_prefix, key.encode() if key is not None else None
+        )
+
+
+_USER_CONFIG_CACHE = UserConfigCache()
+
+
 class BaseUserConfig(pydantic.BaseModel):
     """The interface UI config settings should adhere to in addition to pydantic.BaseModel"""
 
@@ -87,17 +157,35 @@ class BaseUserConfig(pydantic.BaseModel):
 
     @classmethod
     def load_from_db(cls, default_on_validation_error: bool = True) -> Self:
+        """The config from the database, cached by the process until it's changed"""
         # This should never happen in production, but allows tests to run
         if not os.getenv("HLL_DB_URL"):
             logger.warning(f"HLL_DB_URL not set, returning a default instance")
             return cls()
 
-        # If the cache is unavailable, it will fall back to creating a default
+        key = cls.KEY()
+        cached = _USER_CONFIG_CACHE.get(key)
+        # Copied so callers changing it, or its lists and dicts, don't change the cached config
+        if isinstance(cached, cls):
+            return cached.model_copy(deep=True)
+        if cached is _MISSING_CONFIG:
+            return cls()
+
+        generation = _USER_CONFIG_CACHE.generation
+        # If the database is unavailable, it will fall back to creating a default
         # model instance, but will not persist it to the database and overwrite settings
-        conf = get_user_config(cls.KEY(), default=None)
+        try:
+            conf = get_user_config(key, default=None, raise_errors=True)
+        except SQLAlchemyError as e:
+            # Not cached, the next load queries again
+            logger.error(f"Unable to load {cls.KEY()}, returning defaults: {e}")
+            return cls()
+
         if conf is not None:
             try:
-                return cls.model_validate(conf)
+                config = cls.model_validate(conf)
+                _USER_CONFIG_CACHE.set(key, config, generation)
+                return config.model_copy(deep=True)
             except pydantic.ValidationError as e:
                 if default_on_validation_error:
                     logger.error(
@@ -119,6 +207,7 @@ class BaseUserConfig(pydantic.BaseModel):
             # during backend startup, or if the `save_to_db` method is explicitly called, for
             # instance through the API, or CLI
             logger.error(f"{cls.KEY()} not found, returning defaults")
+            _USER_CONFIG_CACHE.set(key, _MISSING_CONFIG, generation)
 
         return cls()
 
@@ -131,23 +220,36 @@ class BaseUserConfig(pydantic.BaseModel):
         _set_default(sess, key=cls.KEY(), val=cls())
 
 
-def _get_conf(sess, key):
+def _get_conf(sess, key, raise_errors: bool = False):
     try:
         return sess.query(UserConfig).filter(UserConfig.key == key).one_or_none()
     except SQLAlchemyError as e:
         # Don't let a failed transaction block model creation
         # the session context manager will handle this
         sess.rollback()
+        if raise_errors:
+            raise
         return None
 
 
-def get_user_config(key: str, default=None) -> dict[str, Any] | Any | None:
+def get_user_config(
+    key: str, default=None, raise_errors: bool = False
+) -> dict[str, Any] | Any | None:
+    """The value of a user config, or default when it has no row
+
+    A failed query also returns default unless raise_errors is set, in which
+    case its SQLAlchemyError is raised.
+    """
     # logger.debug("Getting user config for %s", key)
     with enter_session() as sess:
-        res = _get_conf(sess, key)
+        res = _get_conf(sess, key, raise_errors=raise_errors)
         res = res.value if res else default
         # logger.debug("User config for %s is %s", key, res)
         return res
+    # Only reached when enter_session swallowed the error of the query
+    if raise_errors:
+        raise SQLAlchemyError(f"Unable to query user config {key}")
+    return default
 
 
 def _add_conf(sess, key, val):
@@ -167,6 +269,7 @@ def _remove_conf(sess, key):
         logger.info("Deleting %s", key)
         sess.delete(conf)
         sess.commit()
+        _USER_CONFIG_CACHE.invalidate(key)
 
 
 def _set_default(sess: Session, key: str, val: dict[str, Any] | BaseUserConfig):
@@ -190,6 +293,13 @@ def set_user_config(key: str, object_: dict[str, Any] | BaseUserConfig):
             _add_conf(sess, key, object_)
         else:
             conf.value = object_
+    # Once committed, so processes reloading it get the new value
+    _USER_CONFIG_CACHE.invalidate(key)
+
+
+def invalidate_user_configs() -> None:
+    """Have every process reload its configs, e.g. once missing ones were seeded"""
+    _USER_CONFIG_CACHE.invalidate()
 
 
 def validate_user_config(
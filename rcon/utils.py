@@ -12,8 +12,9 @@ import redis
 import redis.exceptions
 
 from rcon.cache_utils import get_redis_pool
+from rcon.codecs import Codec
 from rcon.models import GameLayout
-from rcon.types import GetDetailedPlayer, MapInfo, PlayerInfoType
+from rcon.types import GetDetailedPlayer, MapInfo, PlayerInfoType, PlayerStat
 
 logger = logging.getLogger("rcon")
 
@@ -89,31 +90,45 @@ class StreamNoElements(Exception):
 
 
 class Stream(Generic[T]):
+    # Field holding the whole entry when the stream has a codec, serialized
+    # keys are never a bare _ so it can't be mistaken for a per field entry
+    ENTRY_FIELD = b"_"
+
     def __init__(
-        self, key, serializer=orjson.dumps, deserializer=orjson.loads, maxlen=10_000
+        self,
+        key,
+        serializer=orjson.dumps,
+        deserializer=orjson.loads,
+        maxlen=10_000,
+        codec: Codec | None = None,
     ) -> None:
+        """Entries are stored with each key and value serialized, or whole with codec when set"""
         self.red = redis.StrictRedis(connection_pool=get_redis_pool())
         self.key = key
         self.serializer = serializer
         self.deserializer = deserializer
+        self.codec = codec
         self.maxlen = maxlen
 
     def _to_compatible_object(self, obj: dict[Any, Any]) -> T:
+        if self.codec is not None:
+            return {self.ENTRY_FIELD: self.codec.dumps(obj)}
         return {self.serializer(k): self.serializer(v) for k, v in obj.items()}
 
     def _from_compatible_object(self, raw_obj: dict[bytes, bytes]):
+        entry = raw_obj.get(self.ENTRY_FIELD)
+        if entry is not None and len(raw_obj) == 1:
+            return (self.codec.loads if self.codec else self.deserializer)(entry)
+        # Entries added before the stream had a codec
         return {self.deserializer(k): self.deserializer(v) for k, v in raw_obj.items()}
 
     def __len__(self) -> int:
         return self.red.xlen(self.key)  # type: ignore
 
     def __getitem__(self, key: StreamID) -> tuple[StreamID, T]:
-        id_: bytes
-        obj: dict[bytes, bytes]
         try:
-            id_, obj = next(self.range(min_id=key, max_id=key))
-            return (id_.decode(), self._to_compatible_object(obj))
-        except IndexError:
+            return next(self.range(min_id=key, max_id=key))
+        except StopIteration:
             raise KeyError(key)
 
     def add(
@@ -234,10 +249,17 @@ class Stream(Generic[T]):
 
 class FixedLenList(Generic[T]):
     def __init__(
-        self, key, max_len=100, serializer=orjson.dumps, deserializer=orjson.loads
+        self,
+        key,
+        max_len=100,
+        serializer=orjson.dumps,
+        deserializer=orjson.loads,
+        codec: Codec | None = None,
     ):
         self.red = redis.StrictRedis(connection_pool=get_redis_pool())
         self.max_len = max_len
+        if codec is not None:
+            serializer, deserializer = codec.dumps, codec.loads
         self.serializer = serializer
         self.deserializer = deserializer
         self.key = key
@@ -246,6 +268,16 @@ class FixedLenList(Generic[T]):
         self.red.lpush(self.key, self.serializer(obj))
         self.red.ltrim(self.key, 0, self.max_len - 1)
 
+    def add_many(self, objs: Iterable[T]):
+        """Add the objects in order in a single round trip, the last one ends up first"""
+        values = [self.serializer(obj) for obj in objs]
+        if not values:
+            return
+        pipe = self.red.pipeline(transaction=False)
+        pipe.lpush(self.key, *values)
+        pipe.ltrim(self.key, 0, self.max_len - 1)
+        pipe.execute()
+
     def remove(self, obj):
         self.red.lrem(self.key, 0, self.serializer(obj))
 
@@ -277,14 +309,64 @@ class FixedLenList(Generic[T]):
         for o in self.red.lrange(self.key, 0, -1):
             yield self.deserializer(o)
 
+    def iter_paged(self, page_size: int = 1000, start: int = 0, stop: int | None = None):
+        """Like iterating the list, but only fetch the elements page by page as they're consumed
+
+        Elements from index start up to, but not including, index stop.
+        """
+        while stop is None or start < stop:
+            last = start + page_size - 1
+            if stop is not None:
+                last = min(last, stop - 1)
+            page = self.red.lrange(self.key, start, last)
+            for o in page:
+                yield self.deserializer(o)
+            if len(page) < last - start + 1:
+                return
+            start = last + 1
+
     def __len__(self):
         return self.red.llen(self.key)
 
 
 class MapsHistory(FixedLenList[MapInfo]):
+    # Long enough for the stats of a map to be recorded in the database after it ended
+    PLAYER_STATS_TTL_SECONDS = 60 * 60 * 24
+
     def __init__(self, key="maps_history", max_len=500):
         super().__init__(key, max_len)
 
+    def player_stats_key(self, map_info: MapInfo) -> str | None:
+        """The hash of the player stats recorded while the map is running"""
+        if not map_info.get("start"):
+            return None
+        return f"{self.key}:player_stats:{int(map_info['start'])}"
+
+    def get_player_stats(self, map_info: MapInfo) -> dict[str, PlayerStat]:
+        """The stats of each player of the map, including the ones recorded while it's running"""
+        stats = dict(map_info.get("player_stats") or {})
+        key = self.player_stats_key(map_info)
+        if key is None:
+            return stats
+        for player_id, stat in self.red.hgetall(key).items():
+            if isinstance(player_id, bytes):
+                player_id = player_id.decode()
+            stats[player_id] = orjson.loads(stat)
+        return stats
+
+    def save_player_stats(self, map_info: MapInfo, stats: dict[str, PlayerStat]):
+        """Save the stats of the given players without rewriting the map"""
+        key = self.player_stats_key(map_info)
+        if key is None or not stats:
+            return
+        pipe = self.red.pipeline(transaction=False)
+        pipe.hset(
+            key,
+            mapping={player_id: orjson.dumps(stat) for player_id, stat in stats.items()},
+        )
+        pipe.expire(key, self.PLAYER_STATS_TTL_SECONDS)
+        pipe.execute()
+
     def save_map_end(self, old_map=None, end_timestamp: int = None):
         ts = end_timestamp or datetime.now().timestamp()
         logger.info("Saving end of map %s at time %s", old_map, ts)
@@ -292,6 +374,8 @@ class MapsHistory(FixedLenList[MapInfo]):
             name=old_map, start=None, end=None, guessed=True, player_stats=dict(), game_layout=GameLayout
         )
         prev["end"] = ts
+        # The stats are final, keep them with the map
+        prev["player_stats"] = self.get_player_stats(prev)
         self.lpush(prev)
         return prev
 
@@ -13,11 +13,13 @@ from sqlalchemy.orm import Session
 
 from rcon.cache_utils import get_redis_client
 from rcon.game_logs import get_historical_logs_records
+from rcon.match_facts import refresh_match_facts, refresh_match_sides
 from rcon.models import Maps, PlayerStats, enter_session
 from rcon.player_history import get_player
 from rcon.player_stats import TimeWindowStats
+from rcon.stats_rollups import add_match_to_rollups, rebuild_rollups
 from rcon.types import MapInfo, PlayerStat, GameLayout
-from rcon.utils import INDEFINITE_VIP_DATE
+from rcon.utils import INDEFINITE_VIP_DATE, MapsHistory
 
 logger = logging.getLogger("rcon")
 
@@ -143,7 +145,7 @@ def _record_stats(map_info: MapInfo):
             map_name=map_info["name"],
             game_layout=map_info["game_layout"] if "game_layout" in map_info else GameLayout,
         )
-        record_stats_from_map(sess, map_, map_info.get("player_stats", dict()))
+        record_stats_from_map(sess, map_, MapsHistory().get_player_stats(map_info))
         sess.commit()
 
 
@@ -189,6 +191,9 @@ def record_stats_from_map(
     sess.add(map_)
 
     seen_players: Set[str] = set()
+    # The steam_id_64.id of the players whose stats are inserted or overwritten
+    inserted: list[int] = []
+    overwritten: list[int] = []
     for player, stats in player_stats.items():
         if player_id := stats.get("player_id"):
             # If a player has changed their name and had stats recorded under two or more
@@ -301,13 +306,21 @@ def record_stats_from_map(
                 existing.defense = player_stat.get("defense")
                 existing.support = player_stat.get("support")
                 existing.level = player_stat.get("level")
+                overwritten.append(player_record.id)
             else:
                 logger.debug(f"Saving stats %s", player_stat)
                 player_stat_record = PlayerStats(**player_stat)
                 sess.add(player_stat_record)
+                inserted.append(player_record.id)
         else:
             logger.error("Stat object does not contain a player ID: %s", stats)
 
+    sess.flush()
+    add_match_to_rollups(sess, map_.id, inserted)
+    rebuild_rollups(sess, overwritten)
+    refresh_match_facts(sess, [map_.id], inserted + overwritten)
+    refresh_match_sides(sess, map_.id)
+
 
 def get_job_results(job_key):
     job = Job.fetch(job_key, connection=get_redis_client())
@@ -33,7 +33,22 @@ const RconConnectionNotes = `
 
             This needs to be a multiple of 10 (10, 20, 30, 40, etc.) and cannot be smaller than 10.
          */
-        "performance_statistics_interval_seconds": 30
+        "performance_statistics_interval_seconds": 30,
+
+        /*
+            Whether every worker should share a small, fixed pool of game server connections instead of
+            opening one connection per thread. Requests are pipelined over the shared connections and the
+            responses are matched back to their request, so many concurrent commands (like fetching the
+            info of every connected player) do not each need their own connection and login.
+            Changing this setting requires a restart of the supervisor and backend container.
+         */
+        "multiplexed_connections_enabled": false,
+
+        /*
+            The number of shared connections each worker opens when multiplexed_connections_enabled is true.
+            This must be an integer 1 <= x <= 10
+         */
+        "multiplexed_pool_size": 2
     }
     `;
 
@@ -5,9 +5,9 @@ const logStreamNotes = `
 
             Parameters :
             - stream_size: The number of logs the stream will retain before discarding the oldest logs.
-            - startup_since_mins: The number of minutes of logs to request from the game service when the service starts up
+            - startup_since_mins: The number of minutes of logs to add to the stream when the service starts up
             - refresh_frequency_sec: The poll rate for asking for new logs from the game server
-            - refresh_since_mins The number of minutes of logs to request from the game service each loop
+            - refresh_since_mins: No longer used, only the logs since the last received line are requested from the game server
 
             See https://github.com/MarechJ/hll_rcon_tool/wiki/Developer-Guides-%E2%80%90-Streaming-Logs for a detailed description.
         */
@@ -149,7 +149,11 @@ def get_live_game_stats(request):
 @require_http_methods(["GET"])
 def get_map_history(request):
     data = _get_data(request)
-    res = MapsHistory()[:]
+    maps = MapsHistory()
+    res = maps[:]
+    # The stats of the running map are kept apart until it ends
+    if res and res[0]["end"] is None:
+        res[0]["player_stats"] = maps.get_player_stats(res[0])
     if data.get("pretty"):
         res = [
             dict(
@@ -479,6 +479,7 @@ ENDPOINT_PERMISSIONS: dict[Callable, list[str] | set[str] | str] = {
     rcon_api.get_map_sequence: "api.can_view_current_map_sequence",
     rcon_api.get_detailed_player_info: "api.can_view_detailed_player_info",
     rcon_api.get_detailed_players: "api.can_view_detailed_players",
+    rcon_api.get_players_info_batch: "api.can_view_detailed_player_info",
     rcon_api.get_expired_vip_config: "api.get_expired_vip_config",
     rcon_api.get_gamestate: "api.can_view_gamestate",
     rcon_api.get_historical_logs: "api.can_view_historical_logs",
@@ -515,6 +516,7 @@ ENDPOINT_PERMISSIONS: dict[Callable, list[str] | set[str] | str] = {
     rcon_api.get_profanities: "api.can_view_profanities",
     rcon_api.get_queue_length: "api.can_view_queue_length",
     rcon_api.get_rcon_connection_settings_config: "api.can_view_rcon_connection_settings_config",
+    rcon_api.get_rcon_command_latencies: "api.can_view_rcon_connection_settings_config",
     rcon_api.get_rcon_server_settings_config: "api.can_view_rcon_server_settings_config",
     rcon_api.get_real_vip_config: "api.can_view_real_vip_config",
     rcon_api.get_recent_logs: "api.can_view_recent_logs",
@@ -543,6 +545,7 @@ ENDPOINT_PERMISSIONS: dict[Callable, list[str] | set[str] | str] = {
     rcon_api.get_team_objective_scores: "api.can_view_team_objective_scores",
     rcon_api.get_team_switch_cooldown: "api.can_view_team_switch_cooldown",
     rcon_api.get_team_view: "api.can_view_team_view",
+    rcon_api.get_team_view_changes: "api.can_view_team_view",
     rcon_api.get_temp_bans: "api.can_view_temp_bans",
     rcon_api.get_tk_ban_on_connect_config: "api.can_view_tk_ban_on_connect_config",
     rcon_api.get_vac_game_bans_config: "api.can_view_vac_game_bans_config",
@@ -743,6 +746,7 @@ RCON_ENDPOINT_HTTP_METHODS: dict[Callable, list[str]] = {
     rcon_api.get_map_sequence: ["GET"],
     rcon_api.get_detailed_player_info: ["GET"],
     rcon_api.get_detailed_players: ["GET"],
+    rcon_api.get_players_info_batch: ["GET", "POST"],
     rcon_api.get_expired_vip_config: ["GET"],
     rcon_api.get_gamestate: ["GET"],
     rcon_api.get_objective_rows: ["GET"],
@@ -781,6 +785,7 @@ RCON_ENDPOINT_HTTP_METHODS: dict[Callable, list[str]] = {
     rcon_api.get_profanities: ["GET"],
     rcon_api.get_queue_length: ["GET"],
     rcon_api.get_rcon_connection_settings_config: ["GET"],
+    rcon_api.get_rcon_command_latencies: ["GET"],
     rcon_api.get_rcon_server_settings_config: ["GET"],
     rcon_api.get_real_vip_config: ["GET"],
     rcon_api.get_recent_logs: ["GET", "POST"],
@@ -800,6 +805,7 @@ RCON_ENDPOINT_HTTP_METHODS: dict[Callable, list[str]] = {
     rcon_api.get_team_objective_scores: ["GET"],
     rcon_api.get_team_switch_cooldown: ["GET"],
     rcon_api.get_team_view: ["GET"],
+    rcon_api.get_team_view_changes: ["GET"],
     rcon_api.get_temp_bans: ["GET"],
     rcon_api.get_tk_ban_on_connect_config: ["GET"],
     rcon_api.get_vac_game_bans_config: ["GET"],
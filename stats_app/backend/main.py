@@ -1,18 +1,21 @@
 """stats_app FastAPI entrypoint.
 
 Mounts CORS, slowapi rate limiting, health probe, top-players leaderboard
-with sort/order/pagination + period/weapon/map/min_matches filters, and
-dropdown-feeder endpoints /api/maps and /api/weapons.
+with sort/order/pagination (offset or keyset cursor) + period/weapon/map/
+min_matches filters and its NDJSON export, and dropdown-feeder endpoints
+/api/maps and /api/weapons.
 Player detail page arrives in Phase 3 (Task #9).
 """
+import json
 import logging
 import os
 import threading
 import time
 from typing import Optional
 from fastapi import FastAPI, Depends, Query, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
@@ -22,35 +25,39 @@ from slowapi.errors import RateLimitExceeded
 
 from db import get_db, SessionLocal
 import queries
+import shared_cache
 
 logger = logging.getLogger(__name__)
 
-# How often to REFRESH the player_match_side materialized view so the side
-# filter picks up newly-played matches. 1h is plenty — match cadence is
-# tens of matches per day at most, and CONCURRENTLY doesn't block reads.
-MV_REFRESH_INTERVAL_SECONDS = int(os.getenv("MV_REFRESH_INTERVAL_SECONDS", "3600"))
+# How often to check for newly recorded matches. CRCON fills
+# player_match_side and the other per-match tables as it records each match,
+# this only tells the shared cache to recompute the aggregates.
+NEW_MATCH_POLL_SECONDS = int(os.getenv("NEW_MATCH_POLL_SECONDS", "60"))
 
 
-def _refresh_player_match_side_loop():
-    """Background thread: hourly REFRESH MATERIALIZED VIEW CONCURRENTLY.
-    Errors are logged and swallowed — next tick retries.
+def _watch_new_matches_loop():
+    """Background thread: request a shared cache refresh when a new match
+    has stats. Errors are logged and swallowed — next tick retries.
     """
+    last_match_id = None
     while True:
-        time.sleep(MV_REFRESH_INTERVAL_SECONDS)
         db = None
         try:
             db = SessionLocal()
-            db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY player_match_side"))
-            db.commit()
-            logger.info("player_match_side: refreshed")
+            match_id = db.execute(text("SELECT MAX(map_id) FROM player_stats")).scalar()
+            if last_match_id is not None and match_id != last_match_id:
+                logger.info("new match %s recorded, refreshing the shared cache", match_id)
+                shared_cache.request_refresh()
+            last_match_id = match_id
         except Exception as e:
-            logger.warning("player_match_side refresh failed: %s", e)
+            logger.warning("new match check failed: %s", e)
         finally:
             if db is not None:
                 try:
                     db.close()
                 except Exception:
                     pass
+        time.sleep(NEW_MATCH_POLL_SECONDS)
 
 # Rate limiter — in-memory, single-container scope.
 limiter = Limiter(key_func=get_remote_address, default_limits=["60/minute"])
@@ -64,12 +71,26 @@ app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 
+@app.exception_handler(shared_cache.CacheWarmingUp)
+def _cache_warming_up_handler(request: Request, exc: shared_cache.CacheWarmingUp):
+    """The first precompute after a cold start is still running."""
+    return JSONResponse(
+        {"detail": "statistics are being computed, retry shortly"},
+        status_code=503,
+        headers={"Retry-After": str(shared_cache.CACHE_POLL_SECONDS)},
+    )
+
+
 @app.on_event("startup")
 def _start_background_jobs():
-    """Start the MV refresh thread. daemon=True so it dies with the process."""
-    t = threading.Thread(target=_refresh_player_match_side_loop, daemon=True)
+    """Start the new match watcher and cache precompute threads.
+    daemon=True so they die with the process."""
+    t = threading.Thread(target=_watch_new_matches_loop, daemon=True)
+    t.start()
+    logger.info("started new match watcher thread (interval=%ds)", NEW_MATCH_POLL_SECONDS)
+    t = threading.Thread(target=shared_cache.refresh_loop, daemon=True)
     t.start()
-    logger.info("started player_match_side refresh thread (interval=%ds)", MV_REFRESH_INTERVAL_SECONDS)
+    logger.info("started shared cache refresh thread (ttl=%ds)", shared_cache.CACHE_TTL_SECONDS)
 
 ALLOWED_ORIGINS = os.getenv(
     "ALLOWED_ORIGINS",
@@ -110,37 +131,24 @@ def get_top_players(
     weapon_class: Optional[str] = Query(default=None,
                                          description="Sniper Rifle | Machine Gun | Artillery | ..."),
     side: Optional[str] = Query(default=None, description="Allies | Axis (matches without log coverage are excluded)"),
+    cursor: Optional[str] = Query(default=None, description="next_cursor of the previous page, replaces offset"),
     db: Session = Depends(get_db),
 ):
     """Aggregated all-time per-player stats with sort, pagination, filters."""
-    if sort not in queries.SORT_COLUMNS:
-        return JSONResponse(
-            {"detail": f"sort must be one of: {sorted(queries.SORT_COLUMNS.keys())}"},
-            status_code=400,
-        )
-    if period is not None and period not in queries.PERIOD_INTERVALS:
-        return JSONResponse(
-            {"detail": f"period must be one of: {sorted(queries.PERIOD_INTERVALS.keys())} or empty"},
-            status_code=400,
-        )
-    if game_mode is not None and game_mode.lower() not in queries.GAME_MODES:
-        return JSONResponse(
-            {"detail": f"game_mode must be one of: {sorted(queries.GAME_MODES.keys())} or empty"},
-            status_code=400,
-        )
-    if side is not None and side not in queries.SIDES_OR_FACTIONS:
-        return JSONResponse(
-            {"detail": f"side must be one of: {sorted(queries.SIDES_OR_FACTIONS)} or empty"},
-            status_code=400,
+    invalid = _validate_top_players_filters(sort, period, game_mode, side)
+    if invalid is not None:
+        return invalid
+
+    try:
+        rows, next_cursor = queries.top_players(
+            db,
+            sort=sort, order=order, limit=limit, offset=offset,
+            min_matches=min_matches, period=period, weapon=weapon,
+            map_name=map_name, search=search, game_mode=game_mode, weapon_class=weapon_class,
+            side=side, cursor=cursor,
         )
-
-    rows = queries.top_players(
-        db,
-        sort=sort, order=order, limit=limit, offset=offset,
-        min_matches=min_matches, period=period, weapon=weapon,
-        map_name=map_name, search=search, game_mode=game_mode, weapon_class=weapon_class,
-        side=side,
-    )
+    except ValueError as e:
+        return JSONResponse({"detail": str(e)}, status_code=400)
     total = queries.top_players_count(
         db,
         min_matches=min_matches, period=period, weapon=weapon,
@@ -163,9 +171,75 @@ def get_top_players(
         "weapon_class": weapon_class,
         "side": side,
         "results": rows,
+        "next_cursor": next_cursor,
     }
 
 
+@app.get("/api/top-players/export")
+@limiter.limit("6/minute")
+def export_top_players(
+    request: Request,
+    sort: str = Query(default="kills"),
+    order: str = Query(default="desc"),
+    min_matches: int = Query(default=50, ge=0, le=10000),
+    period: Optional[str] = Query(default=None),
+    weapon: Optional[str] = Query(default=None),
+    map_name: Optional[str] = Query(default=None),
+    search: Optional[str] = Query(default=None, min_length=2, max_length=64),
+    game_mode: Optional[str] = Query(default=None),
+    weapon_class: Optional[str] = Query(default=None),
+    side: Optional[str] = Query(default=None),
+):
+    """The whole leaderboard for the filters of /api/top-players, streamed
+    as NDJSON (one player per line) while it's fetched page by page."""
+    invalid = _validate_top_players_filters(sort, period, game_mode, side)
+    if invalid is not None:
+        return invalid
+
+    def rows():
+        # Its own session: the request's one is closed before streaming starts
+        db = SessionLocal()
+        try:
+            for row in queries.iter_top_players(
+                db,
+                sort=sort, order=order, min_matches=min_matches, period=period,
+                weapon=weapon, map_name=map_name, search=search, game_mode=game_mode,
+                weapon_class=weapon_class, side=side,
+            ):
+                yield json.dumps(jsonable_encoder(row), ensure_ascii=False) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+def _validate_top_players_filters(
+    sort: str, period: Optional[str], game_mode: Optional[str], side: Optional[str]
+) -> Optional[JSONResponse]:
+    """A 400 response for an unknown sort / period / game_mode / side, else None."""
+    if sort not in queries.SORT_COLUMNS:
+        return JSONResponse(
+            {"detail": f"sort must be one of: {sorted(queries.SORT_COLUMNS.keys())}"},
+            status_code=400,
+        )
+    if period is not None and period not in queries.PERIOD_INTERVALS:
+        return JSONResponse(
+            {"detail": f"period must be one of: {sorted(queries.PERIOD_INTERVALS.keys())} or empty"},
+            status_code=400,
+        )
+    if game_mode is not None and game_mode.lower() not in queries.GAME_MODES:
+        return JSONResponse(
+            {"detail": f"game_mode must be one of: {sorted(queries.GAME_MODES.keys())} or empty"},
+            status_code=400,
+        )
+    if side is not None and side not in queries.SIDES_OR_FACTIONS:
+        return JSONResponse(
+            {"detail": f"side must be one of: {sorted(queries.SIDES_OR_FACTIONS)} or empty"},
+            status_code=400,
+        )
+    return None
+
+
 @app.get("/api/weapon-classes")
 @limiter.limit("60/minute")
 def get_weapon_classes(request: Request, db: Session = Depends(get_db)):
@@ -225,10 +299,14 @@ def get_playstyle_players(
     playstyle_id: str,
     limit: int = Query(default=50, ge=1, le=200),
     offset: int = Query(default=0, ge=0),
+    cursor: Optional[str] = Query(default=None, description="next_cursor of the previous page, replaces offset"),
     db: Session = Depends(get_db),
 ):
     """Paginated list of all players matching one playstyle."""
-    return queries.playstyle_players(db, playstyle_id, limit=limit, offset=offset)
+    try:
+        return queries.playstyle_players(db, playstyle_id, limit=limit, offset=offset, cursor=cursor)
+    except ValueError as e:
+        return JSONResponse({"detail": str(e)}, status_code=400)
 
 
 @app.get("/api/countries")
@@ -315,10 +393,14 @@ def get_players_with_achievement(
     achievement_id: str,
     limit: int = Query(default=50, ge=1, le=200),
     offset: int = Query(default=0, ge=0),
+    cursor: Optional[str] = Query(default=None, description="next_cursor of the previous page, replaces offset"),
     db: Session = Depends(get_db),
 ):
     """List players who earned a specific achievement, paginated."""
-    return queries.players_with_achievement(db, achievement_id, limit, offset)
+    try:
+        return queries.players_with_achievement(db, achievement_id, limit, offset, cursor=cursor)
+    except ValueError as e:
+        return JSONResponse({"detail": str(e)}, status_code=400)
 
 
 @app.get("/api/maps")
@@ -0,0 +1,107 @@
+"""Keyset (cursor) pagination helpers.
+
+A cursor is the sort key of the last row of a page, opaque to clients
+(url-safe base64 JSON). The next page starts right after that key, so page
+N costs the same as page 1 instead of skipping N * limit rows. Each cursor
+carries the scope it was made for (endpoint + sort + filters) so it can't be
+replayed against another ordering or result set, and its key is checked
+against the types the endpoint expects before it reaches a comparison or
+the database.
+"""
+
+import base64
+import bisect
+import decimal
+import hashlib
+import json
+import math
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Allowed types of a key element, for decode_cursor
+NUMBER = (int, float, Decimal)
+OPTIONAL_NUMBER = (int, float, Decimal, type(None))
+STRING = (str,)
+BOOLEAN = (bool,)
+
+
+def _default(value: Any):
+    # NUMERIC columns come back as Decimal, keep them exact for comparisons
+    if isinstance(value, Decimal):
+        return {"__decimal__": str(value)}
+    raise TypeError(f"not JSON serializable: {type(value).__name__}")
+
+
+def _object_hook(obj: Dict[str, Any]):
+    if "__decimal__" in obj:
+        return Decimal(obj["__decimal__"])
+    return obj
+
+
+def filters_scope(prefix: str, **filters: Any) -> str:
+    """A scope for prefix that also pins the filters of the query."""
+    raw = json.dumps(filters, sort_keys=True, default=str, separators=(",", ":"))
+    return f"{prefix}:{hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()}"
+
+
+def _is_valid(value: Any, types: Tuple[type, ...]) -> bool:
+    # bool is an int, only accept it where it's expected
+    if isinstance(value, bool):
+        return bool in types
+    if not isinstance(value, types):
+        return False
+    if isinstance(value, float):
+        return math.isfinite(value)
+    if isinstance(value, Decimal):
+        return value.is_finite()
+    return True
+
+
+def encode_cursor(scope: str, key: Sequence[Any]) -> str:
+    raw = json.dumps(
+        {"s": scope, "k": list(key)}, default=_default, separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(scope: str, cursor: str, types: Sequence[Tuple[type, ...]]) -> list:
+    """The key of a cursor, ValueError if it's malformed, for another scope
+    or its elements aren't of the given types (one tuple per element)."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded), object_hook=_object_hook)
+        key = payload["k"]
+        cursor_scope = payload["s"]
+    except (ValueError, TypeError, KeyError, decimal.InvalidOperation) as e:
+        raise ValueError("invalid cursor") from e
+    if cursor_scope != scope:
+        raise ValueError("cursor does not match this query")
+    if (
+        not isinstance(key, list)
+        or len(key) != len(types)
+        or not all(_is_valid(value, t) for value, t in zip(key, types))
+    ):
+        raise ValueError("invalid cursor")
+    return key
+
+
+def page_after(
+    items: List[Any],
+    key: Callable[[Any], Tuple],
+    limit: int,
+    after: Optional[Sequence[Any]] = None,
+    offset: int = 0,
+) -> Tuple[List[Any], Optional[Tuple]]:
+    """A page of items (sorted by key) and the key to continue from.
+
+    Starts right after the `after` key with a binary search, or at `offset`
+    without one. The returned key is None on the last page.
+    """
+    start = (
+        bisect.bisect_right(items, tuple(after), key=key)
+        if after is not None
+        else offset
+    )
+    page = items[start : start + limit]
+    last_key = key(page[-1]) if page and start + limit < len(items) else None
+    return page, last_key
@@ -8,10 +8,13 @@ Single source of truth — used by:
 - player_detail to label one player
 - /api/playstyles + /api/playstyles/{id}/players for the server-wide page
 
-A small TTL cache (1h) avoids classifying 28k players on every request.
+The aggregate distribution is precomputed in the shared cache (see
+queries.py) instead of classifying 28k players on every request.
 """
-from typing import Any, Callable, Dict, List, Optional
-import time
+import bisect
+from typing import Any, Dict, List, Optional
+
+from pagination import BOOLEAN, NUMBER, STRING, decode_cursor, encode_cursor, page_after
 
 
 def _compute_ctx(p: Dict[str, Any]) -> Dict[str, float]:
@@ -333,13 +336,6 @@ def classify_one(profile: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-# In-process TTL cache for the aggregate distribution. Iterating 28k+
-# profiles to classify is fast but not per-request fast (~1-2s on prod);
-# 1h TTL is plenty since playstyles don't shift fast.
-_AGGREGATE_TTL_SECONDS = 3600
-_aggregate_cache: Dict[str, Any] = {"computed_at": 0.0, "buckets": None}
-
-
 def compute_playstyle_stats(profiles: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Per-archetype counts. player_count = primary matches; total_count =
     primary + also (any match). Sample top-5 by kills uses primary bucket.
@@ -395,36 +391,21 @@ def compute_playstyle_stats(profiles: List[Dict[str, Any]]) -> List[Dict[str, An
     return result
 
 
-def get_cached_stats_or_compute(profiles_fn: Callable[[], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
-    """Return cached aggregate stats, refreshing if older than TTL."""
-    now = time.time()
-    if (_aggregate_cache["buckets"] is not None
-            and now - _aggregate_cache["computed_at"] < _AGGREGATE_TTL_SECONDS):
-        return _aggregate_cache["buckets"]
-    fresh = compute_playstyle_stats(profiles_fn())
-    _aggregate_cache["computed_at"] = now
-    _aggregate_cache["buckets"] = fresh
-    return fresh
+def _member_key(p: Dict[str, Any]) -> tuple:
+    # Primary-first, then by kills
+    return (not p.get("is_primary"), -(p.get("kills") or 0), p["steam_id"])
 
 
-def players_with_playstyle(
-    profiles: List[Dict[str, Any]],
-    playstyle_id: str,
-    limit: int = 50,
-    offset: int = 0,
-) -> Dict[str, Any]:
-    """List all players whose playstyle matches the given id — either as
-    PRIMARY (first match) or ALSO (later matches). Marks each result with
-    `is_primary` so the UI can distinguish.
+def compute_playstyle_members(profiles: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """The players of every playstyle — either as PRIMARY (first match) or
+    ALSO (later matches) — sorted for players_with_playstyle. Each is marked
+    with `is_primary` so the UI can distinguish.
 
-    Earlier this function only counted primary, which contradicted the
-    "Також підходить" chips on player profiles: a player would see Майстер
-    жити as an also-style but the detail page would show 0 players.
+    Earlier only primary was counted, which contradicted the "Також
+    підходить" chips on player profiles: a player would see Майстер жити as
+    an also-style but the detail page would show 0 players.
     """
-    bucket: List[Dict[str, Any]] = []
-    target_ps: Optional[Dict[str, Any]] = next((ps for ps in PLAYSTYLES if ps["id"] == playstyle_id), None)
-    if target_ps is None:
-        return {"count": 0, "total": 0, "limit": limit, "offset": offset, "results": []}
+    members: Dict[str, List[Dict[str, Any]]] = {ps["id"]: [] for ps in PLAYSTYLES}
     for p in profiles:
         if (p.get("matches_played") or 0) < _AGGREGATE_MIN_MATCHES:
             continue
@@ -441,21 +422,39 @@ def players_with_playstyle(
             except (TypeError, ValueError, ZeroDivisionError):
                 continue
 
-        if playstyle_id == "versatile":
-            # Only include players with no real archetype match.
-            if not matched_ids:
-                bucket.append({**p, "is_primary": True})
-        else:
-            if playstyle_id in matched_ids:
-                is_primary = (matched_ids[0] == playstyle_id)
-                bucket.append({**p, "is_primary": is_primary})
-    # Sort primary-first, then by kills.
-    bucket.sort(key=lambda x: (not x.get("is_primary"), -(x.get("kills") or 0)))
-    paged = bucket[offset:offset + limit]
+        if not matched_ids:
+            members["versatile"].append({**p, "is_primary": True})
+        for i, ps_id in enumerate(matched_ids):
+            members[ps_id].append({**p, "is_primary": i == 0})
+    for bucket in members.values():
+        bucket.sort(key=_member_key)
+    return members
+
+
+def players_with_playstyle(
+    members: Dict[str, List[Dict[str, Any]]],
+    playstyle_id: str,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """A page of the players of one playstyle, from compute_playstyle_members.
+
+    With a cursor (next_cursor of the previous page) the page starts right
+    after it and offset is ignored. Raises ValueError on an invalid cursor.
+    """
+    target_ps: Optional[Dict[str, Any]] = next((ps for ps in PLAYSTYLES if ps["id"] == playstyle_id), None)
+    if target_ps is None:
+        return {"count": 0, "total": 0, "limit": limit, "offset": offset, "results": [], "next_cursor": None}
+    scope = f"playstyle:{playstyle_id}"
+    after = decode_cursor(scope, cursor, (BOOLEAN, NUMBER, STRING)) if cursor else None
+    bucket = members.get(playstyle_id, [])
+    paged, last_key = page_after(bucket, _member_key, limit, after=after, offset=offset)
     return {
         "count": len(paged),
         "total": len(bucket),
-        "primary_count": sum(1 for x in bucket if x.get("is_primary")),
+        # Primary members sort first
+        "primary_count": bisect.bisect_left(bucket, (True,), key=_member_key),
         "limit": limit,
         "offset": offset,
         "playstyle": {
@@ -463,4 +462,5 @@ def players_with_playstyle(
             "color": target_ps["color"], "description": target_ps["description"],
         },
         "results": paged,
+        "next_cursor": encode_cursor(scope, last_key) if last_key else None,
     }
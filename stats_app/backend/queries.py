@@ -12,10 +12,20 @@ from achievements import compute_achievements, compute_achievement_progress, ACH
 from theater_classifier import FACTIONS, maps_for_faction
 from playstyles import (
     classify_one as classify_playstyle_one,
-    get_cached_stats_or_compute,
+    compute_playstyle_members,
+    compute_playstyle_stats,
     players_with_playstyle,
-    _aggregate_cache,
 )
+from pagination import (
+    NUMBER,
+    OPTIONAL_NUMBER,
+    STRING,
+    decode_cursor,
+    encode_cursor,
+    filters_scope,
+    page_after,
+)
+import shared_cache
 
 
 # Whitelist mapping: API sort param → SQL expression.
@@ -49,7 +59,7 @@ GAME_MODES = {
 }
 
 # Recognised values for the `side` filter — binary sides from player_match_side
-# MV plus 5 factions derived from (side, theater) via theater_classifier.
+# plus 5 factions derived from (side, theater) via theater_classifier.
 SIDES = {"Allies", "Axis"}
 SIDES_OR_FACTIONS = SIDES | FACTIONS
 
@@ -85,13 +95,23 @@ def _build_filters(
         parts.append("m.map_name ILIKE :game_mode_pat")
         params["game_mode_pat"] = GAME_MODES[game_mode.lower()]
 
+    # Weapon filters are primary key lookups in player_match_weapon, which has
+    # the same keys as the weapons jsonb (zero-kill ones included).
     if weapon:
-        parts.append("ps.weapons ? :weapon")
+        parts.append(
+            "EXISTS (SELECT 1 FROM player_match_weapon pmw "
+            "WHERE pmw.playersteamid_id = ps.playersteamid_id "
+            "AND pmw.map_id = ps.map_id AND pmw.weapon = :weapon)"
+        )
         params["weapon"] = weapon
 
-    # Weapon class: matches any weapon in the class. Uses ANY(:array) with jsonb ? operator.
+    # Weapon class: matches any weapon in the class.
     if weapon_class and weapon_names_for_class:
-        parts.append("ps.weapons ?| :weapon_class_names")
+        parts.append(
+            "EXISTS (SELECT 1 FROM player_match_weapon pmwc "
+            "WHERE pmwc.playersteamid_id = ps.playersteamid_id "
+            "AND pmwc.map_id = ps.map_id AND pmwc.weapon = ANY(:weapon_class_names))"
+        )
         params["weapon_class_names"] = weapon_names_for_class
 
     if map_name:
@@ -137,15 +157,144 @@ def _expand_weapon_class(db: Session, weapon_class: Optional[str]) -> Optional[L
     """Return all weapon names in the given class, or None if class is empty."""
     if not weapon_class:
         return None
-    sql = text("""
-        SELECT DISTINCT w
-        FROM player_stats, jsonb_object_keys(weapons) AS w
-        WHERE weapons IS NOT NULL
-    """)
+    sql = text("SELECT DISTINCT weapon FROM player_match_weapon")
     all_weapons = [row[0] for row in db.execute(sql)]
     return [w for w in all_weapons if classify_weapon(w) == weapon_class]
 
 
+# Same as SORT_COLUMNS for the pre-summed rows of _rollup_source (aliased r).
+ROLLUP_SORT_COLUMNS = {
+    "kills": "r.kills",
+    "deaths": "r.deaths",
+    "teamkills": "r.teamkills",
+    "deaths_by_tk": "r.deaths_by_tk",
+    "kd_ratio": "CAST(r.kills AS NUMERIC) / NULLIF(r.deaths, 0)",
+    "kpm": "r.kills_per_minute_sum / NULLIF(r.kills_per_minute_count, 0)",
+    "playtime": "r.time_seconds",
+    "matches": "r.matches",
+    "level": "r.level",
+    "combat": "r.combat",
+    "offense": "r.offense",
+    "defense": "r.defense",
+    "support": "r.support",
+}
+
+# The columns of one player's row of _rollup_source, shared by the leaderboards and profiles.
+ROLLUP_PLAYER_COLUMNS = """
+            s.steam_id_64 AS steam_id,
+            r.name AS name,
+            r.level AS level,
+            r.kills AS kills,
+            r.deaths AS deaths,
+            r.teamkills AS teamkills,
+            r.deaths_by_tk AS deaths_by_tk,
+            ROUND(CAST(r.kills AS NUMERIC) / NULLIF(r.deaths, 0), 2) AS kd_ratio,
+            ROUND(CAST(r.kills_per_minute_sum / NULLIF(r.kills_per_minute_count, 0) AS NUMERIC), 2) AS kpm,
+            r.matches AS matches_played,
+            r.time_seconds AS total_seconds,
+            r.combat AS combat,
+            r.offense AS offense,
+            r.defense AS defense,
+            r.support AS support"""
+
+
+def _uses_rollups(weapon: Optional[str], weapon_class: Optional[str], side: Optional[str]) -> bool:
+    """Whether the filters can be answered from the rollups.
+
+    The rollups are summed per player, map and day: weapon and side filters
+    need the per-match rows of player_stats.
+    """
+    return not weapon and not weapon_class and side not in SIDES_OR_FACTIONS
+
+
+def _rollup_source(
+    period: Optional[str],
+    map_name: Optional[str],
+    game_mode: Optional[str],
+) -> tuple[str, dict]:
+    """(FROM item aliased r, params) with one pre-summed row per player.
+
+    All-time totals come straight from player_stats_rollup. Otherwise the
+    player_stats_rollup_bucket rows (player x map x day) that match the
+    filters are summed; periods start at midnight UTC of their first day.
+    """
+    parts: list[str] = []
+    params: dict = {}
+    if period and period in PERIOD_INTERVALS:
+        parts.append(f"b.day >= CAST(NOW() - INTERVAL '{PERIOD_INTERVALS[period]}' AS DATE)")
+    if game_mode and game_mode.lower() in GAME_MODES:
+        parts.append("b.map_name ILIKE :game_mode_pat")
+        params["game_mode_pat"] = GAME_MODES[game_mode.lower()]
+    if map_name:
+        parts.append("b.map_name = :map_name")
+        params["map_name"] = map_name
+
+    if not parts:
+        return "player_stats_rollup r", params
+    return f"""(
+            SELECT
+                b.playersteamid_id,
+                SUM(b.matches) AS matches,
+                MAX(b.name) AS name,
+                MAX(b.level) AS level,
+                MAX(b.kills_streak) AS kills_streak,
+                MAX(b.longest_life_secs) AS longest_life_secs,
+                SUM(b.kills) AS kills,
+                SUM(b.deaths) AS deaths,
+                SUM(b.teamkills) AS teamkills,
+                SUM(b.deaths_by_tk) AS deaths_by_tk,
+                SUM(b.time_seconds) AS time_seconds,
+                SUM(b.combat) AS combat,
+                SUM(b.offense) AS offense,
+                SUM(b.defense) AS defense,
+                SUM(b.support) AS support,
+                SUM(b.kills_per_minute_sum) AS kills_per_minute_sum,
+                SUM(b.kills_per_minute_count) AS kills_per_minute_count
+            FROM player_stats_rollup_bucket b
+            WHERE {" AND ".join(parts)}
+            GROUP BY b.playersteamid_id
+        ) r""", params
+
+
+def _rollup_where(min_matches: int, search: Optional[str], params: dict) -> str:
+    parts = ["r.matches >= :min_matches"]
+    params["min_matches"] = min_matches
+    if search:
+        # Any of the player's historical names, like _build_filters
+        parts.append(
+            "EXISTS (SELECT 1 FROM player_stats ps_alt "
+            "WHERE ps_alt.playersteamid_id = r.playersteamid_id "
+            "AND ps_alt.name ILIKE :search)"
+        )
+        params["search"] = f"%{search}%"
+    return "WHERE " + " AND ".join(parts)
+
+
+def _keyset_after(sort_expr: str, order_dir: str, after: list, params: dict) -> str:
+    """Condition for the rows after a cursor key, in the order of
+    ORDER BY (sort_expr) order_dir NULLS LAST, s.steam_id_64 order_dir."""
+    op = "<" if order_dir == "DESC" else ">"
+    params["after_steam_id"] = after[1]
+    if after[0] is None:
+        return f"(({sort_expr}) IS NULL AND s.steam_id_64 {op} :after_steam_id)"
+    params["after_value"] = after[0]
+    return (
+        f"(({sort_expr}) IS NULL OR ({sort_expr}) {op} :after_value "
+        f"OR (({sort_expr}) = :after_value AND s.steam_id_64 {op} :after_steam_id))"
+    )
+
+
+def _page_with_cursor(result, scope: str, limit: int) -> tuple[List[dict], Optional[str]]:
+    """Rows without their sort_value column, and the cursor of the next page."""
+    rows = [dict(row._mapping) for row in result]
+    next_cursor = None
+    if len(rows) == limit and rows:
+        next_cursor = encode_cursor(scope, [rows[-1]["sort_value"], rows[-1]["steam_id"]])
+    for row in rows:
+        row.pop("sort_value")
+    return rows, next_cursor
+
+
 def top_players(
     db: Session,
     sort: str = "kills",
@@ -160,10 +309,47 @@ def top_players(
     game_mode: Optional[str] = None,
     weapon_class: Optional[str] = None,
     side: Optional[str] = None,
-):
-    sort_expr = SORT_COLUMNS.get(sort, SORT_COLUMNS["kills"])
+    cursor: Optional[str] = None,
+) -> tuple[List[dict], Optional[str]]:
+    """A page of the leaderboard and the cursor of the next one (None on the last).
+
+    With a cursor the page starts right after it (keyset on the sort value
+    and steam_id) and offset is ignored, so deep pages cost the same as the
+    first. Raises ValueError on an invalid cursor.
+    """
     order_dir = "ASC" if order.lower() == "asc" else "DESC"
+    scope = filters_scope(
+        f"top:{sort}:{order_dir}",
+        min_matches=min_matches, period=period, weapon=weapon, map_name=map_name,
+        search=search, game_mode=game_mode, weapon_class=weapon_class, side=side,
+    )
+    after = decode_cursor(scope, cursor, (OPTIONAL_NUMBER, STRING)) if cursor else None
+    if after is not None:
+        offset = 0
+
+    if _uses_rollups(weapon, weapon_class, side):
+        sort_expr = ROLLUP_SORT_COLUMNS.get(sort, ROLLUP_SORT_COLUMNS["kills"])
+        source, params = _rollup_source(period, map_name, game_mode)
+        where_clause = _rollup_where(min_matches, search, params)
+        if after is not None:
+            where_clause += " AND " + _keyset_after(sort_expr, order_dir, after, params)
+        params.update({"limit": limit, "offset": offset})
+        sql = text(f"""
+            SELECT
+                {ROLLUP_PLAYER_COLUMNS},
+                si.profile->>'avatarmedium' AS avatar_url,
+                si.country AS country,
+                ({sort_expr}) AS sort_value
+            FROM {source}
+            JOIN steam_id_64 s ON s.id = r.playersteamid_id
+            LEFT JOIN steam_info si ON si.playersteamid_id = s.id
+            {where_clause}
+            ORDER BY ({sort_expr}) {order_dir} NULLS LAST, s.steam_id_64 {order_dir}
+            LIMIT :limit OFFSET :offset
+        """)
+        return _page_with_cursor(db.execute(sql, params), scope, limit)
 
+    sort_expr = SORT_COLUMNS.get(sort, SORT_COLUMNS["kills"])
     class_weapons = _expand_weapon_class(db, weapon_class)
     extra_joins, where_parts, params = _build_filters(
         period, weapon, map_name, search, game_mode, weapon_class, class_weapons, side, db,
@@ -172,6 +358,9 @@ def top_players(
     extra_join_clause = "\n        ".join(extra_joins)
 
     params.update({"limit": limit, "offset": offset, "min_matches": min_matches})
+    having_clause = "HAVING COUNT(DISTINCT ps.map_id) >= :min_matches"
+    if after is not None:
+        having_clause += " AND " + _keyset_after(sort_expr, order_dir, after, params)
 
     sql = text(f"""
         SELECT
@@ -195,7 +384,8 @@ def top_players(
             SUM(ps.defense) AS defense,
             SUM(ps.support) AS support,
             MAX(si.profile->>'avatarmedium') AS avatar_url,
-            MAX(si.country) AS country
+            MAX(si.country) AS country,
+            ({sort_expr}) AS sort_value
         FROM player_stats ps
         JOIN steam_id_64 s ON s.id = ps.playersteamid_id
         JOIN map_history m ON m.id = ps.map_id
@@ -203,12 +393,22 @@ def top_players(
         {extra_join_clause}
         {where_clause}
         GROUP BY s.steam_id_64
-        HAVING COUNT(DISTINCT ps.map_id) >= :min_matches
-        ORDER BY ({sort_expr}) {order_dir} NULLS LAST
+        {having_clause}
+        ORDER BY ({sort_expr}) {order_dir} NULLS LAST, s.steam_id_64 {order_dir}
         LIMIT :limit OFFSET :offset
     """)
-    result = db.execute(sql, params)
-    return [dict(row._mapping) for row in result]
+    return _page_with_cursor(db.execute(sql, params), scope, limit)
+
+
+def iter_top_players(db: Session, batch_size: int = 500, **filters):
+    """Every row of the leaderboard for the filters of top_players, fetched
+    page by page with its cursor so exports don't hold the whole result."""
+    cursor = None
+    while True:
+        rows, cursor = top_players(db, limit=batch_size, cursor=cursor, **filters)
+        yield from rows
+        if cursor is None:
+            return
 
 
 def top_players_count(
@@ -222,6 +422,12 @@ def top_players_count(
     weapon_class: Optional[str] = None,
     side: Optional[str] = None,
 ) -> int:
+    if _uses_rollups(weapon, weapon_class, side):
+        source, params = _rollup_source(period, map_name, game_mode)
+        where_clause = _rollup_where(min_matches, search, params)
+        sql = text(f"SELECT COUNT(*) FROM {source} {where_clause}")
+        return int(db.execute(sql, params).scalar() or 0)
+
     class_weapons = _expand_weapon_class(db, weapon_class)
     extra_joins, where_parts, params = _build_filters(
         period, weapon, map_name, search, game_mode, weapon_class, class_weapons, side, db,
@@ -255,40 +461,20 @@ def get_unique_maps(db: Session) -> List[str]:
 def get_unique_weapons(db: Session) -> List[str]:
     """Weapons with > 0 total kills, sorted by usage descending.
 
-    Filters out weapons that exist as jsonb keys but never accumulated kills
+    Filters out weapons that exist as keys but never accumulated kills
     (game data has ~100 such ghost entries). Sorting by usage puts common
     weapons at the top of the filter dropdown.
     """
     sql = text("""
-        SELECT key AS w, SUM(value::int) AS total
-        FROM player_stats, jsonb_each_text(weapons) AS kv(key, value)
-        WHERE weapons IS NOT NULL
-        GROUP BY key
-        HAVING SUM(value::int) > 0
+        SELECT weapon AS w, SUM(kills) AS total
+        FROM player_match_weapon
+        GROUP BY weapon
+        HAVING SUM(kills) > 0
         ORDER BY total DESC
     """)
     return [row[0] for row in db.execute(sql)]
 
 
-import time as _time
-_ENRICHED_CACHE: dict = {"computed_at": 0.0, "data": None}
-_ENRICHED_TTL = 3600
-
-
-def _all_player_profiles_enriched_cached(db: Session) -> List[dict]:
-    """TTL-cached variant. Enrichment runs two heavy jsonb_each queries
-    (~5s cold); calling it on every /api/playstyles/X/players page click
-    causes nginx 502s under load. 1h TTL aligns with the playstyle stats
-    cache."""
-    now = _time.time()
-    if _ENRICHED_CACHE["data"] is not None and now - _ENRICHED_CACHE["computed_at"] < _ENRICHED_TTL:
-        return _ENRICHED_CACHE["data"]
-    fresh = _all_player_profiles_enriched(db)
-    _ENRICHED_CACHE["data"] = fresh
-    _ENRICHED_CACHE["computed_at"] = now
-    return fresh
-
-
 def _all_player_profiles_enriched(db: Session) -> List[dict]:
     """_all_player_profiles + top_kill_class and peak_hour for each player.
 
@@ -303,14 +489,13 @@ def _all_player_profiles_enriched(db: Session) -> List[dict]:
     """
     profiles = _all_player_profiles(db)
 
-    # 1) Per-player weapon → class kills (heavy: jsonb_each over ~85k rows)
+    # 1) Per-player weapon → class kills
     sql_weapons = text("""
-        SELECT s.steam_id_64 AS sid, key AS weapon, SUM(value::int) AS kills
-        FROM player_stats ps
-        JOIN steam_id_64 s ON s.id = ps.playersteamid_id,
-             jsonb_each_text(ps.weapons)
-        WHERE ps.weapons IS NOT NULL AND value::int > 0
-        GROUP BY s.steam_id_64, key
+        SELECT s.steam_id_64 AS sid, pmw.weapon, SUM(pmw.kills) AS kills
+        FROM player_match_weapon pmw
+        JOIN steam_id_64 s ON s.id = pmw.playersteamid_id
+        WHERE pmw.kills > 0
+        GROUP BY s.steam_id_64, pmw.weapon
     """)
     per_class: dict[str, dict[str, int]] = {}
     unique_weapons: dict[str, set] = {}
@@ -368,33 +553,19 @@ def _all_player_profiles_enriched(db: Session) -> List[dict]:
 
 def _all_player_profiles(db: Session) -> List[dict]:
     """Fetch one aggregated profile per player. Used for achievement stats.
-    Result is cached at the function level via lru_cache wrapper above the
-    SQLAlchemy session boundary in caller — for simplicity here we just run it.
+    Reads the pre-summed player_stats_rollup rather than aggregating
+    player_stats.
     """
-    sql = text("""
+    sql = text(f"""
         SELECT
-            s.steam_id_64 AS steam_id,
-            MAX(ps.name) AS name,
-            MAX(ps.level) AS level,
-            SUM(ps.kills) AS kills,
-            SUM(ps.deaths) AS deaths,
-            SUM(ps.teamkills) AS teamkills,
-            SUM(ps.deaths_by_tk) AS deaths_by_tk,
-            ROUND(CAST(SUM(ps.kills) AS NUMERIC) / NULLIF(SUM(ps.deaths), 0), 2) AS kd_ratio,
-            COUNT(DISTINCT ps.map_id) AS matches_played,
-            SUM(ps.time_seconds) AS total_seconds,
-            SUM(ps.combat) AS combat,
-            SUM(ps.offense) AS offense,
-            SUM(ps.defense) AS defense,
-            SUM(ps.support) AS support,
-            MAX(ps.kills_streak) AS best_kills_streak,
-            MAX(ps.longest_life_secs) AS longest_life_secs,
-            MAX(si.profile->>'avatarmedium') AS avatar_url,
-            MAX(si.country) AS country
-        FROM player_stats ps
-        JOIN steam_id_64 s ON s.id = ps.playersteamid_id
+            {ROLLUP_PLAYER_COLUMNS},
+            r.kills_streak AS best_kills_streak,
+            r.longest_life_secs AS longest_life_secs,
+            si.profile->>'avatarmedium' AS avatar_url,
+            si.country AS country
+        FROM player_stats_rollup r
+        JOIN steam_id_64 s ON s.id = r.playersteamid_id
         LEFT JOIN steam_info si ON si.playersteamid_id = s.id
-        GROUP BY s.steam_id_64
     """)
     return [dict(row._mapping) for row in db.execute(sql)]
 
@@ -403,12 +574,15 @@ def compute_achievement_stats(db: Session) -> List[dict]:
     """For each achievement, count how many players have earned it.
 
     Returns list of {id, title, icon, tier, earned_count, percentage,
-    total_players}.
+    total_players}. Precomputed in the shared cache, see _achievement_stats.
     """
-    # Use enriched profiles so weapon-class achievements (Самурай, Танковий
-    # бог, Універсальний солдат) can count holders. Shares the 1h cache
-    # with playstyles, so the extra cost amortizes.
-    all_profiles = _all_player_profiles_enriched_cached(db)
+    return shared_cache.get("achievement_stats")
+
+
+def _achievement_stats(all_profiles: List[dict]) -> List[dict]:
+    # Uses enriched profiles so weapon-class achievements (Самурай, Танковий
+    # бог, Універсальний солдат) can count holders. Derived from the same
+    # cached profiles as playstyles, so the extra cost amortizes.
     total = len(all_profiles)
     counts: dict[str, int] = {}
     for p in all_profiles:
@@ -431,53 +605,74 @@ def compute_achievement_stats(db: Session) -> List[dict]:
     return result
 
 
+# Map achievement_id → relevant sort key of its player list
+ACHIEVEMENT_SORT_HINTS = {
+    "centurion":     "matches_played",
+    "veteran":       "matches_played",
+    "lifetime":      "matches_played",
+    "sharpshooter":  "kd_ratio",
+    "elite_sniper":  "kd_ratio",
+    "centurion_k":   "kills",
+    "killer_1k":     "kills",
+    "killing_mach":  "kills",
+    "reaper":        "kills",
+    "unstoppable":   "best_kills_streak",
+    "legendary_st":  "best_kills_streak",
+    "god_mode":      "best_kills_streak",
+    "marathon":      "total_seconds",
+    "time_lord":     "total_seconds",
+    "combat_master": "combat",
+    "support_hero":  "support",
+    "defender":      "defense",
+    "attacker":      "offense",
+    "elite":         "level",
+    "legendary_lvl": "level",
+    "mythic_lvl":    "level",
+    "survivor":      "longest_life_secs",
+    "tk_offender":   "teamkills",
+    "clumsy":        "deaths_by_tk",
+}
+
+
+def _achievement_member_key(sort_key: str):
+    return lambda p: (-(p.get(sort_key) or 0), p["steam_id"])
+
+
+def _achievement_members(all_profiles: List[dict]) -> dict[str, List[dict]]:
+    """The holders of every achievement, sorted for players_with_achievement."""
+    members: dict[str, List[dict]] = {}
+    for aid, _title, _icon, _tier, _description, pred in ACHIEVEMENTS:
+        matching = [p for p in all_profiles if _safe_predicate(pred, p)]
+        sort_key = ACHIEVEMENT_SORT_HINTS.get(aid, "kills")
+        matching.sort(key=_achievement_member_key(sort_key))
+        members[aid] = matching
+    return members
+
+
 def players_with_achievement(
     db: Session,
     achievement_id: str,
     limit: int = 50,
     offset: int = 0,
+    cursor: Optional[str] = None,
 ) -> dict:
     """List players who earned a specific achievement.
 
-    Sorted by relevant metric (e.g. kills for kill-based achievements).
+    Sorted by relevant metric (e.g. kills for kill-based achievements), from
+    the lists precomputed in the shared cache. With a cursor (next_cursor
+    of the previous page) the page starts right after it and offset is
+    ignored. Raises ValueError on an invalid cursor.
     """
-    # Map achievement_id → predicate + relevant sort key
-    SORT_HINT = {
-        "centurion":     "matches_played",
-        "veteran":       "matches_played",
-        "lifetime":      "matches_played",
-        "sharpshooter":  "kd_ratio",
-        "elite_sniper":  "kd_ratio",
-        "centurion_k":   "kills",
-        "killer_1k":     "kills",
-        "killing_mach":  "kills",
-        "reaper":        "kills",
-        "unstoppable":   "best_kills_streak",
-        "legendary_st":  "best_kills_streak",
-        "god_mode":      "best_kills_streak",
-        "marathon":      "total_seconds",
-        "time_lord":     "total_seconds",
-        "combat_master": "combat",
-        "support_hero":  "support",
-        "defender":      "defense",
-        "attacker":      "offense",
-        "elite":         "level",
-        "legendary_lvl": "level",
-        "mythic_lvl":    "level",
-        "survivor":      "longest_life_secs",
-        "tk_offender":   "teamkills",
-        "clumsy":        "deaths_by_tk",
-    }
-    sort_key = SORT_HINT.get(achievement_id, "kills")
-
-    pred = next((a[5] for a in ACHIEVEMENTS if a[0] == achievement_id), None)
-    if pred is None:
-        return {"count": 0, "total": 0, "results": []}
-
-    all_profiles = _all_player_profiles(db)
-    matching = [p for p in all_profiles if _safe_predicate(pred, p)]
-    matching.sort(key=lambda p: (p.get(sort_key) or 0), reverse=True)
-    paged = matching[offset:offset + limit]
+    sort_key = ACHIEVEMENT_SORT_HINTS.get(achievement_id, "kills")
+    if not any(a[0] == achievement_id for a in ACHIEVEMENTS):
+        return {"count": 0, "total": 0, "results": [], "next_cursor": None}
+
+    scope = f"achievement:{achievement_id}"
+    after = decode_cursor(scope, cursor, (NUMBER, STRING)) if cursor else None
+    matching = shared_cache.get("achievement_members").get(achievement_id, [])
+    paged, last_key = page_after(
+        matching, _achievement_member_key(sort_key), limit, after=after, offset=offset
+    )
     return {
         "count": len(paged),
         "total": len(matching),
@@ -485,6 +680,7 @@ def players_with_achievement(
         "offset": offset,
         "sort_key": sort_key,
         "results": paged,
+        "next_cursor": encode_cursor(scope, last_key) if last_key else None,
     }
 
 
@@ -655,8 +851,8 @@ def best_single_game(
             side_where = "AND FALSE"
 
     # top_weapon: pick the most-used weapon for this player in this specific
-    # match. Subquery scans the row's weapons jsonb. Skips matches with no
-    # weapons data (returns NULL — UI shows "—").
+    # match, a primary key range scan of player_match_weapon. Skips matches
+    # with no weapons data (returns NULL — UI shows "—").
     sql = text(f"""
         SELECT
             s.steam_id_64 AS steam_id,
@@ -667,10 +863,11 @@ def best_single_game(
             m.map_name AS map_name,
             m.start AS match_date,
             (
-              SELECT key
-              FROM jsonb_each_text(ps.weapons) AS kv(key, val)
-              WHERE ps.weapons IS NOT NULL AND val::int > 0
-              ORDER BY val::int DESC
+              SELECT pmw.weapon
+              FROM player_match_weapon pmw
+              WHERE pmw.playersteamid_id = ps.playersteamid_id
+                AND pmw.map_id = ps.map_id AND pmw.kills > 0
+              ORDER BY pmw.kills DESC
               LIMIT 1
             ) AS top_weapon
         FROM player_stats ps
@@ -695,7 +892,7 @@ def best_single_game(
 def played_with_against(db: Session, steam_id: str, limit: int = 10) -> dict:
     """Per-player breakdown of frequent teammates vs opponents.
 
-    Uses player_match_side MV to know which side each player was on per
+    Uses player_match_side to know which side each player was on per
     match — so only matches with log coverage contribute. Two lists each
     capped at `limit`. Output:
       {teammates: [{steam_id, name, matches}], opponents: [...]}
@@ -807,17 +1004,22 @@ def melee_meta(db: Session, steam_id: str) -> dict:
 
 
 def playstyle_stats(db: Session) -> list[dict]:
-    """Server-wide playstyle distribution. Buckets cached 1h via playstyles.py;
-    enriched profiles cached 1h here. Cold compute ~5s, hot <100ms."""
-    return get_cached_stats_or_compute(lambda: _all_player_profiles_enriched_cached(db))
+    """Server-wide playstyle distribution, precomputed in the shared cache
+    along with the enriched profiles it's classified from."""
+    return shared_cache.get("playstyle_stats")
 
 
-def playstyle_players(db: Session, playstyle_id: str, limit: int = 50, offset: int = 0) -> dict:
-    """Players matching one playstyle, paginated. Re-classifies on each call
-    (need full bucket, not just samples), but uses cached enriched profiles
-    so the heavy SQL only runs once per TTL."""
-    profiles = _all_player_profiles_enriched_cached(db)
-    return players_with_playstyle(profiles, playstyle_id, limit=limit, offset=offset)
+def playstyle_players(
+    db: Session,
+    playstyle_id: str,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+) -> dict:
+    """Players matching one playstyle, paginated by offset or cursor over
+    the membership lists precomputed in the shared cache."""
+    members = shared_cache.get("playstyle_members")
+    return players_with_playstyle(members, playstyle_id, limit=limit, offset=offset, cursor=cursor)
 
 
 def autocomplete_players(db: Session, q: str, limit: int = 10) -> list[dict]:
@@ -1058,22 +1260,24 @@ def best_single_game_by_class(
             s.steam_id_64 AS steam_id,
             MAX(ps.name) AS name,
             MAX(ps.level) AS level,
-            SUM(kv.val::int) AS value,
+            SUM(pmw.kills) AS value,
             m.id AS match_id,
             m.map_name AS map_name,
             m.start AS match_date,
             (
-              SELECT key FROM jsonb_each_text(ps.weapons) AS kv2(key, val)
-              WHERE kv2.key = ANY(:class_weapons) AND kv2.val::int > 0
-              ORDER BY kv2.val::int DESC LIMIT 1
+              SELECT pmw2.weapon FROM player_match_weapon pmw2
+              WHERE pmw2.playersteamid_id = ps.playersteamid_id
+                AND pmw2.map_id = ps.map_id
+                AND pmw2.weapon = ANY(:class_weapons) AND pmw2.kills > 0
+              ORDER BY pmw2.kills DESC LIMIT 1
             ) AS top_weapon
-        FROM player_stats ps
+        FROM player_match_weapon pmw
+        JOIN player_stats ps
+          ON ps.playersteamid_id = pmw.playersteamid_id AND ps.map_id = pmw.map_id
         JOIN steam_id_64 s ON s.id = ps.playersteamid_id
-        JOIN map_history m ON m.id = ps.map_id,
-             jsonb_each_text(ps.weapons) AS kv(key, val)
-        WHERE ps.weapons IS NOT NULL
-          AND kv.key = ANY(:class_weapons)
-          AND kv.val::int > 0
+        JOIN map_history m ON m.id = ps.map_id
+        WHERE pmw.weapon = ANY(:class_weapons)
+          AND pmw.kills > 0
         GROUP BY ps.id, s.steam_id_64, m.id, m.map_name, m.start
         ORDER BY value DESC NULLS LAST
         LIMIT :limit
@@ -1092,35 +1296,20 @@ def player_detail(db: Session, steam_id: str):
 
     Returns: {profile, top_weapons, most_killed, killed_by, recent_matches} or None.
     """
-    # 1) Profile aggregation + steam_info join for avatar/country
-    sql_profile = text("""
+    # 1) Pre-summed profile + steam_info join for avatar/country
+    sql_profile = text(f"""
         SELECT
-            s.steam_id_64 AS steam_id,
-            MAX(ps.name) AS name,
-            MAX(ps.level) AS level,
-            SUM(ps.kills) AS kills,
-            SUM(ps.deaths) AS deaths,
-            SUM(ps.teamkills) AS teamkills,
-            SUM(ps.deaths_by_tk) AS deaths_by_tk,
-            ROUND(CAST(SUM(ps.kills) AS NUMERIC) / NULLIF(SUM(ps.deaths), 0), 2) AS kd_ratio,
-            ROUND(CAST(AVG(ps.kills_per_minute) AS NUMERIC), 2) AS kpm,
-            COUNT(DISTINCT ps.map_id) AS matches_played,
-            SUM(ps.time_seconds) AS total_seconds,
-            SUM(ps.combat) AS combat,
-            SUM(ps.offense) AS offense,
-            SUM(ps.defense) AS defense,
-            SUM(ps.support) AS support,
-            MAX(ps.kills_streak) AS best_kills_streak,
-            MAX(ps.longest_life_secs) AS longest_life_secs,
-            MAX(si.profile->>'avatarfull') AS avatar_url,
-            MAX(si.profile->>'personaname') AS persona_name,
-            MAX(si.profile->>'profileurl') AS profile_url,
-            MAX(si.country) AS country
-        FROM player_stats ps
-        JOIN steam_id_64 s ON s.id = ps.playersteamid_id
+            {ROLLUP_PLAYER_COLUMNS},
+            r.kills_streak AS best_kills_streak,
+            r.longest_life_secs AS longest_life_secs,
+            si.profile->>'avatarfull' AS avatar_url,
+            si.profile->>'personaname' AS persona_name,
+            si.profile->>'profileurl' AS profile_url,
+            si.country AS country
+        FROM player_stats_rollup r
+        JOIN steam_id_64 s ON s.id = r.playersteamid_id
         LEFT JOIN steam_info si ON si.playersteamid_id = s.id
         WHERE s.steam_id_64 = :sid
-        GROUP BY s.steam_id_64
     """)
     profile_row = db.execute(sql_profile, {"sid": steam_id}).fetchone()
     if not profile_row:
@@ -1135,12 +1324,11 @@ def player_detail(db: Session, steam_id: str):
     # Top-N lists trimmed to 5 — PVP grid columns are narrow, top-10 was
     # forcing horizontal scroll on mobile and burying signal.
     sql_weapons = text("""
-        SELECT key AS weapon, SUM(value::int) AS kills
-        FROM player_stats ps
-        JOIN steam_id_64 s ON s.id = ps.playersteamid_id,
-             jsonb_each_text(ps.weapons)
-        WHERE s.steam_id_64 = :sid AND ps.weapons IS NOT NULL
-        GROUP BY key
+        SELECT f.weapon AS weapon, SUM(f.kills) AS kills
+        FROM player_match_weapon f
+        JOIN steam_id_64 s ON s.id = f.playersteamid_id
+        WHERE s.steam_id_64 = :sid
+        GROUP BY f.weapon
         ORDER BY kills DESC
         LIMIT 5
     """)
@@ -1148,12 +1336,11 @@ def player_detail(db: Session, steam_id: str):
 
     # 3) Most killed (victims) — PVP
     sql_killed = text("""
-        SELECT key AS victim, SUM(value::int) AS kills
-        FROM player_stats ps
-        JOIN steam_id_64 s ON s.id = ps.playersteamid_id,
-             jsonb_each_text(ps.most_killed)
-        WHERE s.steam_id_64 = :sid AND ps.most_killed IS NOT NULL
-        GROUP BY key
+        SELECT f.victim_name AS victim, SUM(f.kills) AS kills
+        FROM player_match_victim f
+        JOIN steam_id_64 s ON s.id = f.playersteamid_id
+        WHERE s.steam_id_64 = :sid
+        GROUP BY f.victim_name
         ORDER BY kills DESC
         LIMIT 5
     """)
@@ -1161,12 +1348,11 @@ def player_detail(db: Session, steam_id: str):
 
     # 4) Killed by (nemeses) — PVP reverse
     sql_killers = text("""
-        SELECT key AS killer, SUM(value::int) AS deaths
-        FROM player_stats ps
-        JOIN steam_id_64 s ON s.id = ps.playersteamid_id,
-             jsonb_each_text(ps.death_by)
-        WHERE s.steam_id_64 = :sid AND ps.death_by IS NOT NULL
-        GROUP BY key
+        SELECT f.killer_name AS killer, SUM(f.deaths) AS deaths
+        FROM player_match_killer f
+        JOIN steam_id_64 s ON s.id = f.playersteamid_id
+        WHERE s.steam_id_64 = :sid
+        GROUP BY f.killer_name
         ORDER BY deaths DESC
         LIMIT 5
     """)
@@ -1248,7 +1434,7 @@ def player_detail(db: Session, steam_id: str):
     }
 
     # 7) Top maps by matches played, with kills, K/D and win rate per map.
-    # Win rate computed by joining the MV (player's side per match) and
+    # Win rate computed by joining player_match_side (player's side per match) and
     # map_history.result. Matches without log coverage or with NULL result
     # don't contribute to known_outcomes — win_pct reflects what's
     # attributable, not raw count.
@@ -1294,7 +1480,7 @@ def player_detail(db: Session, steam_id: str):
         d["known_outcomes"] = known
         top_maps.append(d)
 
-    # 8) Faction preference from player_match_side MV. Matches without log
+    # 8) Faction preference from player_match_side. Matches without log
     # coverage are absent — total_known reflects matches we can attribute.
     sql_faction = text("""
         SELECT pms.side, COUNT(*) AS n
@@ -1331,12 +1517,11 @@ def player_detail(db: Session, steam_id: str):
     # shared weapon_classes Python rules. We pull (weapon, sum) pairs and
     # bucket in Python rather than re-implementing CASE WHEN in SQL.
     sql_kill_weapons = text("""
-        SELECT key AS weapon, SUM(value::int) AS n
-        FROM player_stats ps
-        JOIN steam_id_64 s ON s.id = ps.playersteamid_id,
-             jsonb_each_text(ps.weapons)
-        WHERE s.steam_id_64 = :sid AND ps.weapons IS NOT NULL
-        GROUP BY weapon
+        SELECT pmw.weapon, SUM(pmw.kills) AS n
+        FROM player_match_weapon pmw
+        JOIN steam_id_64 s ON s.id = pmw.playersteamid_id
+        WHERE s.steam_id_64 = :sid
+        GROUP BY pmw.weapon
     """)
     sql_death_weapons = text("""
         SELECT key AS weapon, SUM(value::int) AS n
@@ -1366,11 +1551,11 @@ def player_detail(db: Session, steam_id: str):
     }
     achievements_list = compute_achievements(_ach_profile)
 
-    # 11) Win rate — JOIN player_match_side MV with map_history.result
+    # 11) Win rate — JOIN player_match_side with map_history.result
     # (result jsonb shape: {"Allied": <sectors>, "Axis": <sectors>}). A match
     # is a win when the player's side captured more sectors. Matches with
     # equal sectors → draw. Excludes matches where result is NULL/empty or
-    # MV has no side for the player (logs predate capture).
+    # player_match_side has no side for the player (logs predate capture).
     sql_winrate = text("""
         SELECT
           pms.side,
@@ -1433,7 +1618,7 @@ def player_detail(db: Session, steam_id: str):
         if r.h is not None and 0 <= r.h < 24:
             hour_distribution[r.h] = int(r.n or 0)
 
-    # 14) Most played with / against — derived from player_match_side MV.
+    # 14) Most played with / against — derived from player_match_side.
     # Restricted to logged matches; older un-tracked matches don't contribute.
     pwa = played_with_against(db, steam_id, limit=5)
 
@@ -1489,3 +1674,18 @@ def player_detail(db: Session, steam_id: str):
         "playstyle": playstyle,
         "playstyle_also": playstyle_also,
     }
+
+
+# Enrichment runs two heavy full-table aggregates (~5s cold), computing it
+# on a request made nginx 502 the first visitors after each expiry. It's
+# precomputed in the background instead and shared by the workers.
+shared_cache.register(
+    "enriched_profiles",
+    _all_player_profiles_enriched,
+    derived={
+        "playstyle_stats": compute_playstyle_stats,
+        "playstyle_members": compute_playstyle_members,
+        "achievement_stats": _achievement_stats,
+        "achievement_members": _achievement_members,
+    },
+)
@@ -0,0 +1,250 @@
+"""Cache shared by the uvicorn workers for the heavy aggregates.
+
+Entries are computed in the background, never by a request: each worker
+runs refresh_loop, and whichever takes an entry's lock first recomputes it
+once it is older than CACHE_TTL_SECONDS or after request_refresh (e.g. when
+a new match was recorded). The result is published as a new version in a
+single Redis transaction, readers then swap to it on their next get.
+
+Readers always get the latest published version however old it is
+(stale-while-revalidate), and CacheWarmingUp before the first one exists.
+Each worker keeps the version it last loaded in memory so the Redis round
+trip per request is a single HGET.
+
+Without REDIS_URL (local dev) the entries live in the process and each
+worker precomputes its own.
+"""
+
+import logging
+import os
+import pickle
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+KEY_PREFIX = "stats_app:cache:"
+# How old a version may get before the background refresh replaces it.
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "3600"))
+# How often each worker checks whether an entry is due.
+CACHE_POLL_SECONDS = int(os.getenv("CACHE_POLL_SECONDS", "30"))
+# A worker killed mid-refresh releases the entry after this long.
+LOCK_SECONDS = 600
+
+
+class CacheWarmingUp(Exception):
+    """Nothing was published yet for an entry, the refresh is still running."""
+
+
+Compute = Callable[[Session], Any]
+Derive = Callable[[Any], Any]
+
+# name -> (compute, {derived name: derive}), in registration order.
+_entries: Dict[str, Tuple[Compute, Dict[str, Derive]]] = {}
+# name -> (version, data) last loaded by this worker.
+_loaded: Dict[str, Tuple[int, Any]] = {}
+
+
+class _RedisStore:
+    def __init__(self, url: str):
+        import redis
+
+        self.red = redis.Redis.from_url(url)
+
+    def meta(self, name: str) -> Dict[str, float]:
+        raw = self.red.hgetall(f"{KEY_PREFIX}{name}:meta")
+        return {k.decode(): float(v) for k, v in raw.items()}
+
+    def version(self, name: str) -> Optional[int]:
+        version = self.red.hget(f"{KEY_PREFIX}{name}:meta", "version")
+        return int(version) if version is not None else None
+
+    def load(self, name: str) -> Optional[Tuple[int, Any]]:
+        raw = self.red.get(f"{KEY_PREFIX}{name}:data")
+        if raw is None:
+            return None
+        return pickle.loads(zlib.decompress(raw))
+
+    def publish(self, entries: Dict[str, Any], computed_at: float):
+        meta_keys = [f"{KEY_PREFIX}{name}:meta" for name in entries]
+
+        def publish_next_versions(pipe):
+            # The meta keys are watched, if another worker publishes (or
+            # requests a refresh) before EXEC the versions are read again
+            versions = {
+                name: int(pipe.hget(meta_key, "version") or 0) + 1
+                for name, meta_key in zip(entries, meta_keys)
+            }
+            pipe.multi()
+            for name, data in entries.items():
+                version = versions[name]
+                pipe.set(
+                    f"{KEY_PREFIX}{name}:data",
+                    zlib.compress(
+                        pickle.dumps((version, data), protocol=pickle.HIGHEST_PROTOCOL)
+                    ),
+                )
+                pipe.hset(
+                    f"{KEY_PREFIX}{name}:meta",
+                    mapping={"version": version, "computed_at": computed_at},
+                )
+
+        self.red.transaction(publish_next_versions, *meta_keys)
+
+    def request_refresh(self, name: str):
+        self.red.hset(f"{KEY_PREFIX}{name}:meta", "requested_at", time.time())
+
+    def lock(self, name: str):
+        return self.red.lock(f"{KEY_PREFIX}{name}:lock", timeout=LOCK_SECONDS)
+
+
+class _LocalLock:
+    def acquire(self, blocking: bool = True) -> bool:
+        return True
+
+    def release(self):
+        pass
+
+
+class _LocalStore:
+    def __init__(self):
+        self.meta_by_name: Dict[str, Dict[str, float]] = {}
+        self.data_by_name: Dict[str, Tuple[int, Any]] = {}
+        self.mutex = threading.Lock()
+
+    def meta(self, name: str) -> Dict[str, float]:
+        return dict(self.meta_by_name.get(name, {}))
+
+    def version(self, name: str) -> Optional[int]:
+        version = self.meta_by_name.get(name, {}).get("version")
+        return int(version) if version is not None else None
+
+    def load(self, name: str) -> Optional[Tuple[int, Any]]:
+        return self.data_by_name.get(name)
+
+    def publish(self, entries: Dict[str, Any], computed_at: float):
+        with self.mutex:
+            for name, data in entries.items():
+                version = (self.version(name) or 0) + 1
+                self.data_by_name[name] = (version, data)
+                meta = self.meta_by_name.setdefault(name, {})
+                meta.update(version=version, computed_at=computed_at)
+
+    def request_refresh(self, name: str):
+        self.meta_by_name.setdefault(name, {})["requested_at"] = time.time()
+
+    def lock(self, name: str):
+        return _LocalLock()
+
+
+_store = _RedisStore(REDIS_URL) if REDIS_URL else _LocalStore()
+
+
+def register(name: str, compute: Compute, derived: Optional[Dict[str, Derive]] = None):
+    """Precompute `name` in the background with compute(db).
+
+    Each derived entry is computed from its result and published with it,
+    so they always come from the same version of the data.
+    """
+    _entries[name] = (compute, derived or {})
+
+
+def get(name: str) -> Any:
+    """The latest published data of an entry, never computed here."""
+    try:
+        version = _store.version(name)
+    except Exception:
+        logger.exception(
+            "shared cache: unable to read %s, serving the local copy", name
+        )
+        if name in _loaded:
+            return _loaded[name][1]
+        raise CacheWarmingUp(name)
+
+    if version is None:
+        raise CacheWarmingUp(name)
+    loaded = _loaded.get(name)
+    if loaded is not None and loaded[0] >= version:
+        return loaded[1]
+
+    loaded = _store.load(name)
+    if loaded is None:
+        raise CacheWarmingUp(name)
+    _loaded[name] = loaded
+    return loaded[1]
+
+
+def request_refresh(*names: str):
+    """Have the entries recomputed on the next poll, they are served meanwhile."""
+    for name in names or list(_entries):
+        try:
+            _store.request_refresh(name)
+        except Exception:
+            logger.exception("shared cache: unable to request a refresh of %s", name)
+
+
+def _is_due(name: str, now: float) -> bool:
+    meta = _store.meta(name)
+    computed_at = meta.get("computed_at")
+    if computed_at is None:
+        return True
+    return (
+        now - computed_at >= CACHE_TTL_SECONDS
+        or meta.get("requested_at", 0) > computed_at
+    )
+
+
+def refresh(name: str):
+    """Recompute an entry and its derived ones and publish them."""
+    compute, derived = _entries[name]
+    # Requests made while computing are newer than this version
+    started = time.time()
+    db = SessionLocal()
+    try:
+        data = compute(db)
+    finally:
+        db.close()
+    entries = {name: data}
+    for derived_name, derive in derived.items():
+        entries[derived_name] = derive(data)
+    _store.publish(entries, started)
+    logger.info(
+        "shared cache: published %s in %.1fs", ", ".join(entries), time.time() - started
+    )
+
+
+def refresh_due():
+    """Refresh the entries that are due, skipping those another worker is on."""
+    for name in list(_entries):
+        try:
+            if not _is_due(name, time.time()):
+                continue
+            lock = _store.lock(name)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                # Another worker may have published while we were checking
+                if _is_due(name, time.time()):
+                    refresh(name)
+            finally:
+                try:
+                    lock.release()
+                except Exception:
+                    # Expired while computing, someone else may hold it now
+                    pass
+        except Exception:
+            logger.exception("shared cache: refresh of %s failed", name)
+
+
+def refresh_loop():
+    """Background thread: refresh_due every CACHE_POLL_SECONDS, forever."""
+    while True:
+        refresh_due()
+        time.sleep(CACHE_POLL_SECONDS)
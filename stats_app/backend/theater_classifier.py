@@ -1,7 +1,7 @@
 """Map → theater → faction classifier for the side filter (Phase 2).
 
 HLL maps cover three theaters of WW2; each theater pairs one specific Allies
-faction with one Axis faction. The MV `player_match_side` only tracks the
+faction with one Axis faction. `player_match_side` only tracks the
 binary side (Allies / Axis), so faction must be derived at filter time by
 joining map_history and bucketing the map_name.
 
@@ -1,11 +1,19 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from logging import getLogger
 from unittest import mock
 
+import pytest
 import redis
 import redis.exceptions
 
-from rcon.cache_utils import RedisCached, ttl_cache
+from rcon.cache_utils import (
+    L1_INVALIDATION_CHANNEL,
+    RedisCached,
+    get_l1_stats,
+    ttl_cache,
+)
 
 logger = getLogger(__name__)
 
@@ -17,6 +25,9 @@ class MockRedis:
     def get(self, key):
         raise redis.exceptions.RedisError
 
+    def evalsha(self, *args):
+        raise redis.exceptions.RedisError
+
     def setex(self, _1, _2, _3):
         pass
 
@@ -72,3 +83,175 @@ def test_mem_cache_used(monkeypatch):
     # so we can't isinstance check it
     c = ttl_cache(ttl=1)
     assert not isinstance(c, RedisCached)
+
+
+def _player_card(player_id):
+    return {"player_id": player_id}
+
+
+@pytest.mark.skipif(not os.getenv("HLL_REDIS_URL"), reason="needs a redis instance")
+def test_cache_get_many_and_set_many():
+    c = RedisCached(
+        pool=None,
+        ttl_seconds=10,
+        function=_player_card,
+        cache_falsy=False,
+    )
+    c.clear_all()
+
+    c.set_many(
+        [(("1",), {"player_id": "1"}), (("2",), {}), (("3",), {"player_id": "3"})]
+    )
+
+    assert c.get_many([("1",), ("2",), ("3",)]) == [
+        {"player_id": "1"},
+        None,
+        {"player_id": "3"},
+    ]
+    # Entries written in bulk are the ones a regular call would hit
+    assert c.get_cached_value_for("3") is not None
+    c.clear_all()
+
+
+@pytest.mark.skipif(not os.getenv("HLL_REDIS_URL"), reason="needs a redis instance")
+def test_l1_cache_invalidated_across_instances():
+    calls = []
+
+    def _l1_cached(value):
+        calls.append(value)
+        return {"value": value, "call": len(calls)}
+
+    # Two instances stand for the same cached function in two processes
+    first, second = (
+        RedisCached(pool=None, ttl_seconds=10, function=_l1_cached, l1_ttl_seconds=10)
+        for _ in range(2)
+    )
+    first.clear_all()
+
+    assert first("a") == {"value": "a", "call": 1}
+    assert second("a") == {"value": "a", "call": 1}
+    # Served from memory even once the redis entry is gone
+    first.red.delete(first.key("a"))
+    hits = get_l1_stats()["hit"]
+    assert second("a") == {"value": "a", "call": 1}
+    assert get_l1_stats()["hit"] == hits + 1
+
+    # Invalidation coming from another process
+    first.red.publish(L1_INVALIDATION_CHANNEL, first.key_prefix)
+    deadline = time.monotonic() + 5
+    while second.l1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert second("a") == {"value": "a", "call": 2}
+    first.clear_all()
+
+
+@pytest.mark.skipif(not os.getenv("HLL_REDIS_URL"), reason="needs a redis instance")
+def test_single_flight_on_miss():
+    calls = []
+
+    def _slow_team_view():
+        calls.append(1)
+        time.sleep(0.3)
+        return {"call": len(calls)}
+
+    c = RedisCached(
+        pool=None, ttl_seconds=10, function=_slow_team_view, stale_ttl_seconds=5
+    )
+    c.clear_all()
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: c(), range(8)))
+
+    # Nothing stale to serve, the other callers waited for the first one
+    assert results == [{"call": 1}] * 8
+    assert len(calls) == 1
+
+    # Once expired, the others are served the stale value while it's recomputed
+    c.red.delete(c.key())
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: c(), range(8)))
+
+    assert len(calls) == 2
+    assert {"call": 2} in results
+    assert results.count({"call": 1}) == 7
+    c.clear_all()
+
+
+@pytest.mark.skipif(not os.getenv("HLL_REDIS_URL"), reason="needs a redis instance")
+def test_waiters_get_uncached_falsy_result():
+    calls = []
+
+    def _slow_empty_team_view():
+        calls.append(1)
+        time.sleep(0.3)
+        return {}
+
+    c = RedisCached(
+        pool=None,
+        ttl_seconds=10,
+        function=_slow_empty_team_view,
+        cache_falsy=False,
+        lock_wait_seconds=30,
+    )
+    c.clear_all()
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: c(), range(8)))
+
+    # Handed over as soon as computed rather than after lock_wait_seconds
+    assert time.monotonic() - started < 5
+    assert results == [{}] * 8
+    assert len(calls) == 1
+    assert c.red.get(c.key()) is None
+    c.clear_all()
+
+
+@pytest.mark.skipif(not os.getenv("HLL_REDIS_URL"), reason="needs a redis instance")
+def test_clear_all_moves_to_next_generation():
+    calls = []
+
+    def _versioned_player(player_id):
+        calls.append(player_id)
+        return {"player_id": player_id, "call": len(calls)}
+
+    c = RedisCached(pool=None, ttl_seconds=10, function=_versioned_player)
+    c.clear_all()
+    assert c("1") == {"player_id": "1", "call": 1}
+    assert c("1") == {"player_id": "1", "call": 1}
+    old_key = c.key("1")
+
+    c.clear_all()
+
+    # The previous value is left to expire but is never served again
+    assert c.red.exists(old_key)
+    assert c.key("1") != old_key
+    assert c("1") == {"player_id": "1", "call": 2}
+    c.set_many([(("2",), {"player_id": "2"})])
+    assert c.get_many([("1",), ("2",)]) == [
+        {"player_id": "1", "call": 2},
+        {"player_id": "2"},
+    ]
+    c.clear_all()
+
+
+@pytest.mark.skipif(not os.getenv("HLL_REDIS_URL"), reason="needs a redis instance")
+def test_clear_all_caches_moves_every_function_to_next_generation():
+    calls = []
+
+    def _globally_versioned(value):
+        calls.append(value)
+        return {"value": value, "call": len(calls)}
+
+    c = RedisCached(pool=None, ttl_seconds=10, function=_globally_versioned)
+    c.clear_all()
+    assert c("a") == {"value": "a", "call": 1}
+    old_key = c.key("a")
+
+    RedisCached.clear_all_caches(c.red.connection_pool)
+
+    assert c.red.exists(old_key)
+    assert c("a") == {"value": "a", "call": 2}
+    assert c.get_many([("a",)]) == [{"value": "a", "call": 2}]
+    c.clear_all()
@@ -0,0 +1,34 @@
+import pickle
+
+import pytest
+
+from rcon.codecs import ORJSON, PICKLE, CompressedCodec, MsgpackCodec, msgpack
+
+CODECS = [PICKLE, ORJSON, CompressedCodec(PICKLE), CompressedCodec(ORJSON)]
+if msgpack is not None:
+    CODECS += [MsgpackCodec(), CompressedCodec(MsgpackCodec())]
+
+
+@pytest.mark.parametrize("codec", CODECS, ids=lambda c: c.name)
+def test_round_trip(codec):
+    obj = {"stats": [{"name": "a", "kills": 1}] * 500, "snapshot_timestamp": 1.5}
+    assert codec.loads(codec.dumps(obj)) == obj
+
+
+def test_compressed_codec_reads_legacy_values():
+    codec = CompressedCodec(PICKLE, threshold=100)
+    small, large = {"a": 1}, {"a": "x" * 1000}
+
+    assert codec.loads(pickle.dumps(small)) == small
+    assert CompressedCodec(ORJSON).loads(ORJSON.dumps(large)) == large
+    assert len(codec.dumps(large)) < len(PICKLE.dumps(large))
+    assert codec.dumps(small)[:2] == bytes((CompressedCodec.MAGIC, CompressedCodec.RAW))
+
+
+@pytest.mark.skipif(msgpack is None, reason="needs msgpack")
+@pytest.mark.parametrize("obj", [None, -1, 1.5, {"a": 1}, [1, 2], "text", b"bin"])
+def test_compressed_codec_reads_legacy_msgpack_values(obj):
+    # msgpack values start with any byte but MAGIC, e.g. nil is 0xC0
+    codec = CompressedCodec(MsgpackCodec())
+    assert codec.loads(MsgpackCodec().dumps(obj)) == obj
+    assert codec.loads(codec.dumps(obj)) == obj
@@ -0,0 +1,340 @@
+import asyncio
+import base64
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pytest
+
+from rcon import connection
+from rcon.async_connection import AsyncServerCtl
+from rcon.commands import ServerCtl
+from rcon.connection import (
+    HEADER_FORMAT,
+    MAGIC_HEADER_VALUE,
+    RECEIVE_BUFFER_SIZE,
+    HLLBrokenConnectionError,
+    HLLConnection,
+    MultiplexedHLLConnection,
+    XorCodec,
+)
+from rcon.perf_statistics import PerformanceStatistics
+
+XOR_KEY = b"\x13\x37\xbe\xef"
+
+
+def _xor(data: bytes) -> bytes:
+    return bytes(b ^ XOR_KEY[i % len(XOR_KEY)] for i, b in enumerate(data))
+
+
+class FakeGameServer:
+    """A minimal v2 RCON server that answers requests out of order"""
+
+    def __init__(self) -> None:
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen()
+        self.port = self.sock.getsockname()[1]
+        self.connections = 0
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _recv_exactly(self, client: socket.socket, n: int) -> bytes:
+        buf = b""
+        while len(buf) < n:
+            chunk = client.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError
+            buf += chunk
+        return buf
+
+    def _serve(self, client: socket.socket):
+        xor = False
+        pending: list[tuple[int, dict]] = []
+        try:
+            while True:
+                # Hold back responses while requests keep coming in, then answer them shuffled
+                client.settimeout(0.05 if pending else None)
+                try:
+                    header = self._recv_exactly(client, struct.calcsize(HEADER_FORMAT))
+                except TimeoutError:
+                    self._flush(client, pending, xor)
+                    continue
+                client.settimeout(None)
+                _, request_id, body_len = struct.unpack(HEADER_FORMAT, header)
+                body = self._recv_exactly(client, body_len)
+                request = json.loads(_xor(body) if xor else body)
+
+                if request["name"] == "ServerConnect":
+                    content = base64.b64encode(XOR_KEY).decode()
+                elif request["name"] == "Login":
+                    content = "token"
+                else:
+                    content = request["contentBody"]
+                pending.append((request_id, {**request, "contentBody": content}))
+
+                if request["name"] in ("ServerConnect", "Login") or len(pending) >= 4:
+                    self._flush(client, pending, xor)
+                xor = True
+        except OSError:
+            client.close()
+
+    def _flush(self, client, pending, xor):
+        random.shuffle(pending)
+        for request_id, request in pending:
+            self._respond(client, request_id, request, xor)
+        pending.clear()
+
+    def _respond(self, client, request_id, request, xor):
+        body = json.dumps(
+            {
+                "name": request["name"],
+                "version": request["version"],
+                "statusCode": 200,
+                "statusMessage": "OK",
+                "contentBody": request["contentBody"],
+            }
+        ).encode()
+        if xor:
+            body = _xor(body)
+        client.sendall(
+            struct.pack(HEADER_FORMAT, MAGIC_HEADER_VALUE, request_id, len(body)) + body
+        )
+
+    def close(self):
+        self.sock.close()
+
+
+@pytest.fixture
+def game_server():
+    server = FakeGameServer()
+    yield server
+    server.close()
+
+
+def test_multiplexed_connection_matches_out_of_order_responses(game_server):
+    conn = MultiplexedHLLConnection()
+    conn.connect("127.0.0.1", game_server.port, "password")
+
+    handles = [conn.send("GetPlayer", 2, f"player-{i}") for i in range(20)]
+
+    assert [h.receive().content for h in handles] == [f"player-{i}" for i in range(20)]
+    assert conn.in_flight == 0
+    conn.close()
+
+
+def test_multiplexed_server_ctl_shares_pool(game_server):
+    ctl = ServerCtl(
+        {"host": "127.0.0.1", "port": game_server.port, "password": "password"},
+        PerformanceStatistics("test"),
+        multiplexed=True,
+        multiplexed_pool_size=2,
+    )
+
+    with ThreadPoolExecutor(32) as pool:
+        contents = list(
+            pool.map(
+                lambda i: ctl.exchange("GetPlayer", 2, f"player-{i}").content,
+                range(100),
+            )
+        )
+
+    assert contents == [f"player-{i}" for i in range(100)]
+    assert game_server.connections <= 2
+    assert ctl.mux_in_flight() == 0
+
+
+def test_multiplexed_connection_marked_broken_when_socket_closes(game_server):
+    conn = MultiplexedHLLConnection()
+    conn.connect("127.0.0.1", game_server.port, "password")
+    handle = conn.send("GetPlayer", 2, "player")
+    handle.receive()
+
+    conn.sock.shutdown(socket.SHUT_RDWR)
+    conn._reader.join(timeout=5)
+
+    assert conn.broken
+    conn.close()
+
+
+def test_multiplexed_send_racing_a_reader_failure_is_refused(game_server):
+    conn = MultiplexedHLLConnection()
+    conn.connect("127.0.0.1", game_server.port, "password")
+    make_request = connection.Request
+
+    def fail_while_sending(*args, **kwargs):
+        # The reader fails after send checked the connection, before it registers
+        conn._fail_pending(HLLBrokenConnectionError("reader failed"))
+        return make_request(*args, **kwargs)
+
+    with mock.patch.object(connection, "Request", side_effect=fail_while_sending):
+        with pytest.raises(HLLBrokenConnectionError):
+            conn.send("GetPlayer", 2, "player")
+
+    assert conn.in_flight == 0
+    conn.close()
+
+
+def _reference_xor(msg: bytes, key: bytes) -> bytes:
+    return bytes(b ^ key[i % len(key)] for i, b in enumerate(msg))
+
+
+@pytest.mark.parametrize("size", [0, 1, 3, 4, 5, 1023, 64 * 1024])
+def test_xor_codec_matches_bytewise_xor(size):
+    codec = XorCodec(XOR_KEY)
+    msg = random.randbytes(size)
+
+    encoded = codec(msg)
+
+    assert encoded == _reference_xor(msg, XOR_KEY)
+    assert codec(bytearray(encoded)) == msg
+    assert codec(memoryview(encoded)) == msg
+
+
+def test_frame_reader_handles_fragmented_frames():
+    conn = HLLConnection()
+    conn.sock.close()
+    conn.sock, server = socket.socketpair()
+    conn._codec = XorCodec(XOR_KEY)
+
+    big_content = "x" * (RECEIVE_BUFFER_SIZE * 3)
+    frames = b""
+    for request_id, content in ((1, "small"), (2, big_content)):
+        body = _xor(
+            json.dumps(
+                {
+                    "name": "GetPlayer",
+                    "version": 2,
+                    "statusCode": 200,
+                    "statusMessage": "OK",
+                    "contentBody": content,
+                }
+            ).encode()
+        )
+        frames += (
+            struct.pack(HEADER_FORMAT, MAGIC_HEADER_VALUE, request_id, len(body)) + body
+        )
+
+    def send_fragmented():
+        # Split the header of the first frame and send the rest in odd sized chunks
+        for start, end in ((0, 4), (4, 9), (9, 12)):
+            server.sendall(frames[start:end])
+            time.sleep(0.01)
+        view = memoryview(frames)
+        for pos in range(12, len(frames), 7919):
+            server.sendall(view[pos : pos + 7919])
+
+    threading.Thread(target=send_fragmented, daemon=True).start()
+
+    assert conn.receive(2).content == big_content
+    assert conn.receive(1).content == "small"
+    assert len(conn._recv_buf) >= len(big_content)
+    server.close()
+    conn.close()
+
+
+def test_frame_reader_waits_for_headers_but_not_stalled_bodies(monkeypatch):
+    monkeypatch.setattr("rcon.connection.TIMEOUT_SEC", 0.3)
+    conn = HLLConnection()
+    conn.sock.close()
+    conn.sock, server = socket.socketpair()
+    conn.sock.settimeout(0.05)
+
+    def send_late():
+        time.sleep(0.15)
+        # Only half of the body ever arrives
+        server.sendall(struct.pack(HEADER_FORMAT, MAGIC_HEADER_VALUE, 1, 10) + b"{}")
+
+    threading.Thread(target=send_late, daemon=True).start()
+
+    with pytest.raises(HLLBrokenConnectionError):
+        conn.receive(1)
+    assert conn.sock.gettimeout() == 0.05
+    server.close()
+    conn.close()
+
+
+def test_async_server_ctl_fans_out_over_pool(game_server):
+    async def main():
+        ctl = AsyncServerCtl(
+            {"host": "127.0.0.1", "port": game_server.port, "password": "password"},
+            PerformanceStatistics("test"),
+            pool_size=2,
+        )
+        responses = await asyncio.gather(
+            *(ctl.exchange("GetPlayer", 2, f"player-{i}") for i in range(200))
+        )
+        in_flight = ctl.in_flight()
+        await ctl.close()
+        return [r.content for r in responses], in_flight
+
+    contents, in_flight = asyncio.run(main())
+
+    assert contents == [f"player-{i}" for i in range(200)]
+    assert game_server.connections <= 2
+    assert in_flight == 0
+
+
+def test_async_server_ctl_runs_blocking_commands(game_server):
+    async def main():
+        ctl = AsyncServerCtl(
+            {"host": "127.0.0.1", "port": game_server.port, "password": "password"},
+            PerformanceStatistics("test"),
+        )
+        # Not implemented natively, runs the ServerCtl implementation over the pool
+        sent = await ctl.bulk_message_players(["1", "2"], ["hello", "there"])
+        kicked = await ctl.kick("1", "bye")
+        await ctl.close()
+        return sent, kicked
+
+    assert asyncio.run(main()) == (True, True)
+    assert game_server.connections <= 2
+
+
+def test_server_ctl_over_async_pool(game_server):
+    config = {"host": "127.0.0.1", "port": game_server.port, "password": "password"}
+    async_ctl = AsyncServerCtl(
+        config, PerformanceStatistics("test")
+    ).start_background_loop()
+    ctl = ServerCtl(config, PerformanceStatistics("test"), async_ctl=async_ctl)
+
+    with ThreadPoolExecutor(16) as pool:
+        contents = list(
+            pool.map(
+                lambda i: ctl.exchange("GetPlayer", 2, f"player-{i}").content,
+                range(50),
+            )
+        )
+
+    assert contents == [f"player-{i}" for i in range(50)]
+    assert game_server.connections <= 2
+    asyncio.run_coroutine_threadsafe(async_ctl.close(), async_ctl.loop).result()
+
+
+def test_get_players_info_batch_pipelines_requests(game_server):
+    ctl = ServerCtl(
+        {"host": "127.0.0.1", "port": game_server.port, "password": "password"},
+        PerformanceStatistics("test"),
+    )
+
+    players = ctl.get_players_info_batch(["1", "2", "1", "3"])
+
+    # The fake server echoes the request content back
+    assert players == {
+        player_id: {"Name": "player", "Value": player_id}
+        for player_id in ("1", "2", "3")
+    }
+    assert game_server.connections == 1
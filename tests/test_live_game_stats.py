@@ -0,0 +1,107 @@
+import contextlib
+import os
+import time
+from unittest import mock
+
+import pytest
+
+from rcon.logs.loop import LogLoop
+from rcon.player_stats import IncrementalTimeWindowStats, TimeWindowStats
+from rcon.rcon import Rcon
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("HLL_REDIS_URL"), reason="needs a redis instance"
+)
+
+START = int(time.time()) - 3600
+
+LINES = [
+    "CONNECTED A (1)",
+    "CONNECTED B (2)",
+    "KILL: A(Axis/1) -> B(Allies/2) with MP40",
+    "KILL: A(Axis/1) -> B(Allies/2) with MP40",
+    "VOTESYS: Player [A] voted [PV_Favour] for VoteID[2]",
+    "KILL: B(Allies/2) -> A(Axis/1) with M1 GARAND",
+    "TEAM KILL: C(Axis/3) -> A(Axis/1) with MP40",
+    "DISCONNECTED B (2)",
+    "KILL: A(Axis/1) -> C(Axis/3) with KAR98K",
+    "CONNECTED B (2)",
+    "KILL: B(Allies/2) -> C(Axis/3) with M1 GARAND",
+    "KILL: C(Axis/3) -> A(Axis/1) with MP40",
+]
+
+
+def _push(history, lines, offset):
+    raw_logs = [
+        f"[1.00 sec ({START + offset + i * 10})] {line}" for i, line in enumerate(lines)
+    ]
+    history.add_many(reversed(Rcon.parse_logs(raw_logs)["logs"]))
+
+
+@pytest.fixture
+def history(monkeypatch):
+    monkeypatch.setattr(LogLoop, "log_history_key", "test_live_game_stats_history")
+    history = LogLoop.get_log_history_list()
+    history.red.delete(
+        history.key,
+        IncrementalTimeWindowStats.checkpoint_key,
+        *history.red.keys(f"{history.key}:index:*"),
+    )
+    with (
+        mock.patch("rcon.player_stats.get_rcon"),
+        mock.patch("rcon.player_stats.enter_session", contextlib.nullcontext),
+        mock.patch(
+            "rcon.player_stats.get_player_profile_by_player_ids", return_value=[]
+        ),
+    ):
+        yield history
+    history.red.delete(
+        history.key,
+        IncrementalTimeWindowStats.checkpoint_key,
+        *history.red.keys(f"{history.key}:index:*"),
+    )
+
+
+def _without_time(stats):
+    return {
+        name: {
+            k: v
+            for k, v in s.items()
+            if k not in ("time_seconds", "kills_per_minute", "deaths_per_minute")
+        }
+        for name, s in stats.items()
+    }
+
+
+def test_incremental_stats_match_full_recompute(history):
+    incremental = IncrementalTimeWindowStats()
+    _push(history, LINES[:6], 0)
+    incremental.get_players_stats_from_time(START)
+    _push(history, LINES[6:], 60)
+
+    with mock.patch.object(
+        incremental, "_accumulate", wraps=incremental._accumulate
+    ) as accumulate:
+        stats = incremental.get_players_stats_from_time(START)
+    assert accumulate.call_count == len(LINES[6:])
+    expected = TimeWindowStats().get_players_stats_from_time(START)
+
+    assert _without_time(stats) == _without_time(expected)
+    assert stats["A"]["kills"] == 3
+    assert stats["A"]["weapons"] == {"MP40": 2, "KAR98K": 1}
+    assert stats["C"]["teamkills"] == 1
+    for name, s in stats.items():
+        assert s["time_seconds"] == pytest.approx(expected[name]["time_seconds"], abs=5)
+
+
+def test_incremental_stats_start_over_on_match_start(history):
+    incremental = IncrementalTimeWindowStats()
+    _push(history, LINES, 0)
+    incremental.get_players_stats_from_time(START)
+    _push(history, ["MATCH START UTAH BEACH WARFARE", *LINES[:3]], 600)
+
+    # The map history still has the previous map start
+    stats = incremental.get_players_stats_from_time(START)
+
+    assert stats["A"]["kills"] == 1
+    assert set(stats) == {"A", "B"}
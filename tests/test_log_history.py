@@ -0,0 +1,134 @@
+import os
+import time
+
+import pytest
+
+from rcon.game_logs import get_recent_logs
+from rcon.logs.history import LogHistory
+from rcon.logs.loop import LogLoop
+from rcon.rcon import Rcon
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("HLL_REDIS_URL"), reason="needs a redis instance"
+)
+
+START = int(time.time()) - 3600
+
+LINES = [
+    "CONNECTED A (1)",
+    "CONNECTED B (2)",
+    "KILL: A(Axis/1) -> B(Allies/2) with MP40",
+    "CHAT[Team][A(Axis/1)]: hello",
+    "TEAM KILL: C(Axis/3) -> A(Axis/1) with MP40",
+    "KILL: B(Allies/2) -> C(Axis/3) with M1 GARAND",
+    "DISCONNECTED B (2)",
+    "CHAT[Unit][C(Axis/3)]: back",
+]
+
+
+def _logs(count: int):
+    raw_logs = [
+        f"[1.00 sec ({START + i})] {LINES[i % len(LINES)]}" for i in range(count)
+    ]
+    return list(reversed(Rcon.parse_logs(raw_logs)["logs"]))
+
+
+def _clear(history: LogHistory):
+    history.red.delete(history.key, *history.red.keys(f"{history.key}:index:*"))
+
+
+@pytest.fixture
+def history(monkeypatch):
+    monkeypatch.setattr(LogLoop, "log_history_key", "test_log_history_index")
+    history = LogLoop.get_log_history_list()
+    history.max_len = 100
+    # Index everything so the results can be compared to reading the list
+    monkeypatch.setattr(LogHistory, "MAX_INDEXED_FRACTION", 1)
+    monkeypatch.setattr(LogHistory, "MAX_INDEXED_LINES", 1000)
+    _clear(history)
+    yield history
+    _clear(history)
+
+
+def _scanned(monkeypatch, **kwargs):
+    with monkeypatch.context() as m:
+        m.setattr(LogHistory, "find", lambda *args, **kwargs: None)
+        return get_recent_logs(**kwargs)
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(action_filter=["KILL"]),
+        dict(action_filter=["CHAT"], start=10, end=60),
+        dict(action_filter=["KILL"], exact_action=True),
+        dict(player_search="A", exact_player_match=True),
+        dict(player_search=["B", "C"], exact_player_match=True, action_filter=["KILL"]),
+        dict(player_id_search="3"),
+        dict(player_search="A", exact_player_match=True, min_timestamp=START + 130),
+    ],
+)
+def test_indexed_reads_match_reading_the_list(history, monkeypatch, kwargs):
+    # More lines than the list holds, the oldest ones are trimmed
+    logs = _logs(150)
+    history.add_many(logs[:70])
+    history.add_many(logs[70:])
+
+    indexed = get_recent_logs(**kwargs)
+    scanned = _scanned(monkeypatch, **kwargs)
+
+    assert indexed["logs"]
+    assert indexed["logs"] == scanned["logs"]
+    assert sorted(indexed["players"]) == sorted(scanned["players"])
+    assert indexed["actions"] == scanned["actions"]
+
+
+def test_rebuild_index(history, monkeypatch):
+    # Lines recorded before the history was indexed
+    history.red.lpush(history.key, *[history.serializer(log) for log in _logs(50)])
+    assert not history.is_indexed()
+    assert history.find([history.action_key("KILL")]) is None
+
+    history.rebuild_index(page_size=7)
+    history.add_many(_logs(60)[50:])
+
+    kwargs = dict(action_filter=["TEAM KILL"], exact_action=True)
+    indexed = get_recent_logs(**kwargs)
+    assert len(indexed["logs"]) == 7
+    assert indexed["logs"] == _scanned(monkeypatch, **kwargs)["logs"]
+
+
+def test_reads_stop_early(history):
+    history.add_many(_logs(100))
+    # Would fail to deserialize if it were read
+    history.red.lset(history.key, 50, b"not json")
+
+    assert len(get_recent_logs(start=10, end=30)["logs"]) == 20
+
+
+def test_indexes_are_trimmed_by_line_number(history, monkeypatch):
+    logs = _logs(100)
+    history.add_many(logs[:8])
+    # Only B (ID 2) is still seen afterwards
+    rest = [log for log in logs[8:] if log["player_name_1"] == "B"]
+    history.add_many(rest)
+
+    # A's lines are still in the list, their index must be too
+    assert [log["raw"] for log in history.find([history.player_key("A")])] == [
+        log["raw"]
+        for log in reversed(logs[:8])
+        if "A" in (log["player_name_1"], log["player_name_2"])
+    ]
+    assert history.red.ttl(history.player_key("A")) == -1
+
+    history.add_many(rest * 10)
+    assert not history.red.exists(history.player_key("A"), history.player_id_key("1"))
+    assert "A" not in history.players_between(0, 100)
+    assert set(history.actions_between(0, 100)) == {log["action"] for log in rest}
+
+
+def test_reads_runs_without_gaps(history, monkeypatch):
+    monkeypatch.setattr(LogHistory, "MAX_RUN_GAP", 0)
+    history.add_many(_logs(100))
+    kwargs = dict(action_filter=["KILL"])
+    assert get_recent_logs(**kwargs)["logs"] == _scanned(monkeypatch, **kwargs)["logs"]
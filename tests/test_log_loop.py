@@ -0,0 +1,144 @@
+import os
+import time
+from unittest import mock
+
+import pytest
+
+from rcon.logs.dedup import LogDedupIndex
+from rcon.logs.history import LogHistory
+from rcon.logs.loop import LogLoop
+from rcon.utils import FixedLenList, MapsHistory
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("HLL_REDIS_URL"), reason="needs a redis instance"
+)
+
+
+NOW_MS = int(time.time() * 1000)
+
+
+def _log(seconds: int, line: str):
+    return {
+        "timestamp_ms": NOW_MS + seconds * 1000,
+        "line_without_time": line,
+        "raw": line,
+        "action": line.split(" ")[0],
+        "player_name_1": None,
+        "player_id_1": None,
+        "player_name_2": None,
+        "player_id_2": None,
+    }
+
+
+@pytest.fixture
+def log_loop():
+    with mock.patch("rcon.logs.loop.get_rcon"):
+        loop = LogLoop()
+    loop.duplicate_guard = LogDedupIndex(loop.red, key="test_unique_logs")
+    loop.log_history = LogHistory(key="test_log_history", max_len=3)
+    loop.maps_history = MapsHistory(key="test_maps_history")
+    _clear(loop)
+    yield loop
+    _clear(loop)
+
+
+def _clear(loop: LogLoop):
+    loop.red.delete(
+        loop.log_history.key,
+        *loop.red.keys("test_unique_logs*"),
+        *loop.red.keys("test_log_history:index:*"),
+        *loop.red.keys("test_maps_history*"),
+    )
+
+
+def test_fixed_len_list_add_many(log_loop):
+    history = FixedLenList(key=log_loop.log_history.key, max_len=3)
+    history.add_many([1, 2])
+    history.add_many([])
+    history.add_many([3, 4])
+
+    assert list(history) == [4, 3, 2]
+
+
+def test_record_lines_matches_recording_one_by_one(log_loop):
+    log_loop.log_history.max_len = 100
+    assert log_loop.record_line(_log(20, "CONNECTED A (1)"))
+
+    recorded = log_loop.record_lines(
+        [
+            # Duplicate of the line already recorded
+            _log(20, "CONNECTED A (1)"),
+            # Older than the head of the history
+            _log(10, "CONNECTED B (2)"),
+            _log(30, "CONNECTED C (3)"),
+            _log(30, "CONNECTED C (3)"),
+            # Older than a line recorded earlier in the same batch
+            _log(25, "CONNECTED D (4)"),
+            _log(40, "CONNECTED E (5)"),
+        ]
+    )
+
+    assert [log["line_without_time"] for log in recorded] == [
+        "CONNECTED C (3)",
+        "CONNECTED E (5)",
+    ]
+    assert [log["line_without_time"] for log in log_loop.log_history] == [
+        "CONNECTED E (5)",
+        "CONNECTED C (3)",
+        "CONNECTED A (1)",
+    ]
+    assert log_loop.record_lines([]) == []
+
+
+def test_cleanup_migrates_legacy_duplicate_guard(log_loop):
+    red = log_loop.red
+    red.sadd(
+        "test_unique_logs",
+        f"{NOW_MS}|CONNECTED A (1)",
+        f"{NOW_MS - 300 * 60 * 1000}|CONNECTED B (2)",
+        "not a line",
+    )
+
+    log_loop.cleanup()
+
+    assert not red.exists("test_unique_logs")
+    bucket_key = log_loop.duplicate_guard.bucket_key(
+        log_loop.duplicate_guard.bucket(NOW_MS)
+    )
+    assert red.scard(bucket_key) == 1
+    assert 0 < red.ttl(bucket_key) <= 281 * 60
+    # Already recorded before the migration
+    assert log_loop.record_lines([_log(0, "CONNECTED A (1)")]) == []
+    # Cleanup is a no-op once migrated
+    log_loop.cleanup()
+
+
+def _player(combat, level=10):
+    return {"combat": combat, "offense": 0, "defense": 0, "support": 0, "level": level}
+
+
+def test_record_player_stats(log_loop):
+    maps = log_loop.maps_history
+    started = time.time() - 60
+    maps.save_new_map("carentan_warfare", start_timestamp=started, game_layout={})
+    document = log_loop.red.lindex(maps.key, 0)
+
+    log_loop.record_player_stats({"1": _player(50), "2": _player(20)})
+    # Scores went back to 0, the previous score is kept in p_combat
+    log_loop.record_player_stats({"1": _player(5, level=11), "2": _player(20)})
+
+    # Only the hash of the map is written while it's running
+    assert log_loop.red.lindex(maps.key, 0) == document
+    stats = maps.get_player_stats(maps[0])
+    assert stats["1"]["combat"] == 5
+    assert stats["1"]["p_combat"] == 50
+    assert stats["1"]["level"] == 11
+    assert stats["2"]["combat"] == 20
+
+    ended = maps.save_map_end("carentan_warfare")
+    assert ended["player_stats"] == stats
+    assert maps[0]["player_stats"] == stats
+
+    # Nothing is recorded for a map that ended
+    log_loop.record_player_stats({"1": _player(100)})
+    assert maps.get_player_stats(maps[0]) == stats
@@ -115,3 +115,43 @@ class TestLogRecorder:
             assert res[1].player_1.player_id == first_player_id
             assert res[1].type == "KILL"
             assert res[1].player_2.player_id == second_player_id
+
+    def test_records_batch_once(self, log_recorder):
+        def make_log(timestamp: int, action: str, player_id: str | None):
+            line = f"{action}: A(Axis/{player_id}) -> B(Allies/{second_player_id}) with G43"
+            return {
+                "version": 1,
+                "timestamp_ms": timestamp * 1000,
+                "action": action,
+                "player_name_1": "A",
+                "player_id_1": player_id,
+                "player_name_2": "B",
+                "player_id_2": second_player_id,
+                "weapon": "G43",
+                "message": line,
+                "raw": f"[1.00 sec ({timestamp})] {line}",
+                "line_without_time": line,
+            }
+
+        logs = [
+            make_log(1612695643, "KILL", "unknown"),
+            make_log(1612695642, "KILL", first_player_id),
+            make_log(1612695642, "KILL", first_player_id),
+            make_log(1612695641, "TEAM KILL", first_player_id),
+        ]
+        r = LogRecorder(log_history_fn=lambda: logs)
+        r.run(run_immediately=True, one_off=True)
+        logs.insert(0, make_log(1612695644, "TEAM KILL", second_player_id))
+        r.run(run_immediately=True, one_off=True)
+
+        with enter_session() as sess:
+            res = sess.query(LogLine).order_by(LogLine.id).all()
+            assert [int(l.event_time.timestamp()) for l in res] == [
+                1612695641,
+                1612695642,
+                1612695643,
+                1612695644,
+            ]
+            assert res[1].player_1.player_id == first_player_id
+            assert res[2].player_1 is None
+            assert res[3].player_1.player_id == second_player_id
@@ -1,7 +1,13 @@
+import os
+import time
 from datetime import datetime
+from unittest import mock
 
 import pytest
 
+from rcon.cache_utils import get_redis_client
+from rcon.logs import parser as log_parser
+from rcon.logs.cursor import LogCursor, LogFeed
 from rcon.rcon import Rcon
 
 
@@ -1091,3 +1097,184 @@ to test something]""",
 )
 def test_player_messages(raw_log_line, expected):
     assert Rcon.parse_log_line(raw_log_line) == expected
+
+
+def test_log_cursor_only_returns_lines_past_cursor():
+    red = mock.MagicMock()
+    red.get.return_value = None
+    cursor = LogCursor(red, key="test_log_cursor")
+    first_fetch = [
+        "[10.0 sec (1704335300)] CONNECTED A (1)",
+        "[5.00 sec (1704335305)] CONNECTED B (2)",
+        "[5.00 sec (1704335305)] CONNECTED C (3)",
+    ]
+
+    assert cursor.advance(first_fetch) == first_fetch
+
+    # The relative times changed and a new line shares the newest timestamp
+    second_fetch = [
+        "[12.0 sec (1704335300)] CONNECTED A (1)",
+        "[7.00 sec (1704335305)] CONNECTED B (2)",
+        "[7.00 sec (1704335305)] CONNECTED C (3)",
+        "[7.00 sec (1704335305)] CONNECTED D (4)",
+        "[1.00 sec (1704335311)] DISCONNECTED A (1)",
+    ]
+    assert cursor.advance(second_fetch) == second_fetch[3:]
+    assert cursor.advance(second_fetch) == []
+    assert cursor.timestamp == 1704335311
+
+
+def test_log_cursor_accepts_late_lines():
+    red = mock.MagicMock()
+    red.get.return_value = None
+    cursor = LogCursor(red, key="test_log_cursor")
+    first_fetch = [
+        "[20.0 sec (1704335300)] CONNECTED A (1)",
+        "[5.00 sec (1704335315)] CONNECTED B (2)",
+    ]
+    assert cursor.advance(first_fetch, fetched_at=1000.0) == first_fetch
+
+    # Logged after the newer line, within the slack, or too old to tell apart
+    second_fetch = [
+        "[25.0 sec (1704335300)] CONNECTED A (1)",
+        "[21.0 sec (1704335304)] KICK: [A] has been kicked. [late]",
+        "[10.0 sec (1704335315)] CONNECTED B (2)",
+        "[1.00 sec (1704335324)] CONNECTED C (3)",
+    ]
+    assert cursor.advance(second_fetch) == [second_fetch[1], second_fetch[3]]
+    assert cursor.advance(["[90.0 sec (1704335250)] CONNECTED Z (9)"]) == []
+    assert cursor.timestamp == 1704335324
+    assert all(t >= 1704335324 - 30 for t in cursor.hashes.values())
+
+    with mock.patch("time.time", return_value=1012.5):
+        assert cursor.seconds_behind() == 12.5
+
+
+@pytest.mark.skipif(not os.getenv("HLL_REDIS_URL"), reason="needs a redis instance")
+def test_log_feed_shares_fetch_between_consumers():
+    rcon = mock.Mock()
+    feed = LogFeed(rcon=rcon, red=get_redis_client(), key="test_log_feed")
+    feed.clear()
+    rcon.get_logs.return_value = [
+        "[10.0 sec (1704335300)] CONNECTED A (1)",
+        "[5.00 sec (1704335305)] CONNECTED B (2)",
+    ]
+
+    assert feed.poll(min_interval_ms=60_000) == 2
+    # Throttled, the other consumer reads the batch that was just fetched
+    assert feed.poll(min_interval_ms=60_000) == 0
+    assert rcon.get_logs.call_count == 1
+
+    loop_id, loop_logs = feed.read()
+    stream_id, stream_logs = feed.read()
+    assert loop_id == stream_id
+    assert [log["player_name_1"] for log in loop_logs] == ["B", "A"]
+    assert [log["raw"] for log in stream_logs] == [log["raw"] for log in loop_logs]
+    assert feed.read(loop_id) == (loop_id, [])
+
+    feed.clear()
+
+
+@pytest.mark.skipif(not os.getenv("HLL_REDIS_URL"), reason="needs a redis instance")
+def test_log_feed_first_fetch_covers_every_consumer():
+    rcon = mock.Mock()
+    feed = LogFeed(
+        rcon=rcon, red=get_redis_client(), key="test_log_feed", max_since_min=180
+    )
+    feed.clear()
+    now = int(time.time())
+    rcon.get_logs.return_value = [
+        f"[100 min ({now - 100 * 60})] CONNECTED A (1)",
+        f"[60.0 sec ({now - 60})] CONNECTED B (2)",
+    ]
+
+    # The log stream only wants the last 2 minutes but polls first
+    assert feed.poll() == 2
+    rcon.get_logs.assert_called_once_with(since_min_ago=180)
+    _, stream_logs = feed.read(feed.stream_id_minutes_ago(2))
+    oldest_ms = (now - 2 * 60) * 1000
+    stream_logs = [log for log in stream_logs if log["timestamp_ms"] >= oldest_ms]
+    assert [log["player_name_1"] for log in stream_logs] == ["B"]
+
+    # The log loop still gets its backfill
+    _, loop_logs = feed.read()
+    assert [log["player_name_1"] for log in loop_logs] == ["B", "A"]
+
+    feed.clear()
+
+
+# What the line parser returned before the prefix dispatch, for the branches
+# not covered above
+@pytest.mark.parametrize(
+    "raw_log_line, expected",
+    [
+        (
+            "KILL: 湊あくあ(Axis/76561198202984515) -> fguitou(Allies/76561198034763447) with None",
+            {
+                "action": "KILL",
+                "player_name_1": "湊あくあ",
+                "player_id_1": "76561198202984515",
+                "player_name_2": "fguitou",
+                "player_id_2": "76561198034763447",
+                "weapon": "None",
+                "message": "湊あくあ(Axis/76561198202984515) -> fguitou(Allies/76561198034763447) with None",
+                "sub_content": None,
+            },
+        ),
+        (
+            "DISCONNECTED Dieter Schlüter: b (12345678901234567)",
+            {
+                "action": "DISCONNECTED",
+                "player_name_1": "Dieter Schlüter: b",
+                "player_id_1": "12345678901234567",
+                "player_name_2": None,
+                "player_id_2": None,
+                "weapon": None,
+                "message": "Dieter Schlüter: b (12345678901234567)",
+                "sub_content": None,
+            },
+        ),
+        (
+            "CHAT[Unit][WinstonsDomain(Axis/3azzx77e-4ad4-57z3-8gr8-gb9e753e85aq)]: test",
+            {
+                "action": "CHAT[Axis][Unit]",
+                "player_name_1": "WinstonsDomain",
+                "player_id_1": "3azzx77e-4ad4-57z3-8gr8-gb9e753e85aq",
+                "player_name_2": None,
+                "player_id_2": None,
+                "weapon": None,
+                "message": "WinstonsDomain: test (3azzx77e-4ad4-57z3-8gr8-gb9e753e85aq)",
+                "sub_content": "test",
+            },
+        ),
+        (
+            "BAN: [(WTH) Abusify] has been banned. [BANNED FOR 2 HOURS BY THE ADMINISTRATOR!",
+            {
+                "action": "ADMIN BANNED",
+                "player_name_1": "(WTH) Abusify",
+                "player_id_1": None,
+                "player_name_2": None,
+                "player_id_2": None,
+                "weapon": None,
+                "message": "BAN: [(WTH) Abusify] has been banned. [BANNED FOR 2 HOURS BY THE ADMINISTRATOR!]",
+                "sub_content": "has been banned. [BANNED FOR 2 HOURS BY THE ADMINISTRATOR!]",
+            },
+        ),
+        (
+            "VOTESYS: Player [NoodleArms] voted [PV_Favour] for VoteID[2]",
+            {
+                "action": "VOTE",
+                "player_name_1": "NoodleArms",
+                "player_id_1": None,
+                "player_name_2": None,
+                "player_id_2": None,
+                "weapon": None,
+                "message": "Player [NoodleArms] voted [PV_Favour] for VoteID[2]",
+                "sub_content": "Player [NoodleArms] voted [PV_Favour] for VoteID[2]",
+            },
+        ),
+    ],
+)
+def test_parse_log_line_known_outputs(raw_log_line, expected):
+    assert Rcon.parse_log_line(raw_log_line) == expected
+    assert log_parser.parse_log_line(raw_log_line)._asdict() == expected
@@ -0,0 +1,57 @@
+import re
+
+from rcon.match_facts import _FACTS, _KILLER_SIDE, refresh_match_facts
+from rcon.models import (
+    PlayerMatchKiller,
+    PlayerMatchVictim,
+    PlayerMatchWeapon,
+    PlayerStats,
+)
+
+
+def test_facts_cover_the_model_columns():
+    stats_columns = {c.name for c in PlayerStats.__table__.columns}
+    for model in (PlayerMatchWeapon, PlayerMatchVictim, PlayerMatchKiller):
+        table = model.__table__
+        key, count, source = _FACTS[table.name]
+        assert {c.name for c in table.primary_key.columns} == {
+            "playersteamid_id",
+            "map_id",
+            key,
+        }
+        assert {c.name for c in table.columns} == {
+            "playersteamid_id",
+            "map_id",
+            key,
+            count,
+        }
+        assert source in stats_columns
+
+
+def test_refresh_without_rows_does_nothing():
+    class _Session:
+        def execute(self, *args, **kwargs):
+            raise AssertionError("Nothing to refresh")
+
+    refresh_match_facts(_Session(), [])
+    refresh_match_facts(_Session(), [1], [])
+
+
+def test_refresh_marks_the_matches():
+    class _Session:
+        def __init__(self):
+            self.statements = []
+
+        def execute(self, statement, params=None):
+            self.statements.append(str(statement))
+
+    sess = _Session()
+    refresh_match_facts(sess, [1, 2])
+
+    assert len(sess.statements) == 2 * len(_FACTS) + 1
+    assert sess.statements[-1].startswith("UPDATE map_history SET facts_refreshed_at")
+
+
+def test_killer_side_pattern():
+    raw = "[12:34 min (1700000000)] KILL: Tim(Axis/76561198000000000) -> Bob(Allies/76561198000000001) with MP40"
+    assert re.search(_KILLER_SIDE, raw).group(1) == "Axis"
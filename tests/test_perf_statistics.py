@@ -0,0 +1,84 @@
+import os
+import time
+import uuid
+
+import pytest
+
+from rcon.perf_statistics import (
+    LATENCY_BUCKETS_MS,
+    PerformanceStatistics,
+    percentile_from_histogram,
+)
+
+
+@pytest.fixture
+def perf_stats():
+    if not os.getenv("HLL_REDIS_URL"):
+        pytest.skip("HLL_REDIS_URL not set")
+    stats = PerformanceStatistics(
+        f"test_{uuid.uuid4().hex}", enabled=True, flush_interval_seconds=3600
+    )
+    yield stats
+    keys = list(stats.red.scan_iter(match=f"{stats.namespace}*"))
+    if keys:
+        stats.red.delete(*keys)
+
+
+def test_percentile_from_histogram():
+    buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    # 100 calls between 10 and 20ms
+    buckets[LATENCY_BUCKETS_MS.index(20)] = 100
+
+    assert percentile_from_histogram(buckets, 50) == 15
+    assert percentile_from_histogram(buckets, 99) == pytest.approx(19.9)
+    assert percentile_from_histogram([0] * len(buckets), 50) is None
+
+
+def test_counters_are_aggregated_until_flushed(perf_stats):
+    for _ in range(10):
+        perf_stats.increment("send")
+        perf_stats.increment("send_size", 5)
+    perf_stats.gauge("mux_in_flight", 3)
+
+    assert perf_stats.red.get(perf_stats.metric_key("send")) is None
+
+    assert perf_stats.dump() == {"send": 10, "send_size": 50, "mux_in_flight": 3}
+    assert perf_stats.dump() == {"send": 0, "send_size": 0, "mux_in_flight": 3}
+
+
+def test_latency_percentiles(perf_stats):
+    for ms in range(1, 101):
+        perf_stats.timing("GetServerInformation", ms / 1000)
+    perf_stats.timing("GetAdminLog", 0.5)
+    perf_stats.flush()
+
+    latencies = perf_stats.latency_percentiles()
+    assert list(latencies) == ["GetAdminLog", "GetServerInformation"]
+    server_info = latencies["GetServerInformation"]
+    assert server_info["count"] == 100
+    assert 20 <= server_info["p50_ms"] <= 50
+    assert 50 <= server_info["p95_ms"] <= 100
+
+    assert perf_stats.latency_percentiles(reset=True) == latencies
+    assert perf_stats.latency_percentiles() == {}
+
+
+def test_disabled(perf_stats):
+    perf_stats.enabled = False
+    perf_stats.increment("send")
+    perf_stats.timing("GetAdminLog", 0.5)
+
+    assert perf_stats.dump() == {}
+
+
+def test_flushed_without_further_metrics(perf_stats):
+    perf_stats.flush_interval_seconds = 0.2
+    perf_stats._last_flush = time.monotonic()
+    perf_stats.timing("GetAdminLog", 0.5)
+    assert not perf_stats.red.exists(perf_stats.latency_key("GetAdminLog"))
+
+    deadline = time.monotonic() + 5
+    while not perf_stats.red.exists(perf_stats.latency_key("GetAdminLog")):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert perf_stats.latency_percentiles()["GetAdminLog"]["count"] == 1
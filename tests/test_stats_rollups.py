@@ -0,0 +1,17 @@
+from rcon.models import PlayerStatsRollup, PlayerStatsRollupBucket
+from rcon.stats_rollups import _GREATEST, _ROLLUPS, _SUMMED, _add_sql
+
+
+def test_rollup_sql_covers_the_model_columns():
+    for model in (PlayerStatsRollup, PlayerStatsRollupBucket):
+        table = model.__table__
+        keys = _ROLLUPS[table.name]
+        assert set(keys) == {c.name for c in table.primary_key.columns}
+        assert {*keys, *_SUMMED, *_GREATEST} == {c.name for c in table.columns}
+
+
+def test_add_sql_upserts_on_the_primary_key():
+    sql = _add_sql("player_stats_rollup_bucket")
+    assert "ON CONFLICT (playersteamid_id, map_name, day)" in sql
+    assert "kills = r.kills + excluded.kills" in sql
+    assert "level = GREATEST(r.level, excluded.level)" in sql
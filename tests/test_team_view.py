@@ -0,0 +1,199 @@
+import copy
+import os
+
+import pytest
+
+from rcon.team_view import (
+    TEAM_VIEW_DIFFS_KEY,
+    TEAM_VIEW_SNAPSHOT_KEY,
+    TeamViewMaterializer,
+    apply_team_view_diff,
+    build_team_view,
+    diff_team_views,
+    get_published_team_view,
+    get_team_view_changes,
+)
+from tests.test_player import mock_get_detailed_player
+
+
+def _players():
+    return [
+        mock_get_detailed_player(
+            name="a",
+            player_id="1",
+            team="allies",
+            unit_name="able",
+            role="officer",
+            kills=3,
+        ),
+        mock_get_detailed_player(
+            name="b",
+            player_id="2",
+            team="allies",
+            unit_name="able",
+            role="rifleman",
+            kills=1,
+        ),
+        mock_get_detailed_player(
+            name="c",
+            player_id="3",
+            team="allies",
+            unit_name="command",
+            role="armycommander",
+        ),
+        mock_get_detailed_player(
+            name="d",
+            player_id="4",
+            team="axis",
+            unit_name="baker",
+            role="crewman",
+            deaths=2,
+        ),
+        mock_get_detailed_player(
+            name="e", player_id="5", team=None, unit_name="unassigned"
+        ),
+    ]
+
+
+def test_build_team_view():
+    view = build_team_view(_players(), fail_count=1)
+
+    assert view["fail_count"] == 1
+    allies = view["allies"]
+    assert list(allies["squads"]) == ["able"]
+    assert [p["name"] for p in allies["squads"]["able"]["players"]] == ["a", "b"]
+    assert allies["squads"]["able"]["has_leader"]
+    assert allies["commander"]["name"] == "c"
+    assert (allies["kills"], allies["count"]) == (4, 3)
+    assert view["axis"]["squads"]["baker"]["type"] == "armor"
+    assert view["unassigned"]["count"] == 1
+
+
+def test_diffs_ignore_volatile_fields():
+    previous = build_team_view(_players())
+    players = _players()
+    players[0]["world_position"] = {"x": 1.0}
+    players[3]["map_playtime_seconds"] = 60
+    assert diff_team_views(previous, build_team_view(players)) is None
+
+    players[1]["unit_name"] = "baker"
+    players[1]["team"] = "axis"
+    current = build_team_view(players)
+    diff = diff_team_views(previous, current)
+
+    assert set(diff["teams"]) == {"allies", "axis"}
+    assert diff["teams"]["axis"]["squads"].keys() == {"baker"}
+    assert "unassigned" not in diff["teams"]
+
+    # Positions and play times are only as fresh as the last change of their squad
+    for player in players:
+        player["world_position"] = {}
+        player["map_playtime_seconds"] = 0
+    assert apply_team_view_diff(copy.deepcopy(previous), diff) == build_team_view(
+        players
+    )
+
+
+def test_removed_squads_and_teams():
+    previous = build_team_view(_players())
+    current = build_team_view(_players()[:2])
+    diff = diff_team_views(previous, current)
+
+    assert diff["teams"]["allies"]["commander"] is None
+    assert sorted(diff["removed_teams"]) == ["axis", "unassigned"]
+    assert apply_team_view_diff(copy.deepcopy(previous), diff) == current
+
+
+class _Rcon:
+    def __init__(self):
+        self.players = _players()
+        self.fetched: list[list[str]] = []
+
+    def get_all_player_info(self):
+        return [{"iD": p["player_id"], "name": p["name"]} for p in self.players]
+
+    def get_players_by_id(self, player_names):
+        self.fetched.append(sorted(player_names))
+        return {
+            player_id: {"player_id": player_id, "name": name}
+            for player_id, name in player_names.items()
+        }
+
+    def detail_players(self, players, all_player_info):
+        online = {p["iD"] for p in all_player_info}
+        assert sorted(p["player_id"] for p in players) == sorted(online)
+        return {
+            "players": {
+                p["player_id"]: p for p in self.players if p["player_id"] in online
+            },
+            "fail_count": 0,
+        }
+
+
+@pytest.fixture
+def materializer():
+    if not os.getenv("HLL_REDIS_URL"):
+        pytest.skip("HLL_REDIS_URL not set")
+    rcon = _Rcon()
+    materializer = TeamViewMaterializer(rcon)
+    materializer.red.delete(TEAM_VIEW_SNAPSHOT_KEY, TEAM_VIEW_DIFFS_KEY)
+    materializer = TeamViewMaterializer(rcon)
+    yield materializer
+    materializer.red.delete(TEAM_VIEW_SNAPSHOT_KEY, TEAM_VIEW_DIFFS_KEY)
+
+
+def test_materializer_versions(materializer):
+    assert get_published_team_view() is None
+    materializer.refresh()
+    first = get_team_view_changes()
+    assert first["version"] == 1
+    assert first["view"] == get_published_team_view()
+
+    # Nothing changed, the snapshot is refreshed under the same version
+    materializer.rcon.players[0]["world_position"] = {"x": 1.0}
+    assert materializer.refresh() is None
+    assert get_team_view_changes(1) == {
+        **get_team_view_changes(1),
+        "view": None,
+        "diffs": [],
+    }
+
+    materializer.rcon.players[0]["kills"] = 10
+    materializer.refresh()
+    materializer.rcon.players.pop()
+    materializer.refresh()
+
+    changes = get_team_view_changes(1)
+    assert changes["version"] == 3
+    assert changes["view"] is None
+    assert [d["version"] for d in changes["diffs"]] == [2, 3]
+    view = first["view"]
+    for diff in changes["diffs"]:
+        apply_team_view_diff(view, diff)
+    assert view == get_published_team_view()
+
+    # Too old, or from before a reset
+    materializer.red.zremrangebyscore(TEAM_VIEW_DIFFS_KEY, 2, 2)
+    assert get_team_view_changes(1)["view"] == view
+    assert get_team_view_changes(10)["view"] == view
+
+    # A new producer carries on with the versions
+    assert TeamViewMaterializer(materializer.rcon).version == 3
+
+
+def test_materializer_fetches_arrivals_only(materializer):
+    materializer.refresh()
+    materializer.rcon.players.pop(0)
+    materializer.refresh()
+    materializer.rcon.players.append(
+        mock_get_detailed_player(
+            name="f", player_id="6", team="axis", unit_name="baker"
+        )
+    )
+    materializer.refresh()
+    assert materializer.rcon.fetched == [["1", "2", "3", "4", "5"], ["6"]]
+    assert sorted(materializer.players) == ["2", "3", "4", "5", "6"]
+
+    materializer.players_fetched_at -= materializer.players_refresh_seconds
+    materializer.refresh()
+    assert materializer.rcon.fetched[-1] == ["2", "3", "4", "5", "6"]
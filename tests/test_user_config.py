@@ -0,0 +1,122 @@
+from unittest import mock
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from rcon.user_config import utils
+from rcon.user_config.utils import BaseUserConfig, UserConfigCache
+
+
+class ExampleUserConfig(BaseUserConfig):
+    enabled: bool = False
+
+
+@pytest.fixture
+def config_db(monkeypatch):
+    monkeypatch.setenv("HLL_DB_URL", "postgresql://example")
+    monkeypatch.setattr(utils, "_USER_CONFIG_CACHE", UserConfigCache())
+    db = {}
+    with mock.patch.object(
+        utils,
+        "get_user_config",
+        side_effect=lambda key, default=None, raise_errors=False: db.get(key),
+    ) as get_user_config:
+        yield db, get_user_config
+
+
+def test_load_from_db_is_cached(config_db):
+    db, get_user_config = config_db
+    db[ExampleUserConfig.KEY()] = {"enabled": True}
+
+    first = ExampleUserConfig.load_from_db()
+    first.enabled = False
+    second = ExampleUserConfig.load_from_db()
+
+    assert second.enabled is True
+    assert get_user_config.call_count == 1
+
+
+def test_load_from_db_reloads_after_change(config_db):
+    db, get_user_config = config_db
+    key = ExampleUserConfig.KEY()
+    db[key] = {"enabled": False}
+    assert ExampleUserConfig.load_from_db().enabled is False
+
+    db[key] = {"enabled": True}
+    # What set_user_config publishes once the change is committed
+    utils._USER_CONFIG_CACHE.invalidate(key)
+
+    assert ExampleUserConfig.load_from_db().enabled is True
+    assert get_user_config.call_count == 2
+
+
+def test_config_read_during_a_change_is_not_cached(config_db):
+    db, get_user_config = config_db
+    key = ExampleUserConfig.KEY()
+    db[key] = {"enabled": False}
+
+    def changed_while_reading(key, default=None, raise_errors=False):
+        value = db.get(key)
+        utils._USER_CONFIG_CACHE.l1_clear(key.encode())
+        return value
+
+    get_user_config.side_effect = changed_while_reading
+    ExampleUserConfig.load_from_db()
+    ExampleUserConfig.load_from_db()
+
+    assert get_user_config.call_count == 2
+
+
+def test_load_from_db_returns_deep_copies(config_db):
+    class ListUserConfig(BaseUserConfig):
+        values: list[str] = []
+
+    db, get_user_config = config_db
+    db[ListUserConfig.KEY()] = {"values": ["a"]}
+
+    ListUserConfig.load_from_db().values.append("b")
+
+    assert ListUserConfig.load_from_db().values == ["a"]
+
+
+def test_missing_config_is_cached_until_invalidated(config_db):
+    db, get_user_config = config_db
+
+    assert ExampleUserConfig.load_from_db().enabled is False
+    assert ExampleUserConfig.load_from_db().enabled is False
+    assert get_user_config.call_count == 1
+
+    db[ExampleUserConfig.KEY()] = {"enabled": True}
+    utils.invalidate_user_configs()
+
+    assert ExampleUserConfig.load_from_db().enabled is True
+    assert get_user_config.call_count == 2
+
+
+def test_removed_config_is_invalidated(config_db):
+    db, get_user_config = config_db
+    key = ExampleUserConfig.KEY()
+    db[key] = {"enabled": True}
+    assert ExampleUserConfig.load_from_db().enabled is True
+
+    sess = mock.MagicMock()
+    with mock.patch.object(
+        utils, "_get_conf", side_effect=lambda sess, key: db.pop(key)
+    ):
+        utils._remove_conf(sess, key)
+
+    assert ExampleUserConfig.load_from_db().enabled is False
+    assert get_user_config.call_count == 2
+
+
+def test_failed_query_is_not_cached(config_db):
+    db, get_user_config = config_db
+    db[ExampleUserConfig.KEY()] = {"enabled": True}
+    lookup = get_user_config.side_effect
+    get_user_config.side_effect = OperationalError("SELECT", {}, Exception("gone"))
+
+    assert ExampleUserConfig.load_from_db().enabled is False
+
+    get_user_config.side_effect = lookup
+    assert ExampleUserConfig.load_from_db().enabled is True
+    assert get_user_config.call_count == 2